@@ -0,0 +1,49 @@
+import unittest
+import json
+import os
+import tempfile
+from twokeys_utils import NDJSONSink
+
+class TestLogSink(unittest.TestCase):
+	def setUp(self):
+		self.dir = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.dir.name, "2Keys.log")
+
+	def tearDown(self):
+		self.dir.cleanup()
+
+	def readRecords(self, path):
+		with open(path) as logFile:
+			return [json.loads(line) for line in logFile]
+
+	def testWritesNDJSON(self):
+		sink = NDJSONSink(self.path)
+		for i in range(100):
+			self.assertTrue(sink.write({ "prefix": "test", "level": "info", "message": "Message " + str(i) }))
+		sink.close()
+		records = self.readRecords(self.path)
+		self.assertEqual([record["message"] for record in records], ["Message " + str(i) for i in range(100)])
+		self.assertTrue(all("time" in record for record in records))
+		monotonic = [record["monotonic"] for record in records]
+		self.assertEqual(monotonic, sorted(monotonic))
+
+	def testRotates(self):
+		sink = NDJSONSink(self.path, maxBytes=500, backupCount=2, batchSize=1)
+		for i in range(50):
+			sink.write({ "message": i })
+		sink.close()
+		self.assertTrue(os.path.exists(self.path + ".1"))
+		self.assertTrue(os.path.exists(self.path + ".2"))
+		self.assertFalse(os.path.exists(self.path + ".3"))
+		# Newest records are in the current file
+		self.assertEqual(self.readRecords(self.path)[-1]["message"], 49)
+		self.assertLess(self.readRecords(self.path + ".2")[-1]["message"], self.readRecords(self.path + ".1")[0]["message"])
+
+	def testWritesUnserialisableMessages(self):
+		sink = NDJSONSink(self.path)
+		sink.write({ "message": object() })
+		sink.close()
+		self.assertTrue(self.readRecords(self.path)[0]["message"].startswith("<object"))
+
+if __name__ == '__main__':
+    unittest.main()
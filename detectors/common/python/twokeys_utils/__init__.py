@@ -19,4 +19,5 @@ along with 2Keys.  If not, see <https://www.gnu.org/licenses/>.
 
 from .getStorage import *
 from .constants import *
-from .logger import *
\ No newline at end of file
+from .logger import *
+from .logSink import *
\ No newline at end of file
@@ -0,0 +1,125 @@
+"""
+Copyright 2020 Kishan Sambhi
+
+This file is part of 2Keys.
+
+2Keys is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+2Keys is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with 2Keys.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# Sink that writes logs as NDJSON to files, from a background thread
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+
+DEFAULT_SINK_MAX_BYTES = 1024 * 1024
+DEFAULT_SINK_BACKUP_COUNT = 3
+DEFAULT_SINK_QUEUE_SIZE = 1024
+DEFAULT_SINK_BATCH_SIZE = 64
+
+# Put on the queue to stop the writer
+_STOP = object()
+
+class NDJSONSink:
+  """Writes log records as NDJSON (one JSON object per line) to size-rotated files.
+
+  Records are put on a bounded queue and written by a background thread in batches,
+  so logging never blocks on disk or pipe I/O.
+  If the queue is full the record is dropped, and counted in NDJSONSink.dropped.
+
+  Each record has the following added:
+  - time: Wall clock time, in seconds since the epoch
+  - monotonic: Monotonic clock time, in seconds, for ordering & timing records
+
+  Files are rotated once they reach maxBytes: path -> path.1 -> path.2 ... -> path.backupCount, which is removed.
+  """
+
+  def __init__(self, path: str, maxBytes: int = DEFAULT_SINK_MAX_BYTES, backupCount: int = DEFAULT_SINK_BACKUP_COUNT, queueSize: int = DEFAULT_SINK_QUEUE_SIZE, batchSize: int = DEFAULT_SINK_BATCH_SIZE):
+    self.path = path
+    self.maxBytes = maxBytes
+    self.backupCount = backupCount
+    self.batchSize = batchSize
+    self.queue = queue.Queue(maxsize=queueSize)
+    self.dropped = 0
+    self.file = open(self.path, "a", encoding="utf-8")
+    self.writer = threading.Thread(target=self.__run, name="2Keys-log-sink", daemon=True)
+    self.writer.start()
+
+  def write(self, record: dict) -> bool:
+    """
+    Queue a record to be written.
+    Returns False if the queue was full and the record was dropped
+    """
+    record["time"] = time.time()
+    record["monotonic"] = time.monotonic()
+    try:
+      self.queue.put_nowait(record)
+      return True
+    except queue.Full:
+      self.dropped += 1
+      return False
+
+  def close(self):
+    """Writes everything still queued, then closes the file"""
+    if self.writer is None:
+      return
+    self.queue.put(_STOP)
+    self.writer.join()
+    self.writer = None
+    self.file.close()
+
+  def __run(self):
+    """Writer thread"""
+    while True:
+      batch = [self.queue.get()]
+      # Take whatever else is waiting, so it can all be written at once
+      while len(batch) < self.batchSize and batch[-1] is not _STOP:
+        try:
+          batch.append(self.queue.get_nowait())
+        except queue.Empty:
+          break
+      stop = batch[-1] is _STOP
+      if stop:
+        batch.pop()
+      if len(batch) > 0:
+        self.file.write("".join(json.dumps(record, default=str) + "\n" for record in batch))
+        self.file.flush()
+        if self.file.tell() >= self.maxBytes:
+          self.__rotate()
+      if stop:
+        return
+
+  def __rotate(self):
+    """Rotate files, so that path is a new file"""
+    self.file.close()
+    for i in range(self.backupCount - 1, 0, -1):
+      if os.path.exists(self.path + "." + str(i)):
+        os.replace(self.path + "." + str(i), self.path + "." + str(i + 1))
+    if self.backupCount > 0:
+      os.replace(self.path, self.path + ".1")
+    else:
+      os.remove(self.path)
+    self.file = open(self.path, "a", encoding="utf-8")
+
+# Sinks by path, so all loggers writing to a file share one writer
+sinks = {}
+
+def getSink(path: str) -> NDJSONSink:
+  """Get the sink for a file, creating it if needed. Sinks are closed (flushed) when the program exits"""
+  path = os.path.abspath(path)
+  if path not in sinks:
+    sinks[path] = NDJSONSink(path)
+    atexit.register(sinks[path].close)
+  return sinks[path]
@@ -23,6 +23,7 @@ import colorful
 import sys
 import os
 import json
+from .logSink import getSink
 # string name: Name of module logging
 class Logger:
   """Logger class. Used for printing messages.
@@ -32,6 +33,7 @@ class Logger:
   - Logger.isDebug: print debug output (use --debug on CLI)
   - Logger.name: Prefix before all logging messages
   - Logger.json: Print in JSON mode (use --json on CLI)
+  - Logger.sink: NDJSONSink to write logs to instead of printing them (use --log-file <path> on CLI, or the 2KEYS_LOG_FILE env var)
   """
 
   def __init__(self, name):
@@ -46,6 +48,12 @@ class Logger:
       self.silent = True
     if "--json" in sys.argv or os.getenv("2KEYS_JSON", "False").lower() == "true":
       self.useJSON = True
+    self.sink = None
+    logFile = os.getenv("2KEYS_LOG_FILE")
+    if "--log-file" in sys.argv and sys.argv.index("--log-file") + 1 < len(sys.argv):
+      logFile = sys.argv[sys.argv.index("--log-file") + 1]
+    if logFile:
+      self.sink = getSink(logFile)
   def __log(self, level: str, levelColour: str, text):
     """
     Logs a string to console
@@ -54,7 +62,14 @@ class Logger:
     - text: Text to print
     """
     if not self.silent:
-      if not self.useJSON:
+      if self.sink is not None:
+        # Written in the background, so this doesn't wait on the disk
+        self.sink.write({
+          "prefix": self.name,
+          "level": level,
+          "message": text,
+        })
+      elif not self.useJSON:
         print(colorful.magenta(self.name) + " " + getattr(colorful, levelColour)(level) + " " + str(text))
       else:
         print(json.dumps({
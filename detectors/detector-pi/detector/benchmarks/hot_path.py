@@ -0,0 +1,35 @@
+# Benchmark of the watcher's per-event path
+# Replays synthetic key events through Keyboard.handle_event, with no keyboard or server needed
+# Usage: python3 benchmarks/hot_path.py [--keys N] [--quiet] [--debug]
+# Run with python3 -O to benchmark with hot path logging compiled out
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+
+from twokeys.watcher.replay import synthetic_events, replay_keyboard
+
+CONFIG = {
+  "addresses": { "server": { "ipv4": "127.0.0.1", "port": 9090 } },
+  "keyboards": {
+    "keyboard": {
+      "path": "/dev/null",
+      "hotkeys": { "+A": "TestFunc", "^!7": "MsgBox", "$ESC$": "Escape" },
+    },
+  },
+}
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--keys", type=int, default=50000, help="Number of keys to press")
+  parser.add_argument("--quiet", action="store_true", help="Use the keyboard's quiet hot path mode")
+  args, _ = parser.parse_known_args()
+
+  stats = replay_keyboard(CONFIG, "keyboard", synthetic_events(args.keys), quiet=args.quiet)
+  sys.stderr.write("%d events in %.3fs: %.0f events/s, p50 %.2f us, p99 %.2f us, max %.2f us\n" % (
+    stats["events"], stats["seconds"], stats["events_per_second"], stats["p50_us"], stats["p99_us"], stats["max_us"]
+  ))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,91 @@
+# Benchmark of how much the watcher's latency jitters, with & without the real time options (see twokeys/watcher/realtime.py)
+# Wakes up every interval as a key press would, & handles a hotkey (left shift + A) through Keyboard.handle_events.
+# Reports how late each hotkey was handled, compared to when it should have been.
+# Run with --load to keep every CPU busy, like a loaded Pi, then compare with i.e. sudo ... --sched fifo --mlock
+# Usage: python3 benchmarks/jitter.py [--samples N] [--interval MS] [--load N] [--sched fifo|rr] [--priority N] [--nice N] [--cpus CPUS] [--mlock]
+import os
+import sys
+import time
+import signal
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+
+from twokeys.util.constants import SCHED_POLICIES, REALTIME_PRIORITY
+from twokeys.watcher import Keyboard
+from twokeys.watcher.realtime import apply_realtime, parse_cpus
+from twokeys.watcher.replay import ReplayDevice, ReplayClient, percentile
+
+CONFIG = {
+  "addresses": { "server": { "ipv4": "127.0.0.1", "port": 9090 } },
+  "keyboards": {
+    "keyboard": {
+      "path": "/dev/null",
+      "hotkeys": { "+A": "TestFunc", "^!7": "MsgBox", "$ESC$": "Escape" },
+    },
+  },
+}
+
+# Left shift + A, down then up
+HOTKEY = [(0, 0, 1, 42, 1), (0, 0, 1, 30, 1), (0, 0, 0, 0, 0), (0, 0, 1, 30, 0), (0, 0, 1, 42, 0), (0, 0, 0, 0, 0)]
+
+# Fork processes that keep a CPU busy each. Returns their pids
+def start_load(processes):
+  pids = []
+  for _ in range(processes):
+    pid = os.fork()
+    if pid == 0:
+      signal.signal(signal.SIGTERM, signal.SIG_DFL)
+      while True:
+        pass
+    pids.append(pid)
+  return pids
+
+def stop_load(pids):
+  for pid in pids:
+    os.kill(pid, signal.SIGTERM)
+    os.waitpid(pid, 0)
+
+# How late, in ns, each hotkey was handled
+def measure(keyboard, samples, interval):
+  clock = time.perf_counter_ns
+  late = []
+  deadline = clock()
+  for _ in range(samples):
+    deadline += interval
+    wait = deadline - clock()
+    if wait > 0:
+      time.sleep(wait / 1e9)
+    keyboard.handle_events(HOTKEY)
+    late.append(clock() - deadline)
+  return late
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--samples", type=int, default=5000, help="Number of hotkeys to handle")
+  parser.add_argument("--interval", type=float, default=1, help="Milliseconds between hotkeys")
+  parser.add_argument("--load", type=int, default=0, help="Number of processes to keep CPUs busy with")
+  parser.add_argument("--sched", choices=SCHED_POLICIES, help="Real time scheduling policy")
+  parser.add_argument("--priority", type=int, default=REALTIME_PRIORITY, help="Real time priority, for --sched")
+  parser.add_argument("--nice", type=int, help="Nice value")
+  parser.add_argument("--cpus", help="Only run on these CPUs (comma separated list)")
+  parser.add_argument("--mlock", action="store_true", help="Lock memory")
+  args, _ = parser.parse_known_args()
+
+  client = ReplayClient()
+  keyboard = Keyboard(CONFIG["keyboards"]["keyboard"], "keyboard", config=CONFIG, client=client, backend=None, device=ReplayDevice(), quiet=True, queue_size=args.samples + 1)
+  keyboard.dispatcher.start()
+  load = start_load(args.load) # Before the real time options, so the load doesn't get them too
+  apply_realtime([keyboard], sched=args.sched, priority=args.priority, nice=args.nice, cpus=parse_cpus(args.cpus), mlock=args.mlock)
+  try:
+    late = sorted(measure(keyboard, args.samples, int(args.interval * 1e6)))
+  finally:
+    stop_load(load)
+    keyboard.stop()
+
+  sys.stderr.write("%d hotkeys (%d sent), late by: p50 %.1f us, p99 %.1f us, p99.9 %.1f us, max %.1f us\n" % (
+    len(late), len(client.sent), percentile(late, 50) / 1000, percentile(late, 99) / 1000, percentile(late, 99.9) / 1000, late[-1] / 1000
+  ))
+
+if __name__ == "__main__":
+  main()
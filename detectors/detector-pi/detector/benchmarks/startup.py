@@ -0,0 +1,62 @@
+# Benchmark of how long the 2Keys CLI takes to start, per command
+# Uses python -X importtime to add up the time spent importing modules for each command: the CLI itself,
+# then the modules the command imports when it runs. Fails if any command is over its budget.
+# Usage: python3 benchmarks/startup.py [--repeat N] [--scale X]
+# --scale multiplies the budgets, i.e. for slower machines like a Pi Zero
+import os
+import sys
+import argparse
+import subprocess
+
+DETECTOR_ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+
+# Command: (modules imported when it runs, budget in ms)
+COMMANDS = {
+  "version": ([], 200),
+  "watch": (["twokeys.watcher", "twokeys.watcher.compiled", "twokeys.watcher.reload", "twokeys.util.config"], 600),
+  "watch-all": (["twokeys.watcher", "twokeys.watcher.compiled", "twokeys.util.config"], 600),
+  "supervise": (["twokeys.watcher.supervisor", "twokeys.watcher.compiled", "twokeys.util.config"], 600),
+  "add": (["twokeys.add_keyboard"], 900),
+  "sync": (["twokeys.sync"], 500),
+  "init": (["twokeys.init"], 900),
+  "daemon-gen": (["twokeys.daemon", "twokeys.util.config"], 300),
+}
+
+# Time spent importing, in ms, & the slowest modules
+# modules: Modules to import after the CLI
+def import_time(modules):
+  code = "; ".join(["import twokeys.cli"] + ["import " + module for module in modules])
+  result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=DETECTOR_ROOT, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+  total = 0
+  imports = []
+  for line in result.stderr.splitlines():
+    if not line.startswith("import time:") or "self [us]" in line:
+      continue
+    self_us, _, name = line[len("import time:"):].split("|")
+    total += int(self_us)
+    imports.append((int(self_us), name.strip()))
+  imports.sort(reverse=True)
+  return total / 1000, imports[:5]
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--repeat", type=int, default=3, help="Times to run each command, using the fastest")
+  parser.add_argument("--scale", type=float, default=1, help="Multiply the budgets by this")
+  args = parser.parse_args()
+
+  over = []
+  for command, (modules, budget) in COMMANDS.items():
+    budget *= args.scale
+    runs = [import_time(modules) for _ in range(args.repeat)]
+    took, slowest = min(runs, key=lambda run: run[0])
+    sys.stderr.write("%-10s %7.1f ms (budget %.0f ms)%s\n" % (command, took, budget, "" if took <= budget else " OVER BUDGET"))
+    if took > budget:
+      over.append(command)
+      for self_us, name in slowest:
+        sys.stderr.write("  %7.1f ms %s\n" % (self_us / 1000, name))
+  if len(over) > 0:
+    sys.stderr.write("Over budget: " + ", ".join(over) + "\n")
+    sys.exit(1)
+
+if __name__ == "__main__":
+  main()
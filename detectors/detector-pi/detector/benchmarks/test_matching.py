@@ -0,0 +1,51 @@
+# Benchmarks of the watcher's matching path, with pytest-benchmark
+# Replays synthetic captures, so no keyboard or server is needed
+# Run from the detector dir with: python -m pytest benchmarks
+import os
+
+# Setup ENV
+os.environ["2KEYS_TEST"] = "true"
+
+import pytest
+from twokeys.watcher import Keyboard
+from twokeys.watcher.hotkeys import HotkeyIndex, standardise_hotkeys
+from twokeys.watcher.replay import synthetic_events, write_capture, read_capture, ReplayDevice, ReplayClient
+from twokeys.util.keyboard_map import keys as KEY_MAP
+
+CONFIG = { "addresses": { "server": { "ipv4": "127.0.0.1", "port": 9090 } } }
+
+# Hotkeys with every modifier on every letter & number, so there are a few hundred
+def many_hotkeys():
+  hotkeys = { "+A": "TestFunc" }
+  for modifier in ["^", "!", "+", "#", "^!", "^+", "!+"]:
+    for key in "BCDEFGHIJKLMNOPQRSTUVWXYZ0123456789":
+      hotkeys[modifier + key] = "Func"
+  return hotkeys
+
+def make_keyboard(hotkeys):
+  keyboard = Keyboard({ "path": "/dev/null", "hotkeys": hotkeys }, "keyboard", config=CONFIG, client=ReplayClient(), backend=None, device=ReplayDevice(), queue_size=100000)
+  keyboard.dispatcher.start()
+  return keyboard
+
+@pytest.fixture(params=["few_hotkeys", "many_hotkeys"])
+def keyboard(request):
+  keyboard = make_keyboard({ "+A": "TestFunc", "^!7": "MsgBox" } if request.param == "few_hotkeys" else many_hotkeys())
+  yield keyboard
+  keyboard.stop()
+
+def test_handle_events(benchmark, keyboard):
+  events = synthetic_events(1000)
+  benchmark(keyboard.handle_events, events)
+
+def test_check_for_hotkey(benchmark, keyboard):
+  pressed = keyboard.key_state.press(42) | 1 << 30 # Left shift + A
+  assert benchmark(keyboard.check_for_hotkey, pressed) == "+A"
+
+def test_compile_hotkey_index(benchmark):
+  hotkeys = standardise_hotkeys(many_hotkeys())
+  benchmark(HotkeyIndex, hotkeys, KEY_MAP)
+
+def test_read_capture(benchmark, tmp_path):
+  path = str(tmp_path / "capture.bin")
+  write_capture(path, synthetic_events(10000))
+  benchmark(read_capture, path)
@@ -0,0 +1,98 @@
+# Benchmark of the transports used to send triggers to the server
+# Sends triggers over HTTP (a request per trigger, on a kept alive connection) & over the trigger channel,
+# each to a local stand in server, so no server is needed
+# Usage: python3 benchmarks/transport.py [--triggers N] [--delay MS] [--batch N]
+import os
+import sys
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+
+from twokeys.watcher.trigger_client import TriggerClient
+from twokeys.watcher.channel import ChannelClient, ChannelServer
+
+# Time the stand in servers take to handle each request or frame, in seconds
+delay = 0
+
+class HTTPHandler(BaseHTTPRequestHandler):
+  protocol_version = "HTTP/1.1"
+  # Like the server, so small responses aren't held back by Nagle's algorithm
+  disable_nagle_algorithm = True
+
+  def do_POST(self):
+    self.rfile.read(int(self.headers["Content-Length"]))
+    if delay:
+      time.sleep(delay)
+    self.send_response(200)
+    self.send_header("Content-Length", "2")
+    self.end_headers()
+    self.wfile.write(b"OK")
+
+  def log_message(self, *args):
+    pass
+
+def config(port):
+  return { "addresses": { "server": { "ipv4": "127.0.0.1", "port": port } } }
+
+def send_triggers(client, triggers, batch):
+  client.prepare("keyboard", ["+A"])
+  start = time.perf_counter()
+  if batch > 1:
+    for first in range(0, triggers, batch):
+      client.send_batch("keyboard", [("+A", i % 2, time.time(), i + 1, None) for i in range(first, min(first + batch, triggers))], run="0123456789abcdef")
+  else:
+    for i in range(triggers):
+      client.send("keyboard", "+A", i % 2, run="0123456789abcdef", seq=i + 1)
+  return time.perf_counter() - start
+
+def bench_http(triggers, batch):
+  server = ThreadingHTTPServer(("127.0.0.1", 0), HTTPHandler)
+  server.daemon_threads = True
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  client = TriggerClient(config(server.server_address[1]))
+  try:
+    seconds = send_triggers(client, triggers, batch)
+    return seconds, seconds
+  finally:
+    client.close()
+    server.shutdown()
+    server.server_close()
+
+def bench_channel(triggers, batch):
+  def handler(type, message):
+    if delay:
+      time.sleep(delay)
+    return { "status": 200, "text": "OK" }
+  server = ChannelServer(handler=handler).start()
+  # Channel is on the port after the HTTP port
+  client = ChannelClient(config(server.server_address[1] - 1), max_unacked=triggers)
+  try:
+    start = time.perf_counter()
+    seconds = send_triggers(client, triggers, batch)
+    # Sends return before the server acks, so also time until all of them are acked
+    client.flush(60)
+    return seconds, time.perf_counter() - start
+  finally:
+    client.close()
+    server.stop()
+
+def main():
+  global delay
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--triggers", type=int, default=2000, help="Number of triggers to send")
+  parser.add_argument("--delay", type=float, default=0, help="Time in ms the stand in servers take to handle each request or frame")
+  parser.add_argument("--batch", type=int, default=1, help="Send triggers in batches of this many, in one request each")
+  args, _ = parser.parse_known_args()
+  delay = args.delay / 1000
+
+  for name, bench in (("http", bench_http), ("channel", bench_channel)):
+    sent, acked = bench(args.triggers, args.batch)
+    sys.stderr.write("%-7s %d triggers: sent in %.3fs (%.1f us each, %.0f triggers/s), all acked after %.3fs\n" % (
+      name, args.triggers, sent, sent / args.triggers * 1e6, args.triggers / sent, acked
+    ))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,111 @@
+import unittest
+import os
+import socket
+import threading
+import time
+
+# Setup ENV
+os.environ["2KEYS_TEST"] = "true"
+
+from twokeys.watcher.channel import ChannelClient, ChannelServer, FrameReader, make_frame, FRAME_TRIGGER, FRAME_UPDATE_KEYBOARD_PATHS, FRAME_ACK
+from twokeys.watcher.trigger_client import make_client, TriggerClient
+from twokeys.util.config import get_channel_address
+
+
+class TestChannel(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ChannelServer().start()
+        self.config = { "addresses": { "server": { "ipv4": "127.0.0.1", "port": self.server.server_address[1] - 1 } } }
+        self.client = ChannelClient(self.config)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def hotkeys(self):
+        return [message["hotkey"] for type, message in self.server.frames if type == FRAME_TRIGGER]
+
+    def test_address(self):
+        self.assertEqual(get_channel_address(self.config), self.server.server_address)
+        self.assertIsInstance(make_client(self.config, "channel"), ChannelClient)
+        self.assertIsInstance(make_client(self.config, "http"), TriggerClient)
+
+    def test_frames_split_across_reads(self):
+        data = make_frame(1, FRAME_ACK, b"{}") + make_frame(2, FRAME_ACK, b"[1]")
+        reader = FrameReader()
+        self.assertEqual(reader.feed(data[:5]), [])
+        self.assertEqual(reader.feed(data[5:13]), [(1, FRAME_ACK, b"{}")])
+        self.assertEqual(reader.feed(data[13:]), [(2, FRAME_ACK, b"[1]")])
+
+    def test_pipelines_triggers(self):
+        self.client.prepare("keyboard", ["+A"])
+        for i in range(100):
+            self.client.send("keyboard", "+A" if i % 2 == 0 else "^B", i % 2, run="0123456789abcdef", seq=i + 1)
+        self.assertTrue(self.client.flush(5))
+        self.assertEqual(self.hotkeys(), ["+A", "^B"] * 50)
+        self.assertEqual([message["seq"] for type, message in self.server.frames], list(range(1, 101)))
+        self.assertEqual(self.server.frames[0][1], { "keyboard": "keyboard", "hotkey": "+A", "value": 0, "run": "0123456789abcdef", "seq": 1 })
+        self.assertEqual(self.client.acked, 100)
+        # One connection for all of them
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_request(self):
+        reply = self.client.update_keyboard_paths({ "keyboard": "/dev/input/by-id/akbd" })
+        self.assertEqual(reply, { "status": 200, "text": "OK" })
+        self.assertEqual(self.server.frames, [(FRAME_UPDATE_KEYBOARD_PATHS, { "paths": { "keyboard": "/dev/input/by-id/akbd" } })])
+
+    def test_reconnects_and_resends_unacked(self):
+        acking = threading.Event()
+        acking.set()
+        def handler(type, message):
+            acking.wait()
+            return { "status": 200, "text": "OK" }
+        self.server.handler = handler
+        self.client.send("keyboard", "+A", 1, run="0123456789abcdef", seq=1)
+        self.assertTrue(self.client.flush(5))
+        # Server restarts before acking the next trigger
+        acking.clear()
+        self.client.send("keyboard", "^B", 1, run="0123456789abcdef", seq=2)
+        deadline = time.monotonic() + 5
+        while self.hotkeys() != ["+A", "^B"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.server.drop_connections()
+        acking.set()
+        # Sent again on a new connection, without another trigger to send
+        self.assertTrue(self.client.flush(5))
+        self.assertEqual(self.hotkeys(), ["+A", "^B", "^B"])
+        self.assertGreaterEqual(self.client.reconnects, 1)
+
+    def test_no_resend_without_seq(self):
+        acking = threading.Event()
+        def handler(type, message):
+            acking.wait()
+            return { "status": 200, "text": "OK" }
+        self.server.handler = handler
+        # Server restarts before acking, so the server can't tell if it ran it
+        self.client.send("keyboard", "+A", 1)
+        deadline = time.monotonic() + 5
+        while self.hotkeys() != ["+A"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.server.drop_connections()
+        acking.set()
+        deadline = time.monotonic() + 5
+        while self.client.forgotten == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.client.forgotten, 1)
+        self.assertTrue(self.client.flush(5))
+        self.assertEqual(self.hotkeys(), ["+A"])
+
+    def test_error_when_server_down(self):
+        self.server.stop()
+        # Port the server was on, now closed
+        client = ChannelClient(self.config)
+        with self.assertRaises(ConnectionError):
+            client.send("keyboard", "+A", 1)
+        self.assertEqual(len(client.unacked), 0)
+        client.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+import os
+import subprocess
+import sys
+
+# Setup ENV
+os.environ["2KEYS_TEST"] = "true"
+
+DETECTOR_ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+
+# Modules that only the commands that need them should import
+HEAVY_MODULES = ["evdev", "requests", "aiohttp", "aiofiles", "pystache", "yaml", "twokeys.util.keyboard_map"]
+
+
+class TestCLIStartup(unittest.TestCase):
+
+    def test_no_heavy_imports(self):
+        code = "import sys, twokeys.cli; print(' '.join(module for module in " + repr(HEAVY_MODULES) + " if module in sys.modules))"
+        result = subprocess.run([sys.executable, "-c", code], cwd=DETECTOR_ROOT, stdout=subprocess.PIPE, universal_newlines=True, check=True)
+        self.assertEqual(result.stdout.strip(), "")
+
+    def test_version(self):
+        result = subprocess.run([sys.executable, "-m", "twokeys", "version"], cwd=DETECTOR_ROOT, stdout=subprocess.PIPE, universal_newlines=True, check=True)
+        self.assertRegex(result.stdout.strip(), r"^\d+\.\d+\.\d+")
+
+
+class TestWatchOptions(unittest.TestCase):
+
+    def test_watch_commands_share_keyboard_options(self):
+        from twokeys.cli.cli import watch, watch_all, supervise
+        options = ["queue_size", "queue_policy", "block_timeout", "backend", "quiet_hot_path", "log_sample", "no_journal", "transport", "no_batch", "batch_window", "collapse_multi"]
+        for command in (watch, watch_all, supervise):
+            defaults = { param.name: param.default for param in command.params if param.name in options }
+            self.assertEqual(sorted(defaults), sorted(options), command.name)
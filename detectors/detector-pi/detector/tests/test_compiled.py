@@ -0,0 +1,68 @@
+import unittest
+import os
+import tempfile
+
+# Setup ENV
+os.environ["2KEYS_TEST"] = "true"
+
+from twokeys.watcher.compiled import compile_keyboard, write_snapshot, load_snapshot, snapshot_path
+from twokeys.util.keyboard_map import keys as KEY_MAP
+
+CONFIG = """name: MOCK
+addresses:
+  server:
+    ipv4: 127.0.0.1
+    port: 9090
+keyboards:
+  keyboard:
+    path: /dev/input/by-id/akbd
+    map:
+      Mic: 248
+    hotkeys:
+      ^A: TestFunc
+      (Mic):
+        type: up
+        func: Mute
+"""
+
+
+class TestCompiled(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "config.yml")
+        with open(self.path, "w") as config_file:
+            config_file.write(CONFIG)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_compile_keyboard(self):
+        compiled = compile_keyboard({ "map": { "Mic": 248 }, "hotkeys": { "(Mic)": "Mute" } })
+        self.assertEqual(compiled.map[248], "(Mic)")
+        self.assertIsNot(compiled.map, KEY_MAP)
+        self.assertEqual(compiled.hotkeys["(Mic)"], { "type": "down", "func": "Mute" })
+        self.assertEqual(compiled.index.match(1 << 248), "(Mic)")
+
+    def test_snapshot_round_trip(self):
+        write_snapshot(self.path)
+        config, keyboards = load_snapshot(self.path)
+        self.assertEqual(config["keyboards"]["keyboard"]["path"], "/dev/input/by-id/akbd")
+        compiled = keyboards["keyboard"]
+        self.assertEqual(compiled.map[248], "(Mic)")
+        self.assertEqual(compiled.hotkeys["^A"]["type"], "down")
+        self.assertEqual(compiled.index.match(1 << 248), "(Mic)")
+
+    def test_stale_snapshot(self):
+        write_snapshot(self.path)
+        with open(self.path, "a") as config_file:
+            config_file.write("# Changed\n")
+        self.assertIsNone(load_snapshot(self.path))
+
+    def test_no_snapshot(self):
+        self.assertIsNone(load_snapshot(self.path))
+
+    def test_corrupt_snapshot(self):
+        with open(snapshot_path(self.path), "wb") as snapshot_file:
+            snapshot_file.write(b"Not a pickle")
+        self.assertIsNone(load_snapshot(self.path))
@@ -0,0 +1,119 @@
+import unittest
+import os
+import threading
+
+# Setup ENV
+os.environ["2KEYS_TEST"] = "true"
+
+from twokeys.watcher.dispatcher import TriggerDispatcher, POLICY_BLOCK, POLICY_DROP_NEWEST, POLICY_DROP_OLDEST
+
+
+# Fake server, that doesn't respond until released
+class SlowSender:
+    def __init__(self):
+        self.sent = []
+        self.release = threading.Event()
+        self.started = threading.Event()
+
+    def __call__(self, hotkey, value):
+        self.started.set()
+        self.release.wait()
+        self.sent.append((hotkey, value))
+
+
+class TestDispatcher(unittest.TestCase):
+
+    def test_sends_in_order(self):
+        sender = SlowSender()
+        sender.release.set()
+        dispatcher = TriggerDispatcher(sender, "keyboard").start()
+        for i in range(10):
+            dispatcher.dispatch(str(i), 1)
+        dispatcher.stop()
+        self.assertEqual(sender.sent, [(str(i), 1) for i in range(10)])
+        self.assertEqual(dispatcher.stats()["sent"], 10)
+
+    def test_dispatch_does_not_wait_for_send(self):
+        sender = SlowSender()
+        dispatcher = TriggerDispatcher(sender, "keyboard", max_queue=4).start()
+        self.assertTrue(dispatcher.dispatch("+A", 1))
+        sender.started.wait(1)
+        self.assertTrue(dispatcher.dispatch("+A", 0))
+        self.assertEqual(dispatcher.depth, 1)
+        sender.release.set()
+        dispatcher.stop()
+        self.assertEqual(sender.sent, [("+A", 1), ("+A", 0)])
+
+    def test_drop_newest(self):
+        sender = SlowSender()
+        dispatcher = TriggerDispatcher(sender, "keyboard", max_queue=2, policy=POLICY_DROP_NEWEST).start()
+        dispatcher.dispatch("0", 1)
+        sender.started.wait(1)
+        results = [dispatcher.dispatch(str(i), 1) for i in range(1, 4)]
+        self.assertEqual(results, [True, True, False])
+        self.assertEqual(dispatcher.depth, 2)
+        sender.release.set()
+        dispatcher.stop()
+        self.assertEqual([hotkey for hotkey, value in sender.sent], ["0", "1", "2"])
+        self.assertEqual(dispatcher.dropped, 1)
+
+    def test_drop_oldest(self):
+        sender = SlowSender()
+        dispatcher = TriggerDispatcher(sender, "keyboard", max_queue=2, policy=POLICY_DROP_OLDEST).start()
+        dispatcher.dispatch("0", 1)
+        sender.started.wait(1)
+        results = [dispatcher.dispatch(str(i), 1) for i in range(1, 4)]
+        self.assertEqual(results, [True, True, True])
+        sender.release.set()
+        dispatcher.stop()
+        self.assertEqual([hotkey for hotkey, value in sender.sent], ["0", "2", "3"])
+        self.assertEqual(dispatcher.dropped, 1)
+
+    def test_block_timeout(self):
+        sender = SlowSender()
+        dispatcher = TriggerDispatcher(sender, "keyboard", max_queue=1, policy=POLICY_BLOCK, block_timeout=0.01).start()
+        dispatcher.dispatch("0", 1)
+        sender.started.wait(1)
+        self.assertTrue(dispatcher.dispatch("1", 1))
+        self.assertFalse(dispatcher.dispatch("2", 1))
+        sender.release.set()
+        dispatcher.stop()
+        self.assertEqual([hotkey for hotkey, value in sender.sent], ["0", "1"])
+
+    def test_send_errors_do_not_stop_worker(self):
+        sent = []
+        def send(hotkey, value):
+            if hotkey == "bad":
+                raise ValueError("Bad hotkey")
+            sent.append(hotkey)
+        dispatcher = TriggerDispatcher(send, "keyboard").start()
+        dispatcher.dispatch("bad", 1)
+        dispatcher.dispatch("good", 1)
+        dispatcher.stop()
+        self.assertEqual(sent, ["good"])
+        self.assertEqual(dispatcher.failed, 1)
+
+    def test_batch_sent_as_one(self):
+        sender = SlowSender()
+        batches = []
+        dispatcher = TriggerDispatcher(sender, "keyboard", max_queue=2, policy=POLICY_DROP_OLDEST, send_batch=batches.append).start()
+        dispatcher.dispatch("0", 1)
+        sender.started.wait(1)
+        self.assertTrue(dispatcher.dispatch_batch([("1", 1, 0, None, None), ("2", 1, 0, None, None)]))
+        self.assertTrue(dispatcher.dispatch_batch([("3", 1, 0, None, None), ("4", 0, 0, None, None)]))
+        # Queue full, so the oldest (the first batch) is dropped
+        self.assertTrue(dispatcher.dispatch("5", 1))
+        sender.release.set()
+        dispatcher.stop()
+        self.assertEqual(batches, [[("3", 1, 0, None, None), ("4", 0, 0, None, None)]])
+        self.assertEqual([hotkey for hotkey, value in sender.sent], ["0", "5"])
+        self.assertEqual(dispatcher.stats()["sent"], 4)
+        self.assertEqual(dispatcher.dropped, 2)
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            TriggerDispatcher(print, "keyboard", policy="explode")
+
+    
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+import os
+
+# Setup ENV
+os.environ["2KEYS_TEST"] = "true"
+
+from twokeys.watcher.hotkeys import standardise_hotkeys, names_to_codes, split_hotkey, HotkeyIndex
+from twokeys.watcher.key_state import KeyState
+from twokeys.util.keyboard_map import keys as KEY_MAP, key_codes
+from twokeys.util.constants import KEY_CNT
+from twokeys.watcher.compiled import compile_keyboard
+
+# Key codes used
+A = 30
+LEFTCTRL = 29
+RIGHTCTRL = 97
+LEFTSHIFT = 42
+RIGHTSHIFT = 54
+
+
+class TestHotkeys(unittest.TestCase):
+
+    def test_standardise_hotkeys(self):
+        hotkeys = standardise_hotkeys({
+            "+A": "TestFunc",
+            "^!7": { "func": "MsgBox" },
+            "^B": { "func": { "down": "Down", "up": "Up" } },
+            "^C": { "type": "up", "func": "OnUp" },
+        })
+        self.assertEqual(hotkeys["+A"], { "type": "down", "func": "TestFunc" })
+        self.assertEqual(hotkeys["^!7"]["type"], "down")
+        self.assertEqual(hotkeys["^B"]["type"], "multi")
+        self.assertEqual(hotkeys["^C"]["type"], "up")
+
+    def test_split_hotkey(self):
+        names = names_to_codes(KEY_MAP)
+        self.assertEqual(split_hotkey("+A", names), [["+", "A"]])
+        self.assertIn(["<^", "A"], split_hotkey("<^A", names))
+        self.assertIn(["$ESC$"], split_hotkey("$ESC$", names))
+        self.assertIn(["F12"], split_hotkey("F12", names))
+        self.assertIn(["F1", "2"], split_hotkey("F12", names))
+        self.assertEqual(split_hotkey("~", names), [])
+
+    def test_index_matches_regardless_of_order(self):
+        index = HotkeyIndex(standardise_hotkeys({ "+A": "TestFunc", "^!7": "MsgBox" }), KEY_MAP)
+        state = KeyState(KEY_MAP)
+        state.press(LEFTSHIFT)
+        state.press(A)
+        self.assertEqual(index.match(state.pressed), "+A")
+        state.clear()
+        state.press(A)
+        state.press(LEFTSHIFT)
+        self.assertEqual(index.match(state.pressed), "+A")
+
+    def test_index_resolves_multi_mapped_keys(self):
+        index = HotkeyIndex(standardise_hotkeys({ "+A": "Either", "<^A": "LeftCtrl" }), KEY_MAP)
+        self.assertEqual(index.match(1 << LEFTSHIFT | 1 << A), "+A")
+        self.assertEqual(index.match(1 << RIGHTSHIFT | 1 << A), "+A")
+        self.assertEqual(index.match(1 << LEFTCTRL | 1 << A), "<^A")
+        self.assertFalse(index.match(1 << RIGHTCTRL | 1 << A))
+
+    def test_index_no_match(self):
+        index = HotkeyIndex(standardise_hotkeys({ "+A": "TestFunc" }), KEY_MAP)
+        self.assertFalse(index.match(0))
+        self.assertFalse(index.match(1 << LEFTSHIFT))
+        self.assertFalse(index.match(1 << LEFTSHIFT | 1 << RIGHTSHIFT | 1 << A))
+
+    def test_index_first_duplicate_wins(self):
+        index = HotkeyIndex(standardise_hotkeys({ "+A": "First", "A+": "Second" }), KEY_MAP)
+        self.assertEqual(index.match(1 << LEFTSHIFT | 1 << A), "+A")
+
+
+class TestKeyState(unittest.TestCase):
+
+    def test_press_and_release(self):
+        state = KeyState(KEY_MAP)
+        state.press(A)
+        state.press(LEFTSHIFT)
+        self.assertTrue(state.is_pressed(A))
+        self.assertEqual(list(state.codes()), [A, LEFTSHIFT])
+        state.release(A)
+        self.assertFalse(state.is_pressed(A))
+        self.assertEqual(state.pressed, 1 << LEFTSHIFT)
+
+    def test_unmapped_keys_ignored(self):
+        state = KeyState(KEY_MAP)
+        state.press(0)
+        self.assertEqual(state.pressed, 0)
+
+
+
+class TestKeyMap(unittest.TestCase):
+
+    def test_full_range(self):
+        self.assertIsInstance(KEY_MAP, tuple)
+        self.assertEqual(len(KEY_MAP), KEY_CNT)
+        self.assertEqual(KEY_MAP[0x2a0], "") # Extended keys are unmapped, but not out of range
+
+    def test_key_codes(self):
+        self.assertEqual(key_codes["A"], (A,))
+        self.assertEqual(key_codes["+"], (LEFTSHIFT, RIGHTSHIFT))
+        self.assertIs(names_to_codes(KEY_MAP), key_codes)
+
+    def test_extended_key_mapping(self):
+        compiled = compile_keyboard({ "map": { "Extra": 0x2a0 }, "hotkeys": { "(Extra)": "Func" } })
+        self.assertEqual(compiled.index.match(1 << 0x2a0), "(Extra)")
+        state = KeyState(compiled.map)
+        state.press(0x2a0)
+        self.assertTrue(state.is_pressed(0x2a0))
+
+    
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,241 @@
+import unittest
+import os
+import tempfile
+import threading
+import time
+import requests
+
+# Setup ENV
+os.environ["2KEYS_TEST"] = "true"
+
+from twokeys.watcher import Keyboard
+from twokeys.watcher.journal import TriggerJournal, JournalReplayer, HEADER_SIZE, RECORD_SIZE
+from twokeys.watcher.replay import ReplayDevice
+
+CONFIG = { "addresses": { "server": { "ipv4": "127.0.0.1", "port": 9090 } } }
+
+LEFT_SHIFT = 42
+A = 30
+
+
+# Client for a server that can be taken down
+class FlakyClient:
+    def __init__(self):
+        self.down = False
+        self.status = 200 # Status the server replies with when up
+        self.sent = []
+        self.batches = []
+        self.tries = 0
+        self.lock = threading.Lock()
+
+    def prepare(self, keyboard, hotkeys):
+        pass
+
+    def send(self, keyboard, hotkey, value, run=None, seq=None, held=None):
+        with self.lock:
+            self.tries += 1
+            if self.down:
+                raise requests.exceptions.ConnectionError("Server down")
+            if self.status != 200:
+                return self.reply()
+            self.sent.append((hotkey, value, seq))
+
+    def send_batch(self, keyboard, triggers, run=None):
+        with self.lock:
+            self.tries += 1
+            if self.down:
+                raise requests.exceptions.ConnectionError("Server down")
+            if self.status != 200:
+                return self.reply()
+            self.sent.extend((hotkey, value, seq) for hotkey, value, ts, seq, held in triggers)
+            self.batches.append((run, [seq for hotkey, value, ts, seq, held in triggers]))
+
+    def reply(self):
+        reply = requests.Response()
+        reply.status_code = self.status
+        return reply
+
+    def close(self):
+        pass
+
+
+class TestTriggerJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "keyboard.journal")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_append_and_ack(self):
+        journal = TriggerJournal(self.path)
+        self.assertFalse(journal.pending())
+        journal.append(journal.next_seq(), "+A", 1)
+        journal.append(journal.next_seq(), "^!7", 0)
+        # Synced to disk together, not on each append
+        self.assertTrue(journal.dirty)
+        journal.sync()
+        self.assertFalse(journal.dirty)
+        first, entries = journal.entries()
+        self.assertEqual([(entry.hotkey, entry.value, entry.seq, entry.run) for entry in entries], [("+A", 1, 1, journal.run_id), ("^!7", 0, 2, journal.run_id)])
+        journal.ack(first + 1)
+        self.assertEqual([entry.hotkey for entry in journal.entries()[1]], ["^!7"])
+        journal.ack(first + 2)
+        self.assertFalse(journal.pending())
+        journal.close()
+
+    def test_kept_between_runs(self):
+        journal = TriggerJournal(self.path)
+        journal.append(journal.next_seq(), "+A", 1)
+        run = journal.run_id
+        journal.close()
+        journal = TriggerJournal(self.path)
+        self.assertNotEqual(journal.run_id, run)
+        entries = journal.entries()[1]
+        self.assertEqual([(entry.hotkey, entry.run, entry.seq) for entry in entries], [("+A", run, 1)])
+        journal.close()
+
+    def test_bounded(self):
+        # Space for 3 triggers
+        journal = TriggerJournal(self.path, size=HEADER_SIZE + 3 * (RECORD_SIZE + 2))
+        for seq in range(1, 4):
+            journal.append(seq, "+A", 1)
+        first, entries = journal.entries()
+        # Sent one, so there's space at the start once the rest are moved there
+        journal.ack(first + 1)
+        journal.append(4, "+A", 1)
+        self.assertEqual([entry.seq for entry in journal.entries()[1]], [2, 3, 4])
+        self.assertEqual(journal.dropped, 0)
+        # Full, so the oldest is dropped
+        journal.append(5, "+A", 1)
+        first, entries = journal.entries()
+        self.assertEqual([entry.seq for entry in entries], [3, 4, 5])
+        self.assertEqual(journal.dropped, 1)
+        # Acking a batch read before the drop doesn't remove the trigger that took its place
+        journal.ack(first + 1)
+        self.assertEqual([entry.seq for entry in journal.entries()[1]], [4, 5])
+        journal.close()
+
+    def test_bad_journal(self):
+        with open(self.path, "wb") as journal_file:
+            journal_file.write(b"not a journal" * 100)
+        journal = TriggerJournal(self.path)
+        self.assertFalse(journal.pending())
+        journal.append(1, "+A", 1)
+        self.assertEqual(len(journal), 1)
+        journal.close()
+
+
+class TestJournalReplayer(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "keyboard.journal")
+        self.client = FlakyClient()
+        keyboard = { "path": "/dev/input/by-id/akbd", "hotkeys": { "+A": "TestFunc" } }
+        self.keyboard = Keyboard(keyboard, "keyboard", config=CONFIG, client=self.client, backend=None, device=ReplayDevice(), journal=self.path)
+        self.keyboard.replayer.backoff_min = 0.01
+        self.keyboard.replayer.backoff_max = 0.02
+        self.keyboard.dispatcher.start()
+
+    def tearDown(self):
+        self.keyboard.stop()
+        self.dir.cleanup()
+
+    def press_hotkey(self):
+        self.keyboard.handle_events([(0, 0, 1, LEFT_SHIFT, 1), (0, 0, 1, A, 1), (0, 0, 1, A, 0), (0, 0, 1, LEFT_SHIFT, 0)])
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(condition())
+
+    def test_sends_saved_hotkeys_when_server_back(self):
+        self.press_hotkey()
+        self.wait_for(lambda: len(self.client.sent) == 1)
+        self.client.down = True
+        self.press_hotkey()
+        self.wait_for(lambda: len(self.keyboard.journal) == 1)
+        # While hotkeys are waiting, new ones go after them instead of trying the server first
+        tries = self.client.tries
+        self.press_hotkey()
+        self.wait_for(lambda: len(self.keyboard.journal) == 2)
+        self.assertLess(self.client.tries - tries, 2)
+        self.client.down = False
+        self.wait_for(lambda: not self.keyboard.journal.pending())
+        self.assertEqual(self.client.sent, [("+A", 1, 1), ("+A", 1, 2), ("+A", 1, 3)])
+        # Both saved hotkeys sent in one request
+        self.assertEqual(self.client.batches, [(self.keyboard.journal.run_id, [2, 3])])
+        self.assertEqual(self.keyboard.stats()["replayed"], 2)
+        # Back to sending straight away
+        self.press_hotkey()
+        self.wait_for(lambda: len(self.client.sent) == 4)
+        self.assertEqual(self.keyboard.replayer.sent, 2)
+
+    def test_saves_batches_in_order(self):
+        self.client.down = True
+        # Pressed twice in one frame
+        self.keyboard.handle_events([(0, 0, 1, LEFT_SHIFT, 1), (0, 0, 1, A, 1), (0, 0, 1, A, 0), (0, 0, 1, A, 1), (0, 0, 0, 0, 0), (0, 0, 1, A, 0), (0, 0, 1, LEFT_SHIFT, 0)])
+        self.wait_for(lambda: len(self.keyboard.journal) == 2)
+        self.client.down = False
+        self.wait_for(lambda: not self.keyboard.journal.pending())
+        self.assertEqual(self.client.sent, [("+A", 1, 1), ("+A", 1, 2)])
+
+    def test_saves_hotkeys_server_replied_error_to(self):
+        # i.e. a server without the route
+        self.client.status = 404
+        self.press_hotkey()
+        self.wait_for(lambda: len(self.keyboard.journal) == 1)
+        self.keyboard.handle_events([(0, 0, 1, LEFT_SHIFT, 1), (0, 0, 1, A, 1), (0, 0, 1, A, 0), (0, 0, 1, A, 1), (0, 0, 0, 0, 0), (0, 0, 1, A, 0), (0, 0, 1, LEFT_SHIFT, 0)])
+        self.wait_for(lambda: len(self.keyboard.journal) == 3)
+        # Replies to the replayer are errors too, so they're kept
+        self.assertEqual(self.keyboard.replayer.sent, 0)
+        self.wait_for(lambda: self.keyboard.stats()["failed"] == 3)
+        self.client.status = 200
+        self.wait_for(lambda: not self.keyboard.journal.pending())
+        self.assertEqual(self.client.sent, [("+A", 1, 1), ("+A", 1, 2), ("+A", 1, 3)])
+
+    def test_saves_time_pressed(self):
+        self.keyboard.replayer.stop() # Else it would drop them before they're checked
+        self.client.down = True
+        pressed = int(time.time()) - 3600
+        # On its own, then in a batch
+        self.keyboard.handle_events([(pressed, 0, 1, LEFT_SHIFT, 1), (pressed, 0, 1, A, 1), (pressed, 0, 0, 0, 0), (pressed + 1, 0, 1, A, 0), (pressed + 1, 0, 1, A, 1), (pressed + 1, 0, 1, A, 0), (pressed + 2, 0, 1, A, 1), (pressed + 2, 0, 0, 0, 0)])
+        self.wait_for(lambda: len(self.keyboard.journal) == 3)
+        self.assertEqual([entry.time for entry in self.keyboard.journal.entries()[1]], [pressed, pressed + 1, pressed + 2])
+        # So they're too old to send
+        replayer = JournalReplayer(self.keyboard.journal, self.keyboard.resend_hotkeys, "keyboard", ttl=60)
+        self.client.down = False
+        self.assertTrue(replayer.drain())
+        self.assertEqual(replayer.expired, 3)
+        self.assertEqual(self.client.sent, [])
+
+    def test_expires_old_hotkeys(self):
+        self.keyboard.replayer.stop()
+        journal = self.keyboard.journal
+        journal.append(journal.next_seq(), "+A", 1, at=time.time() - 3600)
+        journal.append(journal.next_seq(), "+A", 1)
+        replayer = JournalReplayer(journal, self.keyboard.resend_hotkeys, "keyboard", ttl=60)
+        self.assertTrue(replayer.drain())
+        self.assertEqual(replayer.expired, 1)
+        self.assertEqual(self.client.sent, [("+A", 1, 2)])
+        self.assertFalse(journal.pending())
+
+    def test_batch_per_run(self):
+        self.keyboard.replayer.stop()
+        journal = self.keyboard.journal
+        # Left from the last run
+        journal.run = b"lastrun!"
+        journal.append(7, "+A", 1)
+        journal.run = bytes.fromhex(journal.run_id)
+        journal.append(journal.next_seq(), "+A", 1)
+        journal.append(journal.next_seq(), "+A", 0)
+        replayer = JournalReplayer(journal, self.keyboard.resend_hotkeys, "keyboard", batch_size=2)
+        self.assertTrue(replayer.drain())
+        self.assertEqual(self.client.batches, [(b"lastrun!".hex(), [7]), (journal.run_id, [1]), (journal.run_id, [2])])
+
+
+if __name__ == '__main__':
+    unittest.main()
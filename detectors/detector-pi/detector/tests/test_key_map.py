@@ -0,0 +1,50 @@
+import unittest
+import os
+import pickle
+
+# Setup ENV
+os.environ["2KEYS_TEST"] = "true"
+
+from twokeys.watcher.key_map import KeyMap
+from twokeys.watcher.compiled import compile_keyboard
+from twokeys.util.keyboard_map import keys as KEY_MAP
+
+A = 30
+LEFTSHIFT = 42
+RIGHTSHIFT = 54
+
+
+class TestKeyMap(unittest.TestCase):
+
+    def test_overlay(self):
+        key_map = KeyMap()
+        key_map[A] = "(Macro)"
+        self.assertEqual(key_map[A], "(Macro)")
+        self.assertEqual(key_map[A + 1], KEY_MAP[A + 1])
+        self.assertEqual(KEY_MAP[A], "A")
+        self.assertEqual(len(key_map), len(KEY_MAP))
+        with self.assertRaises(IndexError):
+            key_map[len(KEY_MAP)] = "(Nope)"
+
+    def test_codes(self):
+        key_map = KeyMap()
+        key_map[RIGHTSHIFT] = "(Macro)"
+        codes = key_map.codes()
+        self.assertEqual(codes["(Macro)"], (RIGHTSHIFT,))
+        self.assertEqual(codes["+"], (LEFTSHIFT,))
+        self.assertEqual(codes["A"], (A,))
+
+    def test_keyboards_do_not_share_mappings(self):
+        first = compile_keyboard({ "map": { "Macro": A }, "hotkeys": { "(Macro)": "First" } })
+        second = compile_keyboard({ "hotkeys": { "A": "Second" } })
+        self.assertEqual(first.index.match(1 << A), "(Macro)")
+        self.assertEqual(second.index.match(1 << A), "A")
+        self.assertIs(second.map, KEY_MAP)
+        self.assertIs(first.map.base, KEY_MAP)
+
+    def test_pickle_shares_base(self):
+        compiled = pickle.loads(pickle.dumps(compile_keyboard({ "map": { "Macro": A }, "hotkeys": { "(Macro)": "Func" } })))
+        self.assertIs(compiled.map.base, KEY_MAP)
+        self.assertEqual(compiled.map[A], "(Macro)")
+        plain = pickle.loads(pickle.dumps(compile_keyboard({ "hotkeys": { "A": "Func" } })))
+        self.assertIs(plain.map, KEY_MAP)
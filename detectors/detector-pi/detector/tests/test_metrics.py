@@ -0,0 +1,82 @@
+import unittest
+import os
+import tempfile
+import time
+import urllib.request
+
+# Setup ENV
+os.environ["2KEYS_TEST"] = "true"
+
+from twokeys.watcher.metrics import LatencyHistogram, MetricsRegistry, TriggerTiming, serve_metrics
+from twokeys.watcher.dispatcher import TriggerDispatcher
+
+
+class TestLatencyHistogram(unittest.TestCase):
+
+    def test_buckets(self):
+        histogram = LatencyHistogram([0.001, 0.01, 0.1])
+        for seconds in [0.0005, 0.001, 0.005, 0.05, 1]:
+            histogram.observe(seconds)
+        self.assertEqual(histogram.cumulative(), [2, 3, 4, 5])
+        self.assertEqual(histogram.count, 5)
+        self.assertAlmostEqual(histogram.sum, 1.0565)
+
+
+class TestMetricsRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = MetricsRegistry(buckets=[0.001, 0.01])
+        timing = TriggerTiming(100, 0, 100.0005)
+        timing.queued = 100.0006
+        timing.sending = 100.002
+        timing.done = 100.02
+        self.registry.observe_trigger("keyboard_1", timing)
+
+    def test_stages(self):
+        self.assertEqual(self.registry.histogram("keyboard_1", "match").cumulative(), [1, 1, 1])
+        self.assertEqual(self.registry.histogram("keyboard_1", "queue").cumulative(), [0, 1, 1])
+        self.assertEqual(self.registry.histogram("keyboard_1", "send").cumulative(), [0, 0, 1])
+        self.assertEqual(self.registry.histogram("keyboard_1", "total").cumulative(), [0, 0, 1])
+
+    def test_render(self):
+        self.registry.add_dispatcher("keyboard_1", TriggerDispatcher(lambda hotkey, value: None, "keyboard_1"))
+        text = self.registry.render()
+        self.assertIn('twokeys_trigger_latency_seconds_bucket{keyboard="keyboard_1",stage="match",le="0.001"} 1', text)
+        self.assertIn('twokeys_trigger_latency_seconds_bucket{keyboard="keyboard_1",stage="total",le="+Inf"} 1', text)
+        self.assertIn('twokeys_trigger_latency_seconds_count{keyboard="keyboard_1",stage="send"} 1', text)
+        self.assertIn('twokeys_triggers_depth{keyboard="keyboard_1"} 0', text)
+        self.assertIn('twokeys_triggers_dropped_total{keyboard="keyboard_1"} 0', text)
+        self.assertTrue(text.endswith("\n"))
+
+    def test_render_failed(self):
+        # Server can't be reached
+        dispatcher = TriggerDispatcher(lambda hotkey, value: False, "keyboard_1").start()
+        self.registry.add_dispatcher("keyboard_1", dispatcher)
+        dispatcher.dispatch("^A", 1)
+        dispatcher.stop()
+        text = self.registry.render()
+        self.assertIn('twokeys_triggers_sent_total{keyboard="keyboard_1"} 0', text)
+        self.assertIn('twokeys_triggers_failed_total{keyboard="keyboard_1"} 1', text)
+
+    def test_serve(self):
+        server = serve_metrics(self.registry, "127.0.0.1:0")
+        try:
+            port = server.server_address[1]
+            with urllib.request.urlopen("http://127.0.0.1:" + str(port) + "/metrics", timeout=5) as response:
+                self.assertEqual(response.read().decode("utf-8"), self.registry.render())
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+class TestDispatcherTiming(unittest.TestCase):
+
+    def test_stamps_timing(self):
+        sent = []
+        dispatcher = TriggerDispatcher(lambda hotkey, value, timing: sent.append(timing), "keyboard").start()
+        timing = TriggerTiming(int(time.time()), 0, time.time())
+        dispatcher.dispatch("^A", 1, timing)
+        dispatcher.stop()
+        self.assertEqual(sent, [timing])
+        self.assertLessEqual(timing.matched, timing.queued)
+        self.assertLessEqual(timing.queued, timing.sending)
@@ -0,0 +1,55 @@
+import unittest
+import os
+import struct
+
+# Setup ENV
+os.environ["2KEYS_TEST"] = "true"
+
+from twokeys.watcher.raw_reader import RawEventReader
+from twokeys.util.constants import KEYBOARD_EVENT_FORMAT
+
+
+class TestRawEventReader(unittest.TestCase):
+
+    def setUp(self):
+        # Pipe stands in for the keyboard's /dev/input file
+        self.read_fd, self.write_fd = os.pipe()
+        os.set_blocking(self.read_fd, False)
+
+    def tearDown(self):
+        os.close(self.read_fd)
+        os.close(self.write_fd)
+
+    def write_events(self, events):
+        os.write(self.write_fd, b"".join(struct.pack(KEYBOARD_EVENT_FORMAT, *event) for event in events))
+
+    def test_reads_batch(self):
+        events = [(1, 500, 1, 30, 1), (1, 500, 0, 0, 0), (2, 10, 1, 30, 0)]
+        self.write_events(events)
+        reader = RawEventReader(self.read_fd)
+        self.assertEqual(list(reader.read()), events)
+
+    def test_reads_up_to_batch_size(self):
+        events = [(i, 0, 1, 30, i % 2) for i in range(5)]
+        self.write_events(events)
+        reader = RawEventReader(self.read_fd, batch=2)
+        self.assertEqual(list(reader.read()), events[0:2])
+        self.assertEqual(list(reader.read()), events[2:4])
+        self.assertEqual(list(reader.read()), events[4:5])
+
+    def test_nothing_waiting(self):
+        reader = RawEventReader(self.read_fd)
+        with self.assertRaises(BlockingIOError):
+            reader.read()
+
+    def test_read_loop_timeout(self):
+        reader = RawEventReader(self.read_fd)
+        loop = reader.read_loop(lambda: 0.01)
+        # Nothing waiting, so gives no events once the timeout is up
+        self.assertEqual(list(next(loop)), [])
+        self.write_events([(1, 500, 1, 30, 1)])
+        self.assertEqual(list(next(loop)), [(1, 500, 1, 30, 1)])
+
+    
+if __name__ == '__main__':
+    unittest.main()
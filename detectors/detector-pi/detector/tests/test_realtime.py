@@ -0,0 +1,81 @@
+import unittest
+import os
+import gc
+import threading
+
+# Setup ENV
+os.environ["2KEYS_TEST"] = "true"
+
+from twokeys.watcher import Keyboard
+from twokeys.util.constants import REALTIME_STACK_SIZE
+from twokeys.watcher.realtime import apply_realtime, parse_cpus, set_stack_size
+from twokeys.watcher.replay import ReplayDevice, ReplayClient
+from twokeys.daemon.scripts import realtime_unit_options
+
+CONFIG = { "addresses": { "server": { "ipv4": "127.0.0.1", "port": 9090 } } }
+
+
+class TestRealtime(unittest.TestCase):
+
+    def setUp(self):
+        self.client = ReplayClient()
+        keyboard = { "path": "/dev/input/by-id/akbd", "hotkeys": { "+A": "TestFunc", "^!7": "MsgBox" } }
+        self.keyboard = Keyboard(keyboard, "keyboard", config=CONFIG, client=self.client, backend=None, device=ReplayDevice())
+        self.affinity = os.sched_getaffinity(0)
+
+    def tearDown(self):
+        gc.unfreeze()
+        os.sched_setaffinity(0, self.affinity)
+        self.keyboard.stop()
+
+    def test_parse_cpus(self):
+        self.assertIsNone(parse_cpus(None))
+        self.assertEqual(parse_cpus("0,2"), [0, 2])
+        self.assertEqual(parse_cpus("auto"), sorted(os.sched_getaffinity(0)))
+
+    def test_prefaults_without_sending(self):
+        self.keyboard.dispatcher.start()
+        self.assertTrue(apply_realtime([self.keyboard]))
+        self.assertGreater(gc.get_freeze_count(), 0)
+        self.keyboard.dispatcher.stop()
+        self.assertEqual(self.client.sent, [])
+        self.assertEqual(self.keyboard.key_state.pressed, 0)
+
+    def test_pins_cpus(self):
+        cpu = min(self.affinity)
+        self.assertTrue(apply_realtime(cpus=[cpu]))
+        self.assertEqual(os.sched_getaffinity(0), {cpu})
+
+    def test_skips_options_it_cant_apply(self):
+        # No CPU has this number, so the affinity can't be set, but the rest is still applied
+        self.assertFalse(apply_realtime([self.keyboard], cpus=[4096]))
+        self.assertEqual(os.sched_getaffinity(0), self.affinity)
+        self.assertGreater(gc.get_freeze_count(), 0)
+
+    def test_sets_stack_size(self):
+        try:
+            set_stack_size()
+            self.assertEqual(threading.stack_size(), REALTIME_STACK_SIZE)
+            # Big enough for the dispatcher to send hotkeys
+            self.keyboard.dispatcher.start()
+            self.keyboard.dispatcher.dispatch("+A", 1)
+            self.keyboard.dispatcher.stop()
+            self.assertEqual(len(self.client.sent), 1)
+        finally:
+            threading.stack_size(0)
+
+    def test_unit_options(self):
+        self.assertEqual(realtime_unit_options(), ("", ""))
+        settings, options = realtime_unit_options(sched="fifo", priority=80, nice=-5, cpus="1,2", mlock=True)
+        self.assertEqual(settings.split("\n"), [
+            "CPUSchedulingPolicy=fifo",
+            "CPUSchedulingPriority=80",
+            "Nice=-5",
+            "CPUAffinity=1,2",
+            "LimitMEMLOCK=infinity",
+        ])
+        self.assertEqual(options, "--mlock")
+
+
+if __name__ == '__main__':
+    unittest.main()
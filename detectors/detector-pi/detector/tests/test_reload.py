@@ -0,0 +1,92 @@
+import unittest
+import os
+import tempfile
+import threading
+
+# Setup ENV
+os.environ["2KEYS_TEST"] = "true"
+
+from twokeys.watcher import Keyboard
+from twokeys.watcher.reload import FileWatcher, Reloader
+from twokeys.watcher.replay import ReplayDevice, ReplayClient
+
+CONFIG = """addresses:
+  server:
+    ipv4: 127.0.0.1
+    port: 9090
+keyboards:
+  keyboard:
+    path: /dev/input/by-id/akbd
+    hotkeys:
+      {hotkey}: TestFunc
+"""
+
+LEFT_SHIFT = 42
+A = 30
+B = 48
+
+
+class TestReload(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "config.yml")
+        self.write("+A")
+        self.client = ReplayClient()
+        config = { "addresses": { "server": { "ipv4": "127.0.0.1", "port": 9090 } } }
+        keyboard = { "path": "/dev/input/by-id/akbd", "hotkeys": { "+A": "TestFunc" } }
+        self.keyboard = Keyboard(keyboard, "keyboard", config=config, client=self.client, backend=None, device=ReplayDevice())
+        self.keyboard.dispatcher.start()
+
+    def tearDown(self):
+        self.keyboard.stop()
+        self.dir.cleanup()
+
+    def write(self, hotkey):
+        with open(self.path, "w") as config_file:
+            config_file.write(CONFIG.format(hotkey=hotkey))
+
+    def press(self, code, value):
+        self.keyboard.handle_events([(0, 0, 1, code, value)])
+
+    def test_swaps_between_events(self):
+        self.press(LEFT_SHIFT, 1)
+        self.write("+B")
+        self.assertTrue(Reloader([self.keyboard], self.path).reload())
+        # Not swapped until the next batch of events, which still has shift held
+        self.press(B, 1)
+        self.keyboard.dispatcher.stop()
+        self.assertEqual(self.client.sent, [("keyboard", "+B", 1)])
+        self.assertIn("+B", self.keyboard.hotkeys)
+        self.assertNotIn("+A", self.keyboard.hotkeys)
+
+    def test_bad_config_keeps_current(self):
+        with open(self.path, "w") as config_file:
+            config_file.write("keyboards: {}\n")
+        self.assertFalse(Reloader([self.keyboard], self.path).reload())
+        self.press(LEFT_SHIFT, 1)
+        self.press(A, 1)
+        self.keyboard.dispatcher.stop()
+        self.assertEqual(self.client.sent, [("keyboard", "+A", 1)])
+
+
+class TestFileWatcher(unittest.TestCase):
+
+    def test_sees_changes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "config.yml")
+            changed = threading.Event()
+            watcher = FileWatcher(path, changed.set)
+            if not watcher.start():
+                self.skipTest("inotify not available")
+            try:
+                with open(os.path.join(directory, "other.yml"), "w") as other:
+                    other.write("Not watched")
+                self.assertFalse(changed.wait(0.2))
+                # Atomic write
+                with open(path + ".tmp", "w") as config_file:
+                    config_file.write("Changed")
+                os.replace(path + ".tmp", path)
+                self.assertTrue(changed.wait(5))
+            finally:
+                watcher.stop()
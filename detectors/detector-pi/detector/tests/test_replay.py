@@ -0,0 +1,73 @@
+import unittest
+import os
+import tempfile
+
+# Setup ENV
+os.environ["2KEYS_TEST"] = "true"
+
+from twokeys.watcher.replay import write_capture, read_capture, synthetic_events, replay_keyboard
+
+CONFIG = {
+    "addresses": { "server": { "ipv4": "127.0.0.1", "port": 9090 } },
+    "keyboards": {
+        "keyboard": {
+            "path": "/dev/input/by-id/akbd",
+            "hotkeys": { "+A": "TestFunc", "^!7": "MsgBox" },
+        },
+    },
+}
+
+
+class TestReplay(unittest.TestCase):
+
+    def test_capture_round_trip(self):
+        events = synthetic_events(20)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "capture.bin")
+            self.assertEqual(write_capture(path, events), len(events))
+            self.assertEqual(read_capture(path), events)
+
+    def test_not_a_capture(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "capture.bin")
+            with open(path, "wb") as capture:
+                capture.write(b"Not a capture")
+            with self.assertRaises(ValueError):
+                read_capture(path)
+
+    def test_replay_triggers_hotkeys(self):
+        # Left shift + A every 10 keys, sent on down only
+        stats = replay_keyboard(CONFIG, "keyboard", synthetic_events(100, hotkey_every=10))
+        self.assertEqual(stats["events"], 90 * 4 + 10 * 8)
+        self.assertEqual(stats["triggers"], 10)
+        self.assertGreater(stats["events_per_second"], 0)
+        self.assertLessEqual(stats["p50_us"], stats["p99_us"])
+
+    def test_batches_triggers_from_one_frame(self):
+        # Left shift + A, then Ctrl + Alt + 7, all in one frame
+        frame = [(1, 0, 1, 42, 1), (1, 0, 1, 30, 1), (1, 0, 1, 30, 0), (1, 0, 1, 42, 0), (1, 0, 1, 29, 1), (1, 0, 1, 56, 1), (1, 0, 1, 8, 1), (1, 0, 0, 0, 0)]
+        release = [(1, 10, 1, 8, 0), (1, 10, 1, 56, 0), (1, 10, 1, 29, 0), (1, 10, 0, 0, 0)]
+        stats = replay_keyboard(CONFIG, "keyboard", frame + release)
+        self.assertEqual(stats["triggers"], 2)
+        self.assertEqual(stats["batches"], 1)
+        stats = replay_keyboard(CONFIG, "keyboard", frame + release, batch=False)
+        self.assertEqual(stats["triggers"], 2)
+        self.assertEqual(stats["batches"], 0)
+
+    def test_batch_window(self):
+        # A hotkey in each of 10 frames, 100us apart, so they're only batched if in the window
+        events = []
+        for i in range(10):
+            events += [(1, i * 100, 1, 42, 1), (1, i * 100, 1, 30, 1), (1, i * 100, 0, 0, 0), (1, i * 100 + 50, 1, 30, 0), (1, i * 100 + 50, 1, 42, 0), (1, i * 100 + 50, 0, 0, 0)]
+        stats = replay_keyboard(CONFIG, "keyboard", events)
+        self.assertEqual((stats["triggers"], stats["batches"]), (10, 0))
+        stats = replay_keyboard(CONFIG, "keyboard", events, batch_window=10000000)
+        self.assertEqual((stats["triggers"], stats["batches"]), (10, 1))
+
+    def test_replay_allocations(self):
+        stats = replay_keyboard(CONFIG, "keyboard", synthetic_events(10), allocations=True)
+        self.assertIn("peak_bytes", stats)
+
+    
+if __name__ == '__main__':
+    unittest.main()
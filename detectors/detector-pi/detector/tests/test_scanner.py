@@ -0,0 +1,111 @@
+import unittest
+import os
+import struct
+import tempfile
+import threading
+import time
+
+# Setup ENV
+os.environ["2KEYS_TEST"] = "true"
+
+from twokeys.add_keyboard.scanner import KeyboardScanner, scan_for_keyboard
+from twokeys.add_keyboard.add_keyboard import identify_keyboards, save_keyboard_paths
+from twokeys.util.config import load_config
+from twokeys.util.constants import KEYBOARD_EVENT_FORMAT
+
+def event(type, code, value):
+    return struct.pack(KEYBOARD_EVENT_FORMAT, 0, 0, type, code, value)
+
+
+# Input devices stood in for by FIFOs, which can be selected on & written to like a device is by the kernel
+class TestScanner(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.writers = {}
+        for device in ["keyboard-a", "keyboard-b", "mouse"]:
+            os.mkfifo(os.path.join(self.dir.name, device))
+
+    def tearDown(self):
+        for fd in self.writers.values():
+            os.close(fd)
+        self.dir.cleanup()
+
+    # Open the devices for writing, once the scanner has them open for reading
+    def open_writers(self):
+        for device in os.listdir(self.dir.name):
+            self.writers[device] = os.open(os.path.join(self.dir.name, device), os.O_WRONLY | os.O_NONBLOCK)
+
+    def test_finds_key_press(self):
+        with KeyboardScanner(self.dir.name) as scanner:
+            self.assertEqual(len(scanner.devices()), 3)
+            self.open_writers()
+            os.write(self.writers["mouse"], event(2, 0, 5)) # Mouse movement isn't a key press
+            os.write(self.writers["keyboard-b"], event(1, 30, 1) + event(0, 0, 0))
+            self.assertEqual(scanner.scan(5), os.path.join(self.dir.name, "keyboard-b"))
+
+    def test_timeout(self):
+        with KeyboardScanner(self.dir.name) as scanner:
+            self.open_writers()
+            start = time.monotonic()
+            self.assertIsNone(scanner.scan(0.1))
+            self.assertLess(time.monotonic() - start, 2)
+
+    def test_unplugged_device(self):
+        with KeyboardScanner(self.dir.name) as scanner:
+            self.open_writers()
+            os.close(self.writers.pop("keyboard-a")) # EOF, as if unplugged
+            self.assertIsNone(scanner.scan(0.1))
+            self.assertEqual(len(scanner.devices()), 2)
+            os.write(self.writers["keyboard-b"], event(1, 30, 1))
+            self.assertEqual(scanner.scan(5), os.path.join(self.dir.name, "keyboard-b"))
+
+
+class TestIdentifyKeyboards(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.dir = tempfile.TemporaryDirectory()
+        self.inputs = os.path.join(self.dir.name, "by-id")
+        os.mkdir(self.inputs)
+        for device in ["keyboard-a", "keyboard-b"]:
+            os.mkfifo(os.path.join(self.inputs, device))
+        os.chdir(self.dir.name)
+        with open("config.yml", "w") as config_file:
+            config_file.write("name: MOCK\nkeyboards:\n  first:\n    hotkeys: {}\n  second:\n    hotkeys: {}\n")
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.dir.cleanup()
+
+    def test_identifies_each_keyboard_in_turn(self):
+        # Held open so the FIFOs can be opened for writing before the scanner opens them
+        readers = [os.open(os.path.join(self.inputs, device), os.O_RDONLY | os.O_NONBLOCK) for device in ["keyboard-a", "keyboard-b"]]
+        writers = { device: os.open(os.path.join(self.inputs, device), os.O_WRONLY | os.O_NONBLOCK) for device in ["keyboard-a", "keyboard-b"] }
+        # b for the first keyboard, then a for the second
+        def press():
+            time.sleep(0.2)
+            os.write(writers["keyboard-b"], event(1, 30, 1))
+            time.sleep(0.2)
+            os.write(writers["keyboard-b"], event(1, 30, 1)) # Already identified, so ignored
+            os.write(writers["keyboard-a"], event(1, 30, 1))
+        thread = threading.Thread(target=press)
+        thread.start()
+        try:
+            paths = identify_keyboards(["first", "second"], self.inputs, timeout=5)
+        finally:
+            thread.join()
+            for fd in readers + list(writers.values()):
+                os.close(fd)
+        self.assertEqual(paths, {
+            "first": os.path.join(self.inputs, "keyboard-b"),
+            "second": os.path.join(self.inputs, "keyboard-a"),
+        })
+
+    def test_saves_all_paths_at_once(self):
+        save_keyboard_paths({ "first": "/dev/input/by-id/b", "second": "/dev/input/by-id/a" })
+        config = load_config()
+        self.assertEqual(config["keyboards"]["first"]["path"], "/dev/input/by-id/b")
+        self.assertEqual(config["keyboards"]["second"]["path"], "/dev/input/by-id/a")
+        self.assertFalse(os.path.exists("config.yml.tmp"))
+        self.assertTrue(os.path.exists("config.compiled"))
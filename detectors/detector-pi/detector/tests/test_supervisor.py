@@ -0,0 +1,118 @@
+import unittest
+import os
+import signal
+import tempfile
+import threading
+import time
+
+# Setup ENV
+os.environ["2KEYS_TEST"] = "true"
+
+from twokeys.util.config import load_config, write_config
+from twokeys.watcher.supervisor import Supervisor, WorkerConfig, exit_code
+
+def keyboard_config(path, hotkey):
+    return { "keyboards": { "keyboard": { "path": path, "hotkeys": { hotkey: "Function" } } } }
+
+
+class TestSupervisor(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    # Worker that crashes the first time it runs, then reports its stats & waits to be stopped
+    def crash_once(self, name, report):
+        started = os.path.join(self.dir.name, name)
+        if not os.path.exists(started):
+            open(started, "w").close()
+            raise SystemExit(3)
+        report({ "sent": 1 })
+        report({ "sent": 2, "dropped": 0 })
+        while True:
+            time.sleep(1)
+
+    # Run the supervisor (in this thread, so it can handle signals) until stop(supervisor) is true
+    def supervise(self, supervisor, stop):
+        def stop_when_ready():
+            deadline = time.monotonic() + 10
+            while not stop(supervisor) and time.monotonic() < deadline:
+                time.sleep(0.01)
+            os.kill(os.getpid(), signal.SIGTERM)
+        threading.Thread(target=stop_when_ready, daemon=True).start()
+        supervisor.run()
+
+    def test_restarts_crashed_worker(self):
+        supervisor = Supervisor(["keyboard1", "keyboard2"], self.crash_once, backoff_min=0.05, backoff_max=1)
+        self.supervise(supervisor, lambda supervisor: all(worker.stats.get("sent") == 2 for worker in supervisor.workers))
+        stats = supervisor.stats()
+        for name in ("keyboard1", "keyboard2"):
+            self.assertEqual(stats[name]["restarts"], 1)
+            self.assertEqual(stats[name]["sent"], 2)
+            self.assertEqual(stats[name]["dropped"], 0)
+            self.assertIsNone(stats[name]["pid"])
+        # Backoff doubled after the crash
+        self.assertEqual(supervisor.workers[0].backoff, 0.1)
+
+    def test_backoff_capped_and_reset(self):
+        def crash(name, report):
+            raise SystemExit(1)
+        supervisor = Supervisor(["keyboard"], crash, backoff_min=0.01, backoff_max=0.04, healthy_after=60)
+        self.supervise(supervisor, lambda supervisor: supervisor.workers[0].restarts >= 4)
+        self.assertEqual(supervisor.workers[0].backoff, 0.04)
+        # A worker that ran for long enough starts again from the min backoff
+        supervisor = Supervisor(["keyboard"], crash, backoff_min=0.01, backoff_max=0.04, healthy_after=0)
+        self.supervise(supervisor, lambda supervisor: supervisor.workers[0].restarts >= 4)
+        self.assertEqual(supervisor.workers[0].backoff, 0.02)
+
+    def test_pins_workers(self):
+        cpu = min(os.sched_getaffinity(0))
+        supervisor = Supervisor(["keyboard"], lambda name, report: report({ "cpus": sorted(os.sched_getaffinity(0)) }) or time.sleep(10), cpus=[cpu])
+        self.supervise(supervisor, lambda supervisor: "cpus" in supervisor.workers[0].stats)
+        self.assertEqual(supervisor.workers[0].stats["cpus"], [cpu])
+        self.assertEqual(supervisor.workers[0].restarts, 0)
+
+    def test_restarted_worker_gets_new_config(self):
+        config_path = os.path.join(self.dir.name, "config.yml")
+        write_config(keyboard_config("/dev/input/event0", "^A"), config_path)
+        worker_config = WorkerConfig(load_config(config_path), ["keyboard"], config_path=config_path)
+        # Config changes (i.e. from 2Keys sync) while the first worker is running, then it crashes
+        def crash_once(name, report):
+            config = worker_config.config["keyboards"][name]
+            if config["path"] == "/dev/input/event0":
+                write_config(keyboard_config("/dev/input/event1", "^B"), config_path)
+                raise SystemExit(3)
+            report({ "path": config["path"], "hotkeys": list(worker_config.compiled[name].hotkeys.keys()) })
+            time.sleep(10)
+        supervisor = Supervisor(["keyboard"], crash_once, backoff_min=0.01, reload=worker_config.reload)
+        self.supervise(supervisor, lambda supervisor: "path" in supervisor.workers[0].stats)
+        self.assertEqual(supervisor.workers[0].stats["path"], "/dev/input/event1")
+        self.assertEqual(supervisor.workers[0].stats["hotkeys"], ["^B"])
+        self.assertEqual(supervisor.workers[0].restarts, 1)
+
+    def test_reload_keeps_config_on_error(self):
+        config_path = os.path.join(self.dir.name, "config.yml")
+        write_config(keyboard_config("/dev/input/event0", "^A"), config_path)
+        worker_config = WorkerConfig(load_config(config_path), ["keyboard"], config_path=config_path)
+        self.assertFalse(worker_config.reload())
+        with open(config_path, "w") as config_file:
+            config_file.write("keyboards: {}\n")
+        self.assertFalse(worker_config.reload())
+        self.assertEqual(worker_config.config["keyboards"]["keyboard"]["path"], "/dev/input/event0")
+        self.assertEqual(list(worker_config.compiled["keyboard"].hotkeys.keys()), ["^A"])
+
+    def test_exit_code(self):
+        for code, kill in ((3, None), (0, None), (None, signal.SIGKILL)):
+            pid = os.fork()
+            if pid == 0:
+                if kill is not None:
+                    os.kill(os.getpid(), kill)
+                os._exit(code)
+            _, status = os.waitpid(pid, 0)
+            self.assertEqual(exit_code(status), code if kill is None else -kill)
+
+
+if __name__ == '__main__':
+    unittest.main()
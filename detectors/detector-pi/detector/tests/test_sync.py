@@ -0,0 +1,109 @@
+import unittest
+import os
+import gzip
+import json
+import tempfile
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from unittest import mock
+
+# Setup ENV
+os.environ["2KEYS_TEST"] = "true"
+
+from twokeys.sync import resync_config
+from twokeys.sync.resync_config import sync_config
+from twokeys.util.config import load_config, write_config
+from twokeys.watcher.compiled import load_snapshot
+
+
+# Stands in for the server's /api/get/config, with an ETag & gzip
+class ConfigHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        etag = '"' + str(self.server.version) + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        body = json.dumps(self.server.config).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("ETag", etag)
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        return
+
+
+class TestSync(unittest.TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), ConfigHandler)
+        self.server.requests = []
+        self.server.version = 1
+        self.server.config = {
+            "name": "MOCK",
+            "addresses": { "server": { "ipv4": "127.0.0.1", "port": self.server.server_address[1] } },
+            "keyboards": { "keyboard": { "path": "/dev/input/by-id/akbd", "hotkeys": { "+A": "TestFunc" } } },
+        }
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.cwd = os.getcwd()
+        self.dir = tempfile.TemporaryDirectory()
+        os.chdir(self.dir.name)
+        self.state = mock.patch.object(resync_config, "SYNC_STATE_FILE", os.path.join(self.dir.name, ".2Keys", "sync.json"))
+        self.state.start()
+        # Config as after init, before anything has been synced
+        write_config(dict(self.server.config, name="OLD"))
+
+    def tearDown(self):
+        self.state.stop()
+        os.chdir(self.cwd)
+        self.dir.cleanup()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_only_fetched_when_changed(self):
+        self.assertTrue(sync_config())
+        self.assertEqual(load_config()["name"], "MOCK")
+        self.assertIsNotNone(load_snapshot())
+        self.assertNotIn("If-None-Match", self.server.requests[0])
+        self.assertIn("gzip", self.server.requests[0]["Accept-Encoding"])
+        written = os.stat("config.yml")
+        # Nothing changed, so a 304 & the config isn't touched
+        self.assertFalse(sync_config())
+        self.assertEqual(self.server.requests[1]["If-None-Match"], '"1"')
+        self.assertEqual(os.stat("config.yml").st_mtime_ns, written.st_mtime_ns)
+        # Changed on the server
+        self.server.version = 2
+        self.server.config["name"] = "NEW"
+        self.assertTrue(sync_config())
+        self.assertEqual(load_config()["name"], "NEW")
+
+    def test_not_written_when_same(self):
+        write_config(self.server.config)
+        written = os.stat("config.yml")
+        self.assertFalse(sync_config())
+        self.assertEqual(os.stat("config.yml").st_mtime_ns, written.st_mtime_ns)
+        self.assertEqual(os.stat("config.yml").st_ino, written.st_ino)
+
+    def test_fetched_when_changed_here(self):
+        self.assertTrue(sync_config())
+        # i.e. by 2Keys add
+        config = json.loads(json.dumps(self.server.config))
+        config["keyboards"]["keyboard"]["path"] = "/dev/input/by-id/bkbd"
+        write_config(config)
+        self.assertTrue(sync_config())
+        self.assertNotIn("If-None-Match", self.server.requests[1])
+        self.assertEqual(load_config()["keyboards"]["keyboard"]["path"], "/dev/input/by-id/akbd")
+
+    
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+import os
+import json
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+# Setup ENV
+os.environ["2KEYS_TEST"] = "true"
+
+from twokeys.watcher.trigger_client import TriggerClient
+
+
+# Records triggers & which connection they came in on
+class TriggerHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # So connections are kept alive
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.triggers.append((self.path, self.client_address, json.loads(body)))
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"OK")
+
+    def log_message(self, format, *args):
+        return
+
+
+class TestTriggerClient(unittest.TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), TriggerHandler)
+        self.server.triggers = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.config = { "addresses": { "server": { "ipv4": "127.0.0.1", "port": self.server.server_address[1] } } }
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_prepares_bodies(self):
+        client = TriggerClient(self.config)
+        client.prepare("keyboard", ["+A", "^!7"])
+        self.assertEqual(len(client.bodies), 4)
+        self.assertEqual(json.loads(client.body("keyboard", "+A", 1)), { "keyboard": "keyboard", "hotkey": "+A", "value": 1 })
+        self.assertEqual(json.loads(client.body("keyboard", "+A", 2))["value"], 2)
+        client.close()
+
+    def test_send_reuses_connection(self):
+        client = TriggerClient(self.config)
+        client.prepare("keyboard", ["+A"])
+        client.send("keyboard", "+A", 1)
+        client.send("keyboard", "+A", 0)
+        client.close()
+        self.assertEqual([trigger[0] for trigger in self.server.triggers], ["/api/post/trigger"] * 2)
+        self.assertEqual([trigger[2]["value"] for trigger in self.server.triggers], [1, 0])
+        # Same client port = same connection
+        self.assertEqual(self.server.triggers[0][1], self.server.triggers[1][1])
+
+    def test_send_sequence_number(self):
+        client = TriggerClient(self.config)
+        client.prepare("keyboard", ["+A"])
+        client.send("keyboard", "+A", 1, run="0123456789abcdef", seq=7)
+        client.close()
+        self.assertEqual(self.server.triggers[0][2], { "keyboard": "keyboard", "hotkey": "+A", "value": 1, "run": "0123456789abcdef", "seq": 7 })
+
+    def test_send_batch(self):
+        client = TriggerClient(self.config)
+        client.prepare("keyboard", ["+A", "^!7"])
+        client.send_batch("keyboard", [("^!7", 1, 1600000000.25, 3, None), ("+A", 1, 1600000000.250001, 4, None), ("+A", 0, 1600000000.5, 5, 0.25)], run="0123456789abcdef")
+        client.send_batch("keyboard", [("+A", 1, 1600000001, None, None), ("+A", 0, 1600000002, None, None)])
+        client.close()
+        self.assertEqual([trigger[0] for trigger in self.server.triggers], ["/api/post/triggers"] * 2)
+        self.assertEqual(self.server.triggers[0][2], { "triggers": [
+            { "keyboard": "keyboard", "hotkey": "^!7", "value": 1, "ts": 1600000000.25, "run": "0123456789abcdef", "seq": 3 },
+            { "keyboard": "keyboard", "hotkey": "+A", "value": 1, "ts": 1600000000.250001, "run": "0123456789abcdef", "seq": 4 },
+            { "keyboard": "keyboard", "hotkey": "+A", "value": 0, "ts": 1600000000.5, "held": 0.25, "run": "0123456789abcdef", "seq": 5 },
+        ] })
+        self.assertEqual(self.server.triggers[1][2]["triggers"][1], { "keyboard": "keyboard", "hotkey": "+A", "value": 0, "ts": 1600000002 })
+
+    
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,15 @@
 import unittest
 import os
+import io
+import tempfile
+from contextlib import redirect_stdout
 
 # Setup ENV
 os.environ["2KEYS_TEST"] = "true"
 
 from twokeys.util import load_config, logger
+from twokeys.util.config import copy_config
+from twokeys.util.logger import Logger, DEBUG, INFO
 
 
 class TestUtil(unittest.TestCase):
@@ -20,6 +25,75 @@ class TestUtil(unittest.TestCase):
         self.assertTrue("path" in config["keyboards"]["keyboard"])
         self.assertEqual(config["keyboards"]["keyboard"]["path"], "/dev/input/by-id/akbd")
 
+
+class TestConfigCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "config.yml")
+        self.write("name: FIRST\nkeyboards:\n  kbd:\n    hotkeys:\n      ^A: Run\n")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, contents):
+        with open(self.path, "w") as config_file:
+            config_file.write(contents)
+
+    def test_cached_until_changed(self):
+        config = load_config(self.path)
+        self.assertIs(load_config(self.path), config)
+        self.write("name: SECOND\nkeyboards: {}\n")
+        self.assertEqual(load_config(self.path)["name"], "SECOND")
+
+    def test_read_only(self):
+        config = load_config(self.path)
+        with self.assertRaises(TypeError):
+            config["name"] = "CHANGED"
+        with self.assertRaises(TypeError):
+            config["keyboards"]["kbd"]["hotkeys"]["^B"] = "Other"
+        copy = copy_config(config)
+        copy["keyboards"]["kbd"]["path"] = "/dev/input/by-id/kbd"
+        self.assertNotIn("path", load_config(self.path)["keyboards"]["kbd"])
+
+
+# Fails if it's ever formatted
+class NotToBeFormatted:
+    def __str__(self):
+        raise AssertionError("Message was formatted")
+
+
+class TestLogger(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = Logger("test")
+        self.logger.silent = False
+        self.logger.isDebug = False
+
+    def test_enabled(self):
+        self.assertTrue(self.logger.enabled(INFO))
+        self.assertFalse(self.logger.enabled(DEBUG))
+        self.logger.silent = True
+        self.assertFalse(self.logger.enabled(INFO))
+
+    def test_lazy_formatting(self):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            self.logger.debug("Not logged %s", NotToBeFormatted())
+            self.logger.info("Logged %s %u", "hotkey", 1)
+        self.assertNotIn("Not logged", output.getvalue())
+        self.assertIn("Logged hotkey 1", output.getvalue())
+
+    def test_sample(self):
+        sampled = self.logger.sample(3)
+        output = io.StringIO()
+        with redirect_stdout(output):
+            for i in range(7):
+                sampled.info("Message %u", i)
+        self.assertEqual(output.getvalue().count("Message"), 2)
+        self.assertIn("Message 2", output.getvalue())
+        self.assertIn("Message 5", output.getvalue())
+
     
 if __name__ == '__main__':
     unittest.main()
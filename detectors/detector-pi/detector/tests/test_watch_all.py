@@ -0,0 +1,63 @@
+import unittest
+import os
+
+# Setup ENV
+os.environ["2KEYS_TEST"] = "true"
+
+from twokeys.watcher.watch_all import read_events
+
+# Stands in for a keyboard's reader, which reads until there's nothing left
+class FakeReader:
+    def __init__(self, events, error=BlockingIOError):
+        self.events = events
+        self.error = error
+
+    def read(self):
+        for event in self.events:
+            yield event
+        raise self.error()
+
+
+class FakeDevice:
+    fd = 99
+
+
+class FakeKeyboard:
+    name = "keyboard"
+
+    def __init__(self, reader):
+        self.keyboard_device = FakeDevice()
+        self.reader = reader
+        self.handled = []
+
+    def handle_events(self, events):
+        for sec, usec, type, code, value in events:
+            self.handled.append((type, code, value))
+
+
+class FakeLoop:
+    def __init__(self):
+        self.removed = []
+
+    def remove_reader(self, fd):
+        self.removed.append(fd)
+
+
+class TestWatchAll(unittest.TestCase):
+
+    def test_reads_all_waiting_events(self):
+        keyboard = FakeKeyboard(FakeReader([(0, 0, 1, 30, 1), (0, 0, 0, 0, 0), (0, 0, 1, 30, 0)]))
+        loop = FakeLoop()
+        read_events(keyboard, loop)
+        self.assertEqual(keyboard.handled, [(1, 30, 1), (0, 0, 0), (1, 30, 0)])
+        self.assertEqual(loop.removed, [])
+
+    def test_stops_watching_unplugged_keyboard(self):
+        keyboard = FakeKeyboard(FakeReader([], error=OSError))
+        loop = FakeLoop()
+        read_events(keyboard, loop)
+        self.assertEqual(loop.removed, [FakeDevice.fd])
+
+    
+if __name__ == '__main__':
+    unittest.main()
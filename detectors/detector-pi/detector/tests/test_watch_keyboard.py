@@ -0,0 +1,160 @@
+import unittest
+import os
+import requests
+
+# Setup ENV
+os.environ["2KEYS_TEST"] = "true"
+
+from twokeys.util.config import freeze
+from twokeys.watcher.watch_keyboard import Keyboard
+from twokeys.watcher.replay import ReplayDevice
+
+CONFIG = { "addresses": { "server": { "ipv4": "127.0.0.1", "port": 9090 } } }
+KEYBOARD = {
+    "path": "/dev/input/by-id/akbd",
+    "hotkeys": {
+        "+A": { "func": { "down": "OnDown" } },
+        "^B": { "func": { "up": "OnUp" } },
+        "^C": { "func": { "down": "OnDown", "up": "OnUp" } },
+    },
+}
+LEFT_SHIFT, LEFT_CTRL, A, B, C = 42, 29, 30, 48, 46
+# Key code with no mapping by default
+UNMAPPED = 84
+
+
+# Records triggers, with how long they were held for
+class RecordingClient:
+    def __init__(self):
+        self.sent = []
+
+    def prepare(self, keyboard, hotkeys):
+        pass
+
+    def send(self, keyboard, hotkey, value, run=None, seq=None, held=None):
+        self.sent.append((hotkey, value, held))
+
+    def send_batch(self, keyboard, triggers, run=None):
+        self.sent.extend((hotkey, value, held) for hotkey, value, ts, seq, held in triggers)
+
+    def close(self):
+        pass
+
+
+# Server that can't be reached
+class DownClient(RecordingClient):
+    def send(self, keyboard, hotkey, value, run=None, seq=None, held=None):
+        raise requests.exceptions.ConnectionError("Connection refused")
+
+    def send_batch(self, keyboard, triggers, run=None):
+        raise requests.exceptions.ConnectionError("Connection refused")
+
+
+# Client for a server that replies with status to each request, as requests does
+class ReplyClient(RecordingClient):
+    def __init__(self, status):
+        super().__init__()
+        self.status = status
+
+    def reply(self):
+        reply = requests.Response()
+        reply.status_code = self.status
+        return reply
+
+    def send(self, keyboard, hotkey, value, run=None, seq=None, held=None):
+        super().send(keyboard, hotkey, value, run, seq, held)
+        return self.reply()
+
+    def send_batch(self, keyboard, triggers, run=None):
+        super().send_batch(keyboard, triggers, run)
+        return self.reply()
+
+
+# Press modifier + key at sec, & release them after held seconds
+def press(modifier, key, sec, held):
+    up_sec, up_usec = int(sec + held), round((sec + held) % 1 * 1e6)
+    return [
+        (sec, 0, 1, modifier, 1), (sec, 0, 1, key, 1), (sec, 0, 0, 0, 0),
+        (up_sec, up_usec, 1, key, 0), (up_sec, up_usec, 1, modifier, 0), (up_sec, up_usec, 0, 0, 0),
+    ]
+
+
+class TestCollapseMulti(unittest.TestCase):
+
+    def watch(self, events, keyboard_config=KEYBOARD, **options):
+        client = RecordingClient()
+        keyboard = Keyboard(keyboard_config, "keyboard", config=CONFIG, client=client, backend=None, device=ReplayDevice(), **options)
+        keyboard.dispatcher.start()
+        keyboard.handle_events(events)
+        keyboard.stop()
+        return client.sent
+
+    def test_sends_down_and_up(self):
+        sent = self.watch(press(LEFT_SHIFT, A, 10, 0.25) + press(LEFT_CTRL, B, 20, 0.5))
+        self.assertEqual(sent, [("+A", 1, None), ("+A", 0, None), ("^B", 1, None), ("^B", 0, None)])
+
+    def test_only_sends_what_has_a_function(self):
+        sent = self.watch(press(LEFT_SHIFT, A, 10, 0.25) + press(LEFT_CTRL, B, 20, 0.5) + press(LEFT_CTRL, C, 30, 0.125), collapse_multi=True)
+        self.assertEqual(sent, [("+A", 1, None), ("^B", 0, 0.5), ("^C", 1, None), ("^C", 0, 0.125)])
+
+    def test_frozen_config(self):
+        # As from load_config()
+        sent = self.watch(press(LEFT_SHIFT, A, 10, 0.25) + press(LEFT_CTRL, B, 20, 0.5), keyboard_config=freeze(KEYBOARD), collapse_multi=True)
+        self.assertEqual(sent, [("+A", 1, None), ("^B", 0, 0.5)])
+
+
+class TestSendFailures(unittest.TestCase):
+
+    def test_connection_error_counted_as_failed(self):
+        for batch in (True, False):
+            keyboard = Keyboard(KEYBOARD, "keyboard", config=CONFIG, client=DownClient(), backend=None, device=ReplayDevice(), batch=batch)
+            keyboard.dispatcher.start()
+            # Down & up in one frame, so they're sent as a batch when batching
+            keyboard.handle_events([(10, 0, 1, LEFT_SHIFT, 1), (10, 0, 1, A, 1), (10, 0, 1, A, 0), (10, 0, 0, 0, 0)])
+            keyboard.stop()
+            stats = keyboard.stats()
+            self.assertEqual(stats["sent"], 0)
+            self.assertEqual(stats["failed"], 2)
+
+    def test_error_reply_counted_as_failed(self):
+        for status, failed in ((500, 2), (404, 2), (200, 0)):
+            keyboard = Keyboard(KEYBOARD, "keyboard", config=CONFIG, client=ReplyClient(status), backend=None, device=ReplayDevice(), batch=False)
+            keyboard.dispatcher.start()
+            keyboard.handle_events([(10, 0, 1, LEFT_CTRL, 1), (10, 0, 1, C, 1), (10, 0, 1, C, 0), (10, 0, 0, 0, 0)])
+            keyboard.stop()
+            self.assertEqual(keyboard.stats()["failed"], failed)
+
+    def test_no_function_reply_not_failed(self):
+        # The server has nothing to run for the down of ^B, as it only has an up function
+        keyboard = Keyboard(KEYBOARD, "keyboard", config=CONFIG, client=ReplyClient(404), backend=None, device=ReplayDevice(), batch=False)
+        keyboard.dispatcher.start()
+        keyboard.handle_events([(10, 0, 1, LEFT_CTRL, 1), (10, 0, 1, B, 1), (10, 0, 0, 0, 0)])
+        keyboard.stop()
+        self.assertEqual(keyboard.client.sent, [("^B", 1, None)])
+        self.assertEqual(keyboard.stats()["failed"], 0)
+        self.assertEqual(keyboard.stats()["sent"], 1)
+
+
+class TestQueueOptions(unittest.TestCase):
+
+    def test_block_timeout(self):
+        keyboard = Keyboard(KEYBOARD, "keyboard", config=CONFIG, client=RecordingClient(), backend=None, device=ReplayDevice(), queue_policy="block", block_timeout=0.5)
+        self.assertEqual(keyboard.dispatcher.policy, "block")
+        self.assertEqual(keyboard.dispatcher.block_timeout, 0.5)
+        keyboard.stop()
+
+
+class TestApplyMappings(unittest.TestCase):
+
+    def test_hotkeys_use_new_mappings(self):
+        client = RecordingClient()
+        keyboard = Keyboard({ "path": KEYBOARD["path"], "hotkeys": { "(Macro)": "Func" } }, "keyboard", config=CONFIG, client=client, backend=None, device=ReplayDevice(), batch=False)
+        keyboard.apply_mappings({ "Macro": UNMAPPED })
+        keyboard.dispatcher.start()
+        keyboard.handle_events([(10, 0, 1, UNMAPPED, 1), (10, 0, 0, 0, 0)])
+        keyboard.stop()
+        self.assertEqual(client.sent, [("(Macro)", 1, None)])
+
+    
+if __name__ == '__main__':
+    unittest.main()
@@ -18,24 +18,72 @@ along with 2Keys.  If not, see <https://www.gnu.org/licenses/>.
 """
 # Function to detect a keyboard
 import asyncio
-from os import path, listdir, getcwd, system
+from os import path
 import colorful
-from ..util.constants import KEYBOARDS_PATH_BASE, KEYBOARD_EVENT_FORMAT, KEYBOARD_EVENT_SIZE, SCRIPTS_ROOT, MODULE_NAME
+from ..util.constants import KEYBOARDS_PATH_BASE, TRANSPORT_HTTP
 from ..util.logger import Logger
-from ..util.config import load_config
-from ..watcher import AsyncKeyboard as AsyncKeyboardWatcher
+from ..util.config import load_config, copy_config, write_config
+from ..watcher.compiled import write_snapshot
+from .scanner import KeyboardScanner
+from .sync_keyboard_path import update_server_keyboard_paths
 logger = Logger("detect")
 
-# Function to add keyboards (s is emphasised) from config
-def add_keyboards(config):
-  for key, value in config["keyboards"].items():
-      logger.info("Running script to add keyboard for keyboard " + colorful.cyan(key) + "...")
-      print("")  # Padding
-      system("cd " + getcwd() + " && python3 -m " + MODULE_NAME + " add " + key)
-      print("")  # Padding
+# Ask for a key to be pressed on each keyboard in turn, to find their paths
+# The input devices are only opened once, for all the keyboards
+# names: Names of keyboards to find
+# timeout: Seconds to wait for each key press, or None to wait forever
+# Returns dict of keyboard name -> path, of the keyboards found before a key press timed out
+def identify_keyboards(names, inputs_path, timeout=None):
+  paths = {}
+  with KeyboardScanner(inputs_path) as scanner:
+    for name in names:
+      scanner.drain() # Ignore anything pressed before being asked
+      logger.info("Press a button on the keyboard you want to map to " + colorful.cyan(name) + " to register it.")
+      keyboard = scanner.scan(timeout)
+      if keyboard is None:
+        logger.err("No key was pressed within " + str(timeout) + " seconds.")
+        break
+      logger.info("Found " + keyboard + " for " + name)
+      paths[name] = keyboard
+      scanner.remove_device(keyboard) # So it can't be picked for the next keyboard
+  return paths
+
+# Write the paths of keyboards to the config
+# Written to a temporary file first, so the config is never left half written (see write_config())
+# paths: Dict of keyboard name -> path
+def save_keyboard_paths(paths):
+  config = copy_config(load_config())
+  for name, keyboard_path in paths.items():
+    config["keyboards"][name]["path"] = keyboard_path # Update keyboard with path in /dev/input
+  logger.debug("Writing config...")
+  if write_config(config):
+    write_snapshot()
+  logger.info("Config writen.")
+
+# Find keyboards, then save their paths to the config & server
+# transport: How to send the paths to the server (see constants.TRANSPORTS)
+def add_keyboards_by_name(names, inputs_path, timeout=None, transport=TRANSPORT_HTTP):
+  if not path.isdir(inputs_path): # Make sure there's something to detect
+    logger.err("Couldn't scan for keyboards")
+    logger.err("Verify you have at least one keyboard plugged in")
+    logger.err("and the dir " + inputs_path + " exists")
+    logger.err("You can specify a custom path with the --inputs-path option")
+    exit()
+  logger.info("Scanning for keyboards...")
+  paths = identify_keyboards(names, inputs_path, timeout)
+  if len(paths) == 0:
+    exit(1)
+  save_keyboard_paths(paths)
+  logger.info("Updating paths on server....")
+  asyncio.run(update_server_keyboard_paths(paths, transport))
+  return paths
 
+# Function to add keyboards (s is emphasised) from config
+def add_keyboards(config, inputs_path=KEYBOARDS_PATH_BASE, timeout=None, transport=TRANSPORT_HTTP):
+  return add_keyboards_by_name(list(config["keyboards"].keys()), inputs_path, timeout, transport)
 
-def add_keyboard(name, gen_handler, inputs_path):
+# timeout: Seconds to wait for a key to be pressed, or None to wait forever
+def add_keyboard(name, inputs_path, timeout=None, transport=TRANSPORT_HTTP):
   # Check if paths not given
   config = load_config()
   if name == "" or name not in config["keyboards"]:
@@ -43,29 +91,7 @@ def add_keyboard(name, gen_handler, inputs_path):
     logger.warn("Detection will be ran on all keyboards.")
     logger.warn("To just generate daemons, use the 'daemon-gen' command")
     logger.info("Running detection on all keyboards...")
-    return add_keyboards(config)
+    return add_keyboards(config, inputs_path, timeout, transport)
 
   logger.info("Mapping keyboard " + name)
-  logger.info("Scanning for keyboards...")
-  if not path.isdir(inputs_path): # Make sure there's something to detect
-    logger.err("Couldn't scan for keyboards")
-    logger.err("Verify you have at least one keyboard plugged in")
-    logger.err("and the dir " + inputs_path + " exists")
-    logger.err("You can specify a custom path with the --inputs-path option")
-    exit()
-  # Scan
-  # From https://stackoverflow.com/questions/3207219/how-do-i-list-all-files-of-a-directory
-  keyboards = listdir(inputs_path)
-  logger.debug("Keyboards:")
-  logger.debug(keyboards)
-
-  logger.info("Press a button on the keyboard you want to map to register it.")
-  # Then watch all keyboards and ask for one to be pressed
-  keyboards_events = [AsyncKeyboardWatcher(keyboard_path, inputs_path) for keyboard_path in keyboards] # Keyboard watch classes for each input
-
-  handler = gen_handler(keyboards_events, name) # The handler needs access to keyboards_events, which it won't on exe in the watcher, as well as keyboard name
-  
-  # Run
-  jobs = [keyboards_events[i].keyboard_watcher(handler) for i in range(0, len(keyboards))] # Create jobs list
-  loop = asyncio.get_event_loop()
-  loop.run_until_complete(asyncio.wait(jobs))
+  return add_keyboards_by_name([name], inputs_path, timeout, transport)
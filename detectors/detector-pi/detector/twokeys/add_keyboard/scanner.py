@@ -0,0 +1,129 @@
+"""
+Copyright 2018 Kishan Sambhi
+
+This file is part of 2Keys.
+
+2Keys is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+2Keys is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with 2Keys.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# Scanner to find which keyboard a key was pressed on
+# Every input device is opened once (non-blocking) & registered with one selector (epoll on Linux),
+# so scanning any number of devices uses no threads, & stops as soon as a key is pressed or it times out
+import os
+import selectors
+import struct
+import time
+from ..util.constants import KEYBOARD_EVENT_FORMAT, KEYBOARD_EVENT_SIZE, READ_BATCH_SIZE, EV_KEY
+from ..util.logger import Logger
+
+logger = Logger("detect")
+
+class KeyboardScanner:
+  # inputs_path: Directory of input devices, i.e. /dev/input/by-id
+  def __init__(self, inputs_path):
+    self.inputs_path = inputs_path
+    self.selector = selectors.DefaultSelector()
+
+  # Open every input device in inputs_path
+  # Devices that can't be opened (i.e. no permission) are skipped
+  def open(self):
+    for device in sorted(os.listdir(self.inputs_path)):
+      device_path = os.path.join(self.inputs_path, device)
+      try:
+        fd = os.open(device_path, os.O_RDONLY | os.O_NONBLOCK | os.O_CLOEXEC)
+      except OSError as err:
+        logger.debug("Can't open " + device_path + ": " + str(err))
+        continue
+      self.selector.register(fd, selectors.EVENT_READ, device_path)
+    logger.debug("Scanning " + str(len(self.selector.get_map())) + " input devices")
+    return self
+
+  # Paths of the devices being scanned
+  def devices(self):
+    return [key.data for key in self.selector.get_map().values()]
+
+  # Stop scanning a device, i.e. once it has been identified
+  def remove(self, fd):
+    self.selector.unregister(fd)
+    os.close(fd)
+
+  def remove_device(self, device_path):
+    for fd, key in list(self.selector.get_map().items()):
+      if key.data == device_path:
+        self.remove(fd)
+
+  # Throw away events waiting to be read from every device
+  def drain(self):
+    for fd in list(self.selector.get_map()):
+      while True:
+        try:
+          data = os.read(fd, KEYBOARD_EVENT_SIZE * READ_BATCH_SIZE)
+        except BlockingIOError:
+          break # Nothing left
+        except OSError:
+          data = b""
+        if len(data) == 0:
+          self.remove(fd) # Gone (unplugged)
+          break
+
+  # Whether any of the events read from a device are key presses
+  # Returns False when there is nothing to read, & None if the device has gone (unplugged)
+  def read_key_press(self, fd):
+    try:
+      data = os.read(fd, KEYBOARD_EVENT_SIZE * READ_BATCH_SIZE)
+    except BlockingIOError:
+      return False
+    except OSError:
+      return None
+    if len(data) == 0:
+      return None
+    for _, _, type, _, value in struct.iter_unpack(KEYBOARD_EVENT_FORMAT, data[:len(data) - len(data) % KEYBOARD_EVENT_SIZE]):
+      if type == EV_KEY and value == 1:
+        return True
+    return False
+
+  # Wait for a key to be pressed on one of the devices
+  # timeout: Seconds to wait, or None to wait forever
+  # Returns the path of the device the key was pressed on, or None if timed out
+  def scan(self, timeout=None):
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while len(self.selector.get_map()) > 0:
+      remaining = None if deadline is None else deadline - time.monotonic()
+      if remaining is not None and remaining <= 0:
+        return None
+      for key, _ in self.selector.select(remaining):
+        pressed = self.read_key_press(key.fd)
+        if pressed is None:
+          logger.debug("No longer scanning " + key.data)
+          self.remove(key.fd)
+        elif pressed:
+          return key.data
+    return None # Nothing left to scan
+
+  def close(self):
+    for fd in list(self.selector.get_map()):
+      os.close(fd)
+    self.selector.close()
+
+  def __enter__(self):
+    return self.open()
+
+  def __exit__(self, *args):
+    self.close()
+
+# Find which keyboard in inputs_path a key is pressed on
+# timeout: Seconds to wait, or None to wait forever
+# Returns the path of the keyboard, or None if no key was pressed in time
+def scan_for_keyboard(inputs_path, timeout=None):
+  with KeyboardScanner(inputs_path) as scanner:
+    return scanner.scan(timeout)
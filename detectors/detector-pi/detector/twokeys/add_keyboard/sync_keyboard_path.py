@@ -16,39 +16,62 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with 2Keys.  If not, see <https://www.gnu.org/licenses/>.
 """
-# Sync keyboard path to server
+# Sync keyboard paths to server
 import aiohttp
-import aiofiles
 import asyncio
-import os
-import yaml
 import logging
 from ..util import load_config, Logger
-from ..util.constants import UPDATE_KEYBOARD_PATH
+from ..util.config import get_server_url
+from ..util.constants import UPDATE_KEYBOARD_PATH, UPDATE_KEYBOARD_PATHS, TRANSPORT_HTTP, TRANSPORT_CHANNEL
 
 logger = Logger("sync")
-async def update_server_keyboard_path(name, keyboard_path):
+
+# Update the paths of keyboards on the server, in one request
+# Servers without the batched endpoint are sent one request per keyboard instead
+# paths: Dict of keyboard name -> path
+# transport: How to send them (see constants.TRANSPORTS)
+async def update_server_keyboard_paths(paths, transport=TRANSPORT_HTTP):
   logger.info("Updating config...")
-  logger.debug("Loading config...")
-  async with aiofiles.open(os.getcwd() + "/config.yml", mode="r") as config_file:
-      logger.debug("ASYNC FILE OPS") # DEBUG: signal start of async file ops, so as to help detect where program breaks
-      config_contents = await config_file.read() # Read config
-      logger.debug("Contents:\n" + config_contents)
-      # Parse it into python obj
-      config = yaml.load(config_contents, Loader=yaml.FullLoader)
-      logger.debug("Parsed contents: " + str(config))
-      try:
-        timeout = aiohttp.ClientTimeout(total=5)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-          logger.debug("Making request....")
-          async with session.post("http://" + config["addresses"]["server"]["ipv4"] + ":" + str(config["addresses"]["server"]["port"]) + UPDATE_KEYBOARD_PATH,
-                    json={ "keyboard": name, "path": keyboard_path }, timeout=timeout) as resp:
-            logger.debug("Request made.")
-            if int(resp.status) != 200:
-              logger.err("ERROR Updating paths!")
-              logger.err(await resp.text())
-      except (aiohttp.ClientError, asyncio.TimeoutError, KeyError) as err:
-        logger.err("ERROR!")
-        logging.exception("")
-      except KeyboardInterrupt:
-        raise
+  config = load_config()
+  if transport == TRANSPORT_CHANNEL:
+    update_channel_keyboard_paths(config, paths)
+    return
+  try:
+    timeout = aiohttp.ClientTimeout(total=5)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+      logger.debug("Making request....")
+      async with session.post(get_server_url(config) + UPDATE_KEYBOARD_PATHS, json={ "paths": paths }, timeout=timeout) as resp:
+        logger.debug("Request made.")
+        if int(resp.status) == 404:
+          logger.debug("Server can't update paths in one request, so updating them one at a time")
+          for name, keyboard_path in paths.items():
+            await post_keyboard_path(session, config, name, keyboard_path)
+        elif int(resp.status) != 200:
+          logger.err("ERROR Updating paths!")
+          logger.err(await resp.text())
+  except (aiohttp.ClientError, asyncio.TimeoutError, KeyError) as err:
+    logger.err("ERROR!")
+    logging.exception("")
+  except KeyboardInterrupt:
+    raise
+
+# Update the path of one keyboard on the server
+async def post_keyboard_path(session, config, name, keyboard_path):
+  async with session.post(get_server_url(config) + UPDATE_KEYBOARD_PATH, json={ "keyboard": name, "path": keyboard_path }) as resp:
+    if int(resp.status) != 200:
+      logger.err("ERROR Updating path of " + name + "!")
+      logger.err(await resp.text())
+
+# Update the paths of keyboards over the server's trigger channel (see watcher/channel.py)
+def update_channel_keyboard_paths(config, paths):
+  from ..watcher.channel import ChannelClient
+  client = ChannelClient(config)
+  try:
+    reply = client.update_keyboard_paths(paths)
+    if reply["status"] != 200:
+      logger.err("ERROR Updating paths!")
+      logger.err(reply["text"])
+  except OSError as err:
+    logger.err("ERROR Updating paths! " + str(err))
+  finally:
+    client.close()
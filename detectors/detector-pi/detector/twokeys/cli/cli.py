@@ -19,14 +19,13 @@ along with 2Keys.  If not, see <https://www.gnu.org/licenses/>.
 """
 # CLI for 2Keys
 # I'm just making my own since that's easier for me to understand
+# Each command imports what it needs when it runs, so i.e. 2Keys version doesn't have to import
+# evdev, requests & aiohttp first (see benchmarks/startup.py)
 import click
 import sys
-from ..watcher import Keyboard
-from ..util import Logger, load_config, constants
-from ..add_keyboard import gen_async_handler, add_keyboard
-from ..init import init as init_cli
-from ..sync import sync_config
-from ..daemon import generate_daemon
+from ..util.logger import Logger
+from ..util import constants
+from ..util.constants import POLICIES, POLICY_DROP_OLDEST, BACKENDS, BACKEND_RAW, SCHED_POLICIES, REALTIME_PRIORITY, TRANSPORTS, TRANSPORT_HTTP
 
 logger = Logger("cli")
 
@@ -41,6 +40,7 @@ def cli(debug, silent):
 @click.option("--port", "-p", help="Specify the port the server is running on")
 @click.option("--no-path-request", is_flag=True, help="Don't run the interactive keyboard detector (assumes all /dev/input/ paths have already been put into the config on the server)")
 def init(address, port, no_path_request):
+  from ..init import init as init_cli
   init_cli(address=address, port=port, no_path_request=no_path_request)
 
 @cli.command()
@@ -56,6 +56,7 @@ def sync(yes):
       proceed = input("").lower()
     # DO IT
     if proceed == "y":
+      from ..sync import sync_config
       sync_config()
 
 @cli.command()
@@ -66,41 +67,218 @@ def sync(yes):
   help="Provide an alternative path to use as the source of keyboard input 'files' (default: /dev/input/by-id)",
   default=constants.KEYBOARDS_PATH_BASE
 )
-def add(keyboard, inputs_path):
-  add_keyboard(keyboard, gen_async_handler, inputs_path)
+@click.option("--timeout", "-t", type=float, help="Seconds to wait for a key to be pressed (default: wait until one is)")
+@click.option("--transport", type=click.Choice(TRANSPORTS), default=TRANSPORT_HTTP, show_default=True, help="How to send the paths to the server: http sends a request, channel uses the trigger channel")
+def add(keyboard, inputs_path, timeout, transport):
+  from ..add_keyboard import add_keyboard
+  add_keyboard(keyboard, inputs_path, timeout=timeout, transport=transport)
+
+# Load the config for watching, from the compiled config if it's up to date
+# Returns (config, dict of keyboard name -> CompiledKeyboard), which is empty if the config had to be parsed
+def load_watch_config():
+  from ..util.config import load_config
+  from ..watcher.compiled import load_snapshot
+  snapshot = load_snapshot()
+  if snapshot is None:
+    return load_config(), {}
+  return snapshot
+
+# Start serving metrics on address, if given
+# Returns the MetricsRegistry to record them in, or None if not recording metrics
+def start_metrics(address):
+  if address is None:
+    return None
+  from ..watcher.metrics import MetricsRegistry, serve_metrics
+  registry = MetricsRegistry()
+  serve_metrics(registry, address)
+  return registry
+
+# Options to cut latency jitter when the system is busy (see watcher/realtime.py), for the commands that watch keyboards
+def realtime_options(command):
+  command = click.option("--mlock", is_flag=True, help="Lock memory, so the watcher is never swapped out or waits on memory being paged in. Uses more RAM, as none of it can be swapped out, so threads are started with smaller stacks to keep it down")(command)
+  command = click.option("--nice", type=click.IntRange(-20, 19), help="Nice value to run with, if not using --sched")(command)
+  command = click.option("--priority", type=click.IntRange(1, 99), default=REALTIME_PRIORITY, show_default=True, help="Real time priority, for --sched")(command)
+  command = click.option("--sched", type=click.Choice(SCHED_POLICIES), help="Use real time scheduling (needs root), so key presses are handled as soon as they happen")(command)
+  return command
+
+# Dict of the real time options, to give to realtime.apply_realtime()
+def realtime_settings(sched, priority, nice, mlock, cpus=None):
+  from ..watcher.realtime import parse_cpus
+  return { "sched": sched, "priority": priority, "nice": nice, "cpus": parse_cpus(cpus), "mlock": mlock }
+
+# Set up for the real time options before the watcher starts any threads
+def prepare_realtime(mlock):
+  if mlock:
+    from ..watcher.realtime import set_stack_size
+    set_stack_size() # Else each thread's 8 MB stack would be locked
+
+# Options for how hotkeys are read & sent to the server, for the commands that watch keyboards
+# The command gets them as keyword arguments, to give to keyboard_settings()
+def keyboard_options(command):
+  command = click.option("--collapse-multi", is_flag=True, help="Only send the down or up of multi hotkeys if they have a function for it, sending how long they were held for with the up")(command)
+  command = click.option("--batch-window", type=int, default=constants.BATCH_WINDOW, show_default=True, metavar="MICROSECONDS", help="Keep adding hotkeys to a batch for this long after the first, instead of only those from one report")(command)
+  command = click.option("--no-batch", is_flag=True, help="Send each hotkey on its own, even when several come in one report from the keyboard")(command)
+  command = click.option("--transport", type=click.Choice(TRANSPORTS), default=TRANSPORT_HTTP, show_default=True, help="How to send hotkeys to the server: http sends a request for each, channel keeps one connection open")(command)
+  command = click.option("--no-journal", is_flag=True, help="Don't save hotkeys that can't be sent to send when the server is back")(command)
+  command = click.option("--log-sample", type=int, default=1, show_default=True, help="Only log 1 in every N hotkeys sent")(command)
+  command = click.option("--quiet-hot-path", is_flag=True, help="Don't log anything for each key press or hotkey")(command)
+  command = click.option("--backend", type=click.Choice(BACKENDS), default=BACKEND_RAW, show_default=True, help="How to read key presses: raw reads them in batches, evdev uses python-evdev")(command)
+  command = click.option("--block-timeout", type=float, metavar="SECONDS", help="With --queue-policy block, drop a hotkey if there's no space for it after this long (default: wait until there is)")(command)
+  command = click.option(
+    "--queue-policy",
+    type=click.Choice(POLICIES),
+    default=POLICY_DROP_OLDEST,
+    show_default=True,
+    help="What to do with new hotkeys when too many are waiting to be sent to the server"
+  )(command)
+  command = click.option("--queue-size", type=int, default=constants.DEFAULT_DISPATCH_QUEUE_SIZE, show_default=True, help="Max number of hotkeys waiting to be sent to the server, per keyboard")(command)
+  return command
+
+# Dict of the keyboard options, to give to each Keyboard
+def keyboard_settings(queue_size, queue_policy, block_timeout, backend, quiet_hot_path, log_sample, no_journal, transport, no_batch, batch_window, collapse_multi):
+  return {
+    "queue_size": queue_size,
+    "queue_policy": queue_policy,
+    "block_timeout": block_timeout,
+    "backend": backend,
+    "quiet": quiet_hot_path,
+    "log_sample": log_sample,
+    "journal": not no_journal,
+    "transport": transport,
+    "batch": not no_batch,
+    "batch_window": batch_window,
+    "collapse_multi": collapse_multi,
+  }
 
 @cli.command()
 @click.argument("keyboard")
 @click.option("-n", "--no-lock", is_flag=True, help="Don't lock the keyboard")
-def watch(keyboard, no_lock):
+@keyboard_options
+@click.option("--metrics", metavar="ADDRESS", help="Serve hotkey latency metrics (Prometheus format) on host:port or unix:/path/to/socket")
+@click.option("--no-reload", is_flag=True, help="Don't reload the config when it changes or on SIGHUP")
+@click.option("--cpus", metavar="CPUS", help="Only run on these CPUs (comma separated list)")
+@realtime_options
+def watch(keyboard, no_lock, metrics, no_reload, cpus, sched, priority, nice, mlock, **options):
   if keyboard == "":
     logger.err("Please provide a keyboard to watch.")
     exit()
   
   # Keyboard specified, watch it
+  from ..watcher import Keyboard
+  from ..watcher.reload import Reloader
+  from ..watcher.realtime import apply_realtime
+  prepare_realtime(mlock)
+  config, compiled = load_watch_config()
+  registry = start_metrics(metrics)
+  keyboard = Keyboard(config["keyboards"][keyboard], keyboard, config=config, metrics=registry, compiled=compiled.get(keyboard), **keyboard_settings(**options))
+  reloader = None
+  if not no_reload:
+    reloader = Reloader([keyboard]).start()
+  apply_realtime([keyboard], **realtime_settings(sched, priority, nice, mlock, cpus))
+  try:
+    if not no_lock:
+      try:
+        keyboard.lock() # Grabs keyboard
+        keyboard.watch_keyboard()
+      except (KeyboardInterrupt, SystemExit, OSError):
+        keyboard.unlock()
+        keyboard.stop()
+        exit(0)
+    else:
+      try:
+        keyboard.watch_keyboard()
+      except (KeyboardInterrupt, SystemExit):
+        keyboard.stop()
+  finally:
+    if reloader is not None:
+      reloader.stop()
+
+@cli.command()
+@click.argument("keyboards", nargs=-1, required=False)
+@click.option("-n", "--no-lock", is_flag=True, help="Don't lock the keyboards")
+@keyboard_options
+@click.option("--metrics", metavar="ADDRESS", help="Serve hotkey latency metrics (Prometheus format) on host:port or unix:/path/to/socket")
+@click.option("--no-reload", is_flag=True, help="Don't reload the config when it changes or on SIGHUP")
+@click.option("--cpus", metavar="CPUS", help="Only run on these CPUs (comma separated list)")
+@realtime_options
+def watch_all(keyboards, no_lock, metrics, no_reload, cpus, sched, priority, nice, mlock, **options):
+  """Watch all keyboards (or those given) from one process"""
+  from ..watcher import watch_all as watch_all_keyboards
+  prepare_realtime(mlock)
+  config, compiled = load_watch_config()
+  for keyboard in keyboards:
+    if keyboard not in config["keyboards"]:
+      logger.err("Keyboard " + keyboard + " not found in config.")
+      exit(1)
+  registry = start_metrics(metrics)
+  watch_all_keyboards(config, keyboards, lock=not no_lock, compiled=compiled, reload=not no_reload, realtime=realtime_settings(sched, priority, nice, mlock, cpus), metrics=registry, **keyboard_settings(**options))
+
+@cli.command()
+@click.argument("keyboards", nargs=-1, required=False)
+@click.option("-n", "--no-lock", is_flag=True, help="Don't lock the keyboards")
+@click.option("--cpus", metavar="CPUS", help="Pin each worker to a CPU, in turn from this comma separated list, or auto to use every CPU")
+@keyboard_options
+@click.option("--no-reload", is_flag=True, help="Don't reload the config when it changes or on SIGHUP")
+@realtime_options
+def supervise(keyboards, no_lock, cpus, no_reload, sched, priority, nice, mlock, **options):
+  """Watch all keyboards (or those given) with a worker process for each, restarting them if they crash.
+  Send SIGUSR1 to log the stats of each worker."""
+  from ..watcher.supervisor import supervise as supervise_keyboards
+  prepare_realtime(mlock) # Workers inherit it when forked
+  config, compiled = load_watch_config()
+  for keyboard in keyboards:
+    if keyboard not in config["keyboards"]:
+      logger.err("Keyboard " + keyboard + " not found in config.")
+      exit(1)
+  supervise_keyboards(config, keyboards, cpus=cpus, compiled=compiled, lock=not no_lock, reload=not no_reload, realtime=realtime_settings(sched, priority, nice, mlock), **keyboard_settings(**options))
+
+@cli.command()
+@click.argument("keyboard")
+@click.argument("output", type=click.Path(dir_okay=False))
+@click.option("-c", "--count", type=int, help="Stop after recording this many events (default: record until Ctrl+C)")
+@click.option("-l", "--lock", is_flag=True, help="Lock the keyboard while recording")
+def record(keyboard, output, count, lock):
+  """Record events from a keyboard to a file, to replay with the replay command"""
+  from ..util.config import load_config
+  from ..watcher.replay import record_keyboard
+  config = load_config()
+  logger.info("Recording events from " + keyboard + " to " + output + "...")
+  recorded = record_keyboard(config["keyboards"][keyboard], output, count=count, lock=lock)
+  logger.info("Recorded " + str(recorded) + " events.")
+
+@cli.command()
+@click.argument("keyboard")
+@click.argument("capture", type=click.Path(exists=True, dir_okay=False))
+@click.option("--realtime", is_flag=True, help="Replay events with the timing they were recorded with, instead of as fast as possible")
+@click.option("--allocations", is_flag=True, help="Measure memory allocated (slows down replay)")
+@click.option("--quiet-hot-path", is_flag=True, help="Don't log anything for each key press or hotkey")
+def replay(keyboard, capture, realtime, allocations, quiet_hot_path):
+  """Replay a recorded file through a keyboard's hotkeys & report how fast they were matched"""
+  from ..util.config import load_config
+  from ..watcher.replay import replay_keyboard, read_capture
   config = load_config()
-  keyboard = Keyboard(config["keyboards"][keyboard], keyboard)
-  if not no_lock:
-    try:
-      keyboard.lock() # Grabs keyboard
-      keyboard.watch_keyboard()
-    except (KeyboardInterrupt, SystemExit, OSError):
-      keyboard.unlock()
-      exit(0)
-  else:
-    keyboard.watch_keyboard()
+  stats = replay_keyboard(config, keyboard, read_capture(capture), realtime=realtime, allocations=allocations, quiet=quiet_hot_path)
+  for stat, value in stats.items():
+    logger.info("%s: %s", stat, round(value, 3) if isinstance(value, float) else value)
 
 # Command to generate daemons
 @cli.command()
 @click.argument("keyboards", nargs=-1, required=False)
-def daemon_gen(keyboards):
+@click.option("--single", is_flag=True, help="Generate one unit file that watches all keyboards (with watch-all), instead of one per keyboard")
+@click.option("--supervise", is_flag=True, help="Generate one unit file that watches all keyboards with a worker process for each (with supervise)")
+@click.option("--cpus", metavar="CPUS", help="Only run on these CPUs (comma separated list)")
+@realtime_options
+def daemon_gen(keyboards, single, supervise, cpus, sched, priority, nice, mlock):
   logger.info("Generating daemon files...")
+  from ..util.config import load_config
+  from ..daemon import generate_daemon
   config = load_config()
   keyboard_list = config["keyboards"].keys()
   if keyboards != ():
     # Use args instead
     keyboard_list = keyboards
-  generate_daemon(config["name"], config["keyboards"].keys())
+  realtime = { "sched": sched, "priority": priority, "nice": nice, "cpus": cpus, "mlock": mlock }
+  generate_daemon(config["name"], keyboard_list, single=single, supervise=supervise, realtime=realtime)
 
 @cli.command("version")
 def getversion():
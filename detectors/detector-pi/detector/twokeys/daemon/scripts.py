@@ -21,33 +21,46 @@ import os
 import stat
 import pystache
 from ..util.logger import Logger
-from ..util.constants import DAEMON_TEMPLATE_PATH, SCRIPTS_ROOT, LOCAL_ROOT, DAEMON_TEMPLATE_SCRIPT_PATH
+from ..util.constants import DAEMON_TEMPLATE_PATH, SCRIPTS_ROOT, LOCAL_ROOT, DAEMON_TEMPLATE_SCRIPT_PATH, DAEMON_ALL_TEMPLATE_PATH, DAEMON_ALL_NAME, DAEMON_SUPERVISE_NAME, REALTIME_PRIORITY
 
 logger = Logger("daemon")
 # Generates a systemd unit file
 # Name: Name of 2Keys project
 # Keyboards: Array of keyboard names
-def generate_daemon(name, keyboards):
+# Single: Generate one unit file that watches all the keyboards from one process, instead of one per keyboard
+# Supervise: Generate one unit file that runs 2Keys supervise, which has a worker process for each keyboard
+# Realtime: Dict of real time options for the units (see realtime_unit_options())
+def generate_daemon(name, keyboards, single=False, supervise=False, realtime=None):
   logger.info("Creating systemd unit scripts...")
-  template = open(DAEMON_TEMPLATE_PATH, "r").read() # Open template
-  for keyboard in keyboards:
-    script = pystache.render(template, {
+  service_options, watch_options = realtime_unit_options(**(realtime or {}))
+  if single or supervise:
+    unit = DAEMON_SUPERVISE_NAME if supervise else DAEMON_ALL_NAME
+    template = open(DAEMON_ALL_TEMPLATE_PATH, "r").read()
+    write_unit_file(unit, pystache.render(template, {
       "name": name,
-      "index_path": "2Keys",
-      "keyboard": keyboard,
+      "command": unit,
+      "keyboards": " ".join(keyboards),
+      "service_options": service_options,
+      "watch_options": watch_options,
       "detector_path": SCRIPTS_ROOT,
       "version": str(sys.version_info[0]) + "." + str(sys.version_info[1]),
       "pwd": os.getcwd()
-    })
-    if not os.path.exists(LOCAL_ROOT):
-      logger.info("Making local root ./.2Keys...")
-      os.makedirs(LOCAL_ROOT)
-    
-    UNIT_FILE_NAME = "2Keys-%s.service" % keyboard
-    logger.info("Creating unit file {}...".format(UNIT_FILE_NAME))
-    unitFile = open(LOCAL_ROOT + "/" + UNIT_FILE_NAME, "w")
-    logger.info("Writing...")
-    unitFile.write(script)   
+    }))
+    # Register script manages the one unit instead of one per keyboard
+    keyboards = [unit]
+  else:
+    template = open(DAEMON_TEMPLATE_PATH, "r").read() # Open template
+    for keyboard in keyboards:
+      write_unit_file(keyboard, pystache.render(template, {
+        "name": name,
+        "index_path": "2Keys",
+        "keyboard": keyboard,
+        "service_options": service_options,
+        "watch_options": watch_options,
+        "detector_path": SCRIPTS_ROOT,
+        "version": str(sys.version_info[0]) + "." + str(sys.version_info[1]),
+        "pwd": os.getcwd()
+      }))
 
   logger.info("Writing a shell script to manage the unit files (services/daemons)...")
   shTemplate = open(DAEMON_TEMPLATE_SCRIPT_PATH, "r").read()
@@ -74,3 +87,38 @@ def generate_daemon(name, keyboards):
   logger.info(" sudo bash ./.2Keys/register.sh register")
   logger.info("For help on how to use the script:")
   logger.info(" sudo bash ./.2Keys/register.sh help")
+
+# Settings for the [Service] section of units, & options for the 2Keys command, for the real time options (see watcher/realtime.py)
+# systemd sets the scheduling, nice value & CPUs before starting 2Keys. Locking memory has to be done by 2Keys itself
+# Sched: Scheduling policy (fifo or rr), or None to leave it
+# Priority: Real time priority, for sched
+# Nice: Nice value, or None to leave it
+# Cpus: CPUs to run on, as a comma separated list, or None for any
+# Mlock: Lock memory
+# Returns (settings, one per line, options)
+def realtime_unit_options(sched=None, priority=REALTIME_PRIORITY, nice=None, cpus=None, mlock=False):
+  settings = []
+  options = []
+  if sched is not None:
+    settings.append("CPUSchedulingPolicy=" + sched)
+    settings.append("CPUSchedulingPriority=" + str(priority))
+  if nice is not None:
+    settings.append("Nice=" + str(nice))
+  if cpus is not None:
+    settings.append("CPUAffinity=" + cpus)
+  if mlock:
+    settings.append("LimitMEMLOCK=infinity")
+    options.append("--mlock")
+  return "\n".join(settings), " ".join(options)
+
+# Write unit file 2Keys-<unit>.service to ./.2Keys
+def write_unit_file(unit, script):
+  if not os.path.exists(LOCAL_ROOT):
+    logger.info("Making local root ./.2Keys...")
+    os.makedirs(LOCAL_ROOT)
+
+  UNIT_FILE_NAME = "2Keys-%s.service" % unit
+  logger.info("Creating unit file {}...".format(UNIT_FILE_NAME))
+  logger.info("Writing...")
+  with open(LOCAL_ROOT + "/" + UNIT_FILE_NAME, "w") as unitFile:
+    unitFile.write(script)
@@ -17,16 +17,15 @@ You should have received a copy of the GNU General Public License
 along with 2Keys.  If not, see <https://www.gnu.org/licenses/>.
 """
 import sys
-import requests
-import json
 import os
 from os import path
-import yaml
 import colorful
 from ..util.constants import SCRIPTS_ROOT, DEFAULT_PORT, MODULE_NAME
 from ..util.logger import Logger
-from ..util.config import load_config
+from ..util.config import load_config, write_config
+from ..sync.resync_config import fetch_config, save_sync_state
 from ..daemon import generate_daemon
+from ..watcher.compiled import write_snapshot
 from ..add_keyboard import add_keyboards
 
 logger = Logger("init")
@@ -52,34 +51,16 @@ def init(**args):
 
   # Make request, get config in JSON format
   logger.info("Fetching config...")
-  try:
-    config_json = requests.get("http://" + ipv4 + ":" + port + "/api/get/config")
-  except requests.exceptions.ConnectionError:
-    logger.err("Couldn't estanblish a connection to the server.")
-    logger.err("Please check your internet connection.")
-    exit() # Can't do any more
-  if config_json.status_code >= 400: # i.e. 404 or 500
-    logger.err("ERROR: Request for config unsucessful!")
-    logger.err("Got status code " + str(config_json.status_code) + " with response:")
-    logger.err(config_json.text)
-    logger.debug("Headers: ")
-    logger.debug(config_json.headers)
-    exit()
-  config = json.loads(config_json.text)
+  config, validators = fetch_config("http://" + ipv4 + ":" + str(port))
 
   # Save config
   logger.info("Saving config to " + os.getcwd() + "...")
-  logger.debug("Opening config file handler...")
-  config_file = open("config.yml", "w")
-  logger.debug("Writing config...")
-  config_file.write("# Config for 2Keys\n# ONLY FOR USE BY THE PROGRAM\n# To change the config, update it on the client and run \"2Keys config-update\" here\n" +
-                    yaml.dump(config, default_flow_style=False))
-  config_file.close() # Needed so that add keyboard can read it
+  write_config(config) # Needed so that add keyboard can read it
+  save_sync_state(validators)
+  # Compile the config, so the watcher doesn't have to. Adding keyboards compiles it again if their paths change
+  write_snapshot()
 
   # Then scan for keyboards
-  # Since running directly from here causes issues with async not stopping etc, holding everything up
-  # run 2Keys add
-  # (essentially run in another process)
   # Do for each keyboard in config.keyboards
   logger.info("Running scripts to add path for keyboard input...")
   # Check for --no-path-request, which implies paths are already in config
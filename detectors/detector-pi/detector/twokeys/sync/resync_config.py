@@ -17,27 +17,42 @@ You should have received a copy of the GNU General Public License
 along with 2Keys.  If not, see <https://www.gnu.org/licenses/>.
 """
 # Script to resync config from server
+# The config is only sent by the server if it's changed since it was last synced (ETag & Last-Modified),
+# & is only written if it's different to the config already here, so a sync where nothing has changed
+# costs a request & a 304, & doesn't make the watchers reload
 import requests
 import json
-import yaml
 import os
 from ..util.logger import Logger
-from ..util.config import load_config
-from ..util.constants import CONFIG_FILE
+from ..util.config import load_config, write_config, get_server_url
+from ..util.constants import CONFIG_FILE, CONFIG_PATH, SYNC_TIMEOUT, SYNC_STATE_FILE
+from ..watcher.compiled import write_snapshot, load_snapshot, hash_file
 
 logger = Logger("sync")
 
-def sync_config():
-  logger.info("Syncing config...")
-  config = load_config()
-  address = "http://" + config["addresses"]["server"]["ipv4"] + ":" + str(config["addresses"]["server"]["port"]) + "/api/get/config"
-  logger.debug("GET " + address)
+# Fetch the config from the server
+# server_url: Base URL of the server (see get_server_url())
+# validators: Dict of the etag & last_modified of the config last fetched, to only fetch it if it's changed since
+# Returns (config, validators of the config fetched), with config None if it hasn't changed. Exits if it can't be fetched
+def fetch_config(server_url, validators=None):
+  headers = { "Accept-Encoding": "gzip" }
+  if validators is not None:
+    if validators.get("etag"):
+      headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+      headers["If-Modified-Since"] = validators["last_modified"]
+  logger.debug("GET " + server_url + CONFIG_PATH)
   try:
-    config_json = requests.get(address)
+    config_json = requests.get(server_url + CONFIG_PATH, headers=headers, timeout=SYNC_TIMEOUT)
   except requests.exceptions.ConnectionError:
     logger.err("Couldn't estanblish a connection to the server.")
     logger.err("Please check your internet connection.")
     exit() # Can't do any more
+  except requests.exceptions.Timeout:
+    logger.err("The request for the config timed out.")
+    exit()
+  if config_json.status_code == 304:
+    return None, validators
   if config_json.status_code >= 400: # i.e. 404 or 500
     logger.err("ERROR: Request for config unsucessful!")
     logger.err("Got status code " + str(config_json.status_code) + " with response:")
@@ -45,14 +60,43 @@ def sync_config():
     logger.debug("Headers: ")
     logger.debug(config_json.headers)
     exit()
-  config = json.loads(config_json.text)
-
-  # Save config
-  logger.info("Saving config to " + os.getcwd() + "...")
-  # Add IP to config
-  logger.debug("Opening config...")
-  config_file = open(CONFIG_FILE, "w")
-  logger.debug("Writing config...")
-  config_file.write("# Config for 2Keys\n# ONLY FOR USE BY THE PROGRAM\n# To change the config, update it on the client and run \"2Keys config-update\" here\n" +
-                    yaml.dump(config, default_flow_style=False))
-  config_file.close() # Needed so that add keyboard can read it
+  return json.loads(config_json.text), { "etag": config_json.headers.get("ETag"), "last_modified": config_json.headers.get("Last-Modified") }
+
+# Validators of the config last synced, & the hash of the config file they're for
+def load_sync_state():
+  try:
+    with open(SYNC_STATE_FILE, "r") as state_file:
+      return json.load(state_file)
+  except (OSError, ValueError):
+    return {}
+
+# Save the validators of the config just synced (see fetch_config()), with the hash of the config file as it is now
+def save_sync_state(validators, config_path=CONFIG_FILE):
+  os.makedirs(os.path.dirname(SYNC_STATE_FILE), exist_ok=True)
+  with open(SYNC_STATE_FILE + ".tmp", "w") as state_file:
+    json.dump(dict(validators, hash=hash_file(config_path)), state_file)
+  os.replace(SYNC_STATE_FILE + ".tmp", SYNC_STATE_FILE)
+
+# Sync the config from the server
+# Returns True if the config changed
+def sync_config():
+  logger.info("Syncing config...")
+  config = load_config()
+  state = load_sync_state()
+  # Only ask for the config if it's changed if the config here is still the one synced, i.e. not changed by 2Keys add since
+  validators = state if state.get("hash") == hash_file(CONFIG_FILE) else None
+  config, validators = fetch_config(get_server_url(config), validators)
+  changed = False
+  if config is None:
+    logger.info("Config is already up to date.")
+  else:
+    # Save config
+    logger.info("Saving config to " + os.getcwd() + "...")
+    changed = write_config(config)
+    if not changed:
+      logger.info("Config hasn't changed, so was left as it is.")
+    save_sync_state(validators)
+  # Compile it, so the watcher doesn't have to. Not needed if it's already compiled, i.e. when nothing changed
+  if changed or load_snapshot() is None:
+    write_snapshot()
+  return changed
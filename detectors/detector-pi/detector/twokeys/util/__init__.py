@@ -17,4 +17,10 @@ You should have received a copy of the GNU General Public License
 along with 2Keys.  If not, see <https://www.gnu.org/licenses/>.
 """
 from .logger import Logger
-from .config import load_config
+
+# load_config is imported when it's first used, so importing util (i.e. for the logger) doesn't import yaml
+def __getattr__(name):
+  if name == "load_config":
+    from .config import load_config
+    return load_config
+  raise AttributeError("module " + __name__ + " has no attribute " + name)
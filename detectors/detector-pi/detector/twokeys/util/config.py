@@ -17,14 +17,85 @@ You should have received a copy of the GNU General Public License
 along with 2Keys.  If not, see <https://www.gnu.org/licenses/>.
 """
 # Config loader#
+# Configs are cached for the whole process, so loading the config again only costs a stat() of the file.
+# The cache is invalidated when the file changes (different mtime, size or inode, i.e. after an atomic write)
+import os
+from types import MappingProxyType
 import yaml
-from .constants import CONFIG_FILE
+from .constants import CONFIG_FILE, CONFIG_HEADER, CHANNEL_PORT_OFFSET
 from ..util.logger import Logger
 logger = Logger("config")
 
-def load_config():
+# Use the C (libyaml) parser if PyYAML was built with it
+try:
+	from yaml import CSafeLoader as ConfigLoader
+except ImportError:
+	from yaml import SafeLoader as ConfigLoader
+
+# path -> (stat key, config)
+_cache = {}
+
+# Make a read-only copy of a parsed config, so the cached config can be shared safely
+# dicts become read-only mappings & lists become tuples
+def freeze(value):
+	if isinstance(value, dict):
+		return MappingProxyType({ key: freeze(item) for key, item in value.items() })
+	if isinstance(value, list):
+		return tuple(freeze(item) for item in value)
+	return value
+
+# Make a normal (writable) copy of a config from load_config(), i.e. to change & write it back
+def copy_config(value):
+	if isinstance(value, MappingProxyType) or isinstance(value, dict):
+		return { key: copy_config(item) for key, item in value.items() }
+	if isinstance(value, tuple) or isinstance(value, list):
+		return [copy_config(item) for item in value]
+	return value
+
+# Load the config
+# Returns a read-only config, which is shared with everything else that loads it. Use copy_config() to change it
+def load_config(path=CONFIG_FILE):
+	stat = os.stat(path)
+	key = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+	cached = _cache.get(path)
+	if cached is not None and cached[0] == key:
+		return cached[1]
 	logger.debug("Loading config...")
-	config_file = open(CONFIG_FILE, "r")
-	contents = yaml.load(config_file.read(), Loader=yaml.FullLoader)
-	config_file.close()
+	with open(path, "r") as config_file:
+		contents = freeze(yaml.load(config_file.read(), Loader=ConfigLoader))
+	_cache[path] = (key, contents)
 	return contents
+
+# Forget cached configs, i.e. after writing the config
+def clear_config_cache():
+	_cache.clear()
+
+# Write the config, unless it's the same as what's already there
+# Written to a temporary file first & renamed over the config, so the config is never left half written.
+# When it's the same, the file isn't touched, so watchers don't reload it (see watcher/reload.py)
+# config: Config as plain dicts & lists (see copy_config())
+# Returns True if it was written
+def write_config(config, path=CONFIG_FILE):
+	contents = (CONFIG_HEADER + yaml.dump(config, default_flow_style=False)).encode("utf-8")
+	try:
+		with open(path, "rb") as config_file:
+			if config_file.read() == contents:
+				return False
+	except FileNotFoundError:
+		pass
+	with open(path + ".tmp", "wb") as config_file:
+		config_file.write(contents)
+		config_file.flush()
+		os.fsync(config_file.fileno())
+	os.replace(path + ".tmp", path)
+	clear_config_cache()
+	return True
+
+
+# Get base URL of the server, i.e. http://192.168.0.2:9090
+def get_server_url(config):
+	return "http://" + config["addresses"]["server"]["ipv4"] + ":" + str(config["addresses"]["server"]["port"])
+
+# Get (host, port) of the server's trigger channel (see watcher/channel.py)
+def get_channel_address(config):
+	return (config["addresses"]["server"]["ipv4"], int(config["addresses"]["server"]["port"]) + CHANNEL_PORT_OFFSET)
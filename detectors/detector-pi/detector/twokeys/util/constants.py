@@ -28,28 +28,133 @@ VERSION = "0.4.0"
 #long int, long int, unsigned short, unsigned short, unsigned int
 KEYBOARD_EVENT_FORMAT = 'llHHI'
 KEYBOARD_EVENT_SIZE = struct.calcsize(KEYBOARD_EVENT_FORMAT)
+# Event type of key events (see linux/input-event-codes.h)
+EV_KEY = 0x01
+# Max number of events read from a keyboard at once
+READ_BATCH_SIZE = 64
+# How events are read from keyboards (see watcher/raw_reader.py)
+BACKEND_RAW = "raw"
+BACKEND_EVDEV = "evdev"
+BACKENDS = [BACKEND_RAW, BACKEND_EVDEV]
 
-# Max key maps
-MAX_KEY_MAPS = 250
+# Captures of keyboard events (2Keys record)
+# Header, then events as: long long, long long, unsigned short, unsigned short, unsigned int (little endian)
+CAPTURE_HEADER = b"2KEYSCAP\x01"
+CAPTURE_EVENT_FORMAT = "<qqHHI"
+
+# Number of key codes (KEY_CNT in linux/input-event-codes.h)
+KEY_CNT = 0x300
+
+# Max key maps, one for every key code
+MAX_KEY_MAPS = KEY_CNT
 
 # Script root
 SCRIPTS_ROOT = os.path.dirname(os.path.realpath(__file__)) + "/.."
 
 # Config file
 CONFIG_FILE = "config.yml"
+# Put at the top of the config file
+CONFIG_HEADER = "# Config for 2Keys\n# ONLY FOR USE BY THE PROGRAM\n# To change the config, update it on the client and run \"2Keys config-update\" here\n"
+# Compiled config, saved next to the config (see watcher/compiled.py)
+SNAPSHOT_FILE = "config.compiled"
+# Changed whenever what is in the compiled config changes
+SNAPSHOT_VERSION = 3
+
+# Request dir for getting the config
+CONFIG_PATH = "/api/get/config"
+# Seconds to wait for the server to send the config
+SYNC_TIMEOUT = 10
 
 # REquest dir for sync
 UPDATE_KEYBOARD_PATH = "/api/post/update-keyboard-path"
+# Request dir for updating the paths of several keyboards at once
+UPDATE_KEYBOARD_PATHS = "/api/post/update-keyboard-paths"
+
+# Request dir for triggering hotkeys
+TRIGGER_PATH = "/api/post/trigger"
+# Request dir for triggering several hotkeys at once, in order
+TRIGGERS_PATH = "/api/post/triggers"
+# Seconds to wait for the server to respond to a trigger
+TRIGGER_TIMEOUT = 2
+# Microseconds to keep gathering triggers for, to send them to the server in one batch
+# 0 sends the triggers from each SYN_REPORT frame (one report from the keyboard) together, without waiting for more
+BATCH_WINDOW = 0
+
+# How to send triggers to the server
+# http: A HTTP request for each trigger
+# channel: One long lived connection, with triggers sent without waiting for the last to be acked (see watcher/channel.py)
+TRANSPORT_HTTP = "http"
+TRANSPORT_CHANNEL = "channel"
+TRANSPORTS = [TRANSPORT_HTTP, TRANSPORT_CHANNEL]
+# The server's trigger channel is on its port plus this
+CHANNEL_PORT_OFFSET = 1
+# Max triggers sent over the channel & not acked yet that are kept to send again if the connection drops
+CHANNEL_MAX_UNACKED = 1024
+# Seconds to wait before reconnecting the channel, doubled each time it fails, up to the max
+CHANNEL_BACKOFF_MIN = 0.1
+CHANNEL_BACKOFF_MAX = 5
+
+# Journal of triggers that couldn't be sent, to send when the server is back (see watcher/journal.py)
+# Bytes in each keyboard's journal. The oldest triggers are dropped when it's full
+JOURNAL_SIZE = 256 * 1024
+# Seconds after which a trigger in the journal is too old to be worth sending
+JOURNAL_TTL = 60
+# Max triggers to send from the journal at once
+JOURNAL_BATCH_SIZE = 32
+# Seconds to wait before trying the server again, doubled each time it's still down, up to the max
+JOURNAL_BACKOFF_MIN = 0.5
+JOURNAL_BACKOFF_MAX = 30
+
+# Upper bounds of the buckets for trigger latency histograms, in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
 
 # Default port
 DEFAULT_PORT = 9090
 
+# Max number of triggers waiting to be sent to the server, per keyboard
+DEFAULT_DISPATCH_QUEUE_SIZE = 64
+# What to do when the queue of triggers is full (see watcher/dispatcher.py)
+# block: Wait (backpressure on the keyboard) until there is space, or the timeout runs out and the trigger is dropped
+# drop-newest: Drop the trigger being added
+# drop-oldest: Drop the oldest queued trigger to make space for the new one
+POLICY_BLOCK = "block"
+POLICY_DROP_NEWEST = "drop-newest"
+POLICY_DROP_OLDEST = "drop-oldest"
+POLICIES = [POLICY_BLOCK, POLICY_DROP_NEWEST, POLICY_DROP_OLDEST]
+
+# Real time options for the watcher (see watcher/realtime.py)
+# Scheduling policies, & the default real time priority (1 to 99)
+SCHED_POLICIES = ["fifo", "rr"]
+REALTIME_PRIORITY = 50
+# Stack size (bytes) of threads started after memory is locked, as each thread's whole stack is locked (8 MB by default)
+REALTIME_STACK_SIZE = 256 * 1024
+
+# Supervisor (2Keys supervise, see watcher/supervisor.py)
+# Seconds to wait before restarting a crashed worker, doubled each time it crashes again up to the max
+SUPERVISOR_BACKOFF_MIN = 0.5
+SUPERVISOR_BACKOFF_MAX = 30
+# Seconds a worker has to run for before a crash is no longer counted as crashing again (resets the backoff)
+SUPERVISOR_HEALTHY_AFTER = 60
+# Seconds between each worker sending its stats to the supervisor
+SUPERVISOR_STATS_INTERVAL = 5
+# Seconds to wait for workers to stop before killing them
+SUPERVISOR_STOP_TIMEOUT = 5
+
 # Systemd unit file location
 DAEMON_TEMPLATE_PATH = os.path.join(SCRIPTS_ROOT, "./assets/service.service")
 DAEMON_TEMPLATE_SCRIPT_PATH = os.path.join(SCRIPTS_ROOT, "./assets/register.sh")
+# Unit file for watching all keyboards from one process, & the name used in place of a keyboard for it
+DAEMON_ALL_TEMPLATE_PATH = os.path.join(SCRIPTS_ROOT, "./assets/service-all.service")
+DAEMON_ALL_NAME = "watch-all"
+# Name used in place of a keyboard for the unit running 2Keys supervise (uses the same template)
+DAEMON_SUPERVISE_NAME = "supervise"
 
 # Local root
 LOCAL_ROOT = os.getcwd() + "/.2Keys"
+# Where each keyboard's journal of unsent triggers is kept
+JOURNAL_ROOT = LOCAL_ROOT + "/journal"
+# ETag & Last-Modified of the config when it was last synced, so it's only fetched again if it's changed (see sync/resync_config.py)
+SYNC_STATE_FILE = LOCAL_ROOT + "/sync.json"
 
 # Module name
 MODULE_NAME = "twokeys"
@@ -677,4 +677,21 @@ keys[248] = custom_name("MICMUTE") # Microphone mute
 # Have no idea if this is correct
 # NOTE: Should be 0x300
 keys[MAX_KEY_MAPS - 1] = None # MAX keys is 0x2ff
-#define KEY_CNT (KEY_MAX+1) # No ides what this is
+#define KEY_CNT (KEY_MAX+1) # Number of key codes, so every code from the kernel has a place in keys
+
+# Made a tuple so the map can't be changed by accident, as it is shared by every keyboard
+# (keyboards with custom mappings put them in an overlay on top of it, see watcher/key_map.py)
+keys = tuple(keys)
+
+# Reverse lookup of key names -> codes, with every code a name is mapped to
+# i.e. key_codes["+"] == (42, 54), for left & right shift
+def build_key_codes(key_map):
+    codes = {}
+    for code, mapping in enumerate(key_map):
+        if not mapping:
+            continue # Reserved/unmapped key
+        for name in ([mapping] if isinstance(mapping, str) else mapping):
+            codes.setdefault(name, []).append(code)
+    return { name: tuple(name_codes) for name, name_codes in codes.items() }
+
+key_codes = build_key_codes(keys)
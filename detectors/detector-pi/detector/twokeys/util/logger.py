@@ -20,7 +20,16 @@ along with 2Keys.  If not, see <https://www.gnu.org/licenses/>.
 import colorful
 import sys
 import os
+
+# Log levels, lowest first
+DEBUG = 10
+INFO = 20
+WARN = 30
+ERR = 40
+
 # string name: Name of module logging
+# Messages can be given as a format string & args (i.e. logger.info("Got %s", thing)),
+# in which case they're only formatted if they will be logged
 class Logger:
   def __init__(self, name):
     self.silent = False
@@ -30,16 +39,51 @@ class Logger:
       self.isDebug = True
     if "--silent" in sys.argv or os.getenv("2KEYS_TEST", "False").lower() == "true":
       self.silent = True
-  def info(self, text):
+  # Will a message of level be logged?
+  # Use to skip building messages that won't be logged
+  def enabled(self, level):
+    return not self.silent and (level > DEBUG or self.isDebug)
+  def __log(self, level, levelColour, text, args):
+    print(colorful.magenta(self.name) + " " + getattr(colorful, levelColour)(level) + " " + (text % args if args else str(text)))
+  def info(self, text, *args):
     if not self.silent:
-      print(colorful.magenta(self.name) + " " + colorful.green("info") + " " + str(text))
-  def debug(self, text):
+      self.__log("info", "green", text, args)
+  def debug(self, text, *args):
     if not self.silent and self.isDebug:
-      print(colorful.magenta(self.name) + " " + colorful.cyan("debug") + " " + str(text))
-  def err(self, text):
+      self.__log("debug", "cyan", text, args)
+  def err(self, text, *args):
     if not self.silent:
-      print(colorful.magenta(self.name) + " " + colorful.red("err") + " " + str(text))
-  def warn(self, text):
+      self.__log("err", "red", text, args)
+  def warn(self, text, *args):
     if not self.silent:
-      print(colorful.magenta(self.name) + " " + colorful.yellow("warn") + " " + str(text))
-    
+      self.__log("warn", "yellow", text, args)
+  # Logger that only logs every nth message
+  # For messages logged for every event, where logging all of them would be too much
+  def sample(self, every):
+    return SampledLogger(self, every)
+
+# Logs only 1 in every messages given to it to logger
+class SampledLogger:
+  def __init__(self, logger, every):
+    self.logger = logger
+    self.every = max(1, every)
+    self.count = 0
+  # Should the next message be logged?
+  def next(self):
+    self.count += 1
+    if self.count >= self.every:
+      self.count = 0
+      return True
+    return False
+  def info(self, text, *args):
+    if self.next():
+      self.logger.info(text, *args)
+  def debug(self, text, *args):
+    if self.next():
+      self.logger.debug(text, *args)
+  def err(self, text, *args):
+    if self.next():
+      self.logger.err(text, *args)
+  def warn(self, text, *args):
+    if self.next():
+      self.logger.warn(text, *args)
@@ -16,4 +16,5 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with 2Keys.  If not, see <https://www.gnu.org/licenses/>.
 """
-from .watch_keyboard import Keyboard, AsyncKeyboard
+from .watch_keyboard import Keyboard
+from .watch_all import watch_all
@@ -0,0 +1,324 @@
+"""
+Copyright 2018 Kishan Sambhi
+
+This file is part of 2Keys.
+
+2Keys is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+2Keys is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with 2Keys.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# Trigger channel: one long lived TCP connection to the server, instead of a HTTP request for each trigger
+# Triggers are written to the connection without waiting for the server to reply to the last one (pipelining),
+# & the server's acks are read from a background thread. Triggers not acked when the connection drops are sent
+# again when it reconnects, which happens automatically, if they have a run & sequence number (i.e. when keeping a journal),
+# so the server can drop the ones it already ran. Those without are forgotten instead, as they may have run already
+# Each message is a frame of: length of the body (4 bytes, big endian), id (4 bytes), type (1 byte), then the body,
+# which is the JSON the matching HTTP route takes. Acks have the id of the frame they're for, & a body of { status, text }
+import json
+import socket
+import socketserver
+import struct
+import threading
+from collections import OrderedDict
+from ..util.config import get_channel_address
+from ..util.constants import TRIGGER_TIMEOUT, CHANNEL_MAX_UNACKED, CHANNEL_BACKOFF_MIN, CHANNEL_BACKOFF_MAX
+from ..util.logger import Logger
+from .trigger_client import TriggerBodies
+
+logger = Logger("channel")
+
+FRAME_HEADER_FORMAT = ">IIB"
+FRAME_HEADER_SIZE = struct.calcsize(FRAME_HEADER_FORMAT)
+# Frame types
+FRAME_TRIGGER = 1 # Body as for /api/post/trigger
+FRAME_UPDATE_KEYBOARD_PATHS = 2 # Body as for /api/post/update-keyboard-paths
+FRAME_TRIGGERS = 3 # Body as for /api/post/triggers
+FRAME_ACK = 0x80
+
+def make_frame(id, type, body):
+    return struct.pack(FRAME_HEADER_FORMAT, len(body), id, type) + body
+
+# Splits data read from a connection into frames
+class FrameReader:
+    def __init__(self):
+        self.buffer = b""
+
+    # Returns list of (id, type, body) for each whole frame read so far
+    def feed(self, data):
+        self.buffer += data
+        frames = []
+        offset = 0
+        while len(self.buffer) - offset >= FRAME_HEADER_SIZE:
+            length, id, type = struct.unpack_from(FRAME_HEADER_FORMAT, self.buffer, offset)
+            end = offset + FRAME_HEADER_SIZE + length
+            if len(self.buffer) < end:
+                break # Rest of frame not here yet
+            frames.append((id, type, self.buffer[offset + FRAME_HEADER_SIZE:end]))
+            offset = end
+        self.buffer = self.buffer[offset:]
+        return frames
+
+# Sends triggers over the channel. Used in place of a TriggerClient (see trigger_client.make_client())
+class ChannelClient(TriggerBodies):
+    # config: 2Keys config (from load_config())
+    # timeout: Seconds to wait to connect, & for the server to reply to requests (see request())
+    # max_unacked: Max frames not acked yet to keep to send again if the connection drops. The oldest are forgotten after that
+    # address: (host, port) of the channel, from the config if not given
+    def __init__(self, config, timeout=TRIGGER_TIMEOUT, max_unacked=CHANNEL_MAX_UNACKED, address=None):
+        super().__init__()
+        self.address = get_channel_address(config) if address is None else address
+        self.timeout = timeout
+        self.max_unacked = max_unacked
+        self.next_id = 1
+        # Guards the connection & the frames waiting for acks. Notified when either changes
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.sock = None
+        self.unacked = OrderedDict() # id -> (frame, if it can be sent again), in the order they were sent
+        self.waiting = set() # Ids of requests waiting for their reply
+        self.replies = {} # id -> reply, for requests
+        self.closing = False
+        self.stopped = threading.Event() # Set when closed, to stop waiting to reconnect
+        self.reader = threading.Thread(target=self.run, name="2Keys-channel", daemon=True)
+        self.reader.start()
+        # Stats
+        self.sent = 0
+        self.acked = 0
+        self.errors = 0 # Acks that weren't OK, i.e. hotkey function not found
+        self.reconnects = 0
+        self.forgotten = 0 # Frames not acked that weren't sent again, so may not have run
+
+    # Connect, sending frames that weren't acked on the last connection again first
+    # Called with the lock held
+    def connect(self):
+        sock = socket.create_connection(self.address, timeout=self.timeout)
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            for frame, resend in self.unacked.values():
+                sock.sendall(frame)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+        self.changed.notify_all()
+        logger.debug("Connected to the server's trigger channel at %s:%u", *self.address)
+
+    # Forgets the frames not acked that can't be sent again (see write())
+    # Called with the lock held
+    def disconnect(self, sock):
+        if self.sock is sock:
+            self.sock = None
+            forget = [id for id, (frame, resend) in self.unacked.items() if not resend]
+            for id in forget:
+                del self.unacked[id]
+            if len(forget) > 0:
+                self.forgotten += len(forget)
+                logger.warn("Lost connection before the server acked " + str(len(forget)) + " triggers, which may not have run. Use the journal so they can be sent again")
+        sock.close()
+
+    # Send a frame, without waiting for it to be acked
+    # wait: Keep the reply to the frame, for request()
+    # resend: Send it again if the connection drops before it's acked. Only for frames the server can tell it's already run
+    # Returns the id of the frame
+    # Raises ConnectionError or TimeoutError if it can't be sent
+    def write(self, type, body, wait=False, resend=True):
+        with self.lock:
+            if self.closing:
+                raise ConnectionError("Channel closed")
+            id = self.next_id
+            self.next_id = self.next_id % 0xFFFFFFFF + 1
+            frame = make_frame(id, type, body)
+            sock = self.sock
+            try:
+                if sock is None:
+                    self.connect()
+                    sock = self.sock
+                sock.sendall(frame)
+            except OSError as err:
+                if sock is not None:
+                    self.disconnect(sock)
+                if isinstance(err, (ConnectionError, TimeoutError)):
+                    raise
+                raise ConnectionError(str(err)) from err
+            self.unacked[id] = (frame, resend)
+            if len(self.unacked) > self.max_unacked:
+                self.unacked.popitem(last=False)
+                self.forgotten += 1
+                logger.warn("Too many triggers waiting to be acked by the server, so forgot the oldest")
+            if wait:
+                self.waiting.add(id)
+            self.sent += 1
+            return id
+
+    # Send a trigger, without waiting for the server to reply
+    # Same arguments as TriggerClient.send()
+    # Only sent again after the connection drops if seq is given
+    def send(self, keyboard, hotkey, value, run=None, seq=None, held=None):
+        self.write(FRAME_TRIGGER, self.body(keyboard, hotkey, value, run, seq, held=held), resend=seq is not None)
+
+    # Send a batch of triggers in one frame (see TriggerClient.send_batch())
+    # Only sent again after the connection drops if run is given, as it's given with the seq of each trigger
+    def send_batch(self, keyboard, triggers, run=None):
+        self.write(FRAME_TRIGGERS, self.batch_body(keyboard, triggers, run), resend=run is not None)
+
+    # Send a frame & wait for the reply to it
+    # Returns the reply, a dict of status & text
+    def request(self, type, message):
+        id = self.write(type, json.dumps(message).encode("utf-8"), wait=True)
+        with self.lock:
+            if not self.changed.wait_for(lambda: id in self.replies, self.timeout):
+                self.waiting.discard(id)
+                raise TimeoutError("Server didn't reply")
+            self.waiting.discard(id)
+            return self.replies.pop(id)
+
+    # Update the paths of keyboards on the server
+    # paths: Dict of keyboard name -> path
+    def update_keyboard_paths(self, paths):
+        return self.request(FRAME_UPDATE_KEYBOARD_PATHS, { "paths": paths })
+
+    # Reader thread: reads acks, & reconnects if there are frames not acked when the connection drops
+    def run(self):
+        backoff = CHANNEL_BACKOFF_MIN
+        while True:
+            with self.lock:
+                self.changed.wait_for(lambda: self.closing or self.sock is not None or len(self.unacked) > 0)
+                if self.closing:
+                    return
+                sock = self.sock
+                if sock is None:
+                    try:
+                        self.connect()
+                        sock = self.sock
+                        self.reconnects += 1
+                    except OSError as err:
+                        logger.debug("Couldn't reconnect to the server's trigger channel: " + str(err))
+            if sock is None:
+                self.stopped.wait(backoff)
+                backoff = min(backoff * 2, CHANNEL_BACKOFF_MAX)
+                continue
+            backoff = CHANNEL_BACKOFF_MIN
+            self.read_acks(sock)
+
+    # Read acks until the connection drops
+    def read_acks(self, sock):
+        reader = FrameReader()
+        while not self.closing:
+            try:
+                data = sock.recv(65536)
+            except socket.timeout:
+                continue
+            except OSError:
+                data = b""
+            if not data:
+                with self.lock:
+                    self.disconnect(sock)
+                if not self.closing:
+                    logger.warn("Lost connection to the server's trigger channel")
+                return
+            for id, type, body in reader.feed(data):
+                if type == FRAME_ACK:
+                    self.handle_ack(id, body)
+
+    def handle_ack(self, id, body):
+        try:
+            reply = json.loads(body)
+        except ValueError:
+            reply = { "status": 500, "text": "Bad ack" }
+        with self.lock:
+            self.unacked.pop(id, None)
+            self.acked += 1
+            if reply.get("status") != 200:
+                self.errors += 1
+                logger.debug("Server replied to frame %u with %s: %s", id, reply.get("status"), reply.get("text"))
+            if id in self.waiting:
+                self.replies[id] = reply
+            self.changed.notify_all()
+
+    # Wait for everything sent to be acked
+    # Returns False if it wasn't acked in time
+    def flush(self, timeout=None):
+        with self.lock:
+            return self.changed.wait_for(lambda: len(self.unacked) == 0, timeout)
+
+    def close(self):
+        self.flush(self.timeout)
+        with self.lock:
+            self.closing = True
+            self.stopped.set()
+            self.changed.notify_all()
+            if self.sock is not None:
+                try:
+                    self.sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                self.disconnect(self.sock)
+        self.reader.join(self.timeout)
+
+# Small stand-in for the server's trigger channel, for testing & benchmarking without the server
+# Replies OK to everything, & records the frames it gets
+class ChannelServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    # address: (host, port) to listen on. Port 0 picks a free port
+    # handler: Function called as handler(type, message) for each frame, returning the reply. Replies OK if not given
+    def __init__(self, address=("127.0.0.1", 0), handler=None):
+        super().__init__(address, ChannelHandler)
+        self.handler = handler
+        self.frames = [] # (type, message) of each frame, in the order they came in
+        self.connections = []
+        self.lock = threading.Lock()
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="2Keys-channel-server", daemon=True).start()
+        return self
+
+    # Drop every connection, as if the server had restarted
+    def drop_connections(self):
+        with self.lock:
+            for connection in self.connections:
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            self.connections = []
+
+    def stop(self):
+        self.shutdown()
+        self.drop_connections()
+        self.server_close()
+
+class ChannelHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        with self.server.lock:
+            self.server.connections.append(self.request)
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        reader = FrameReader()
+        while True:
+            try:
+                data = self.request.recv(65536)
+            except OSError:
+                return
+            if not data:
+                return
+            acks = []
+            for id, type, body in reader.feed(data):
+                message = json.loads(body)
+                with self.server.lock:
+                    self.server.frames.append((type, message))
+                reply = self.server.handler(type, message) if self.server.handler is not None else { "status": 200, "text": "OK" }
+                acks.append(make_frame(id, FRAME_ACK, json.dumps(reply).encode("utf-8")))
+            try:
+                self.request.sendall(b"".join(acks))
+            except OSError:
+                return
@@ -0,0 +1,116 @@
+"""
+Copyright 2018 Kishan Sambhi
+
+This file is part of 2Keys.
+
+2Keys is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+2Keys is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with 2Keys.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# Compiled config
+# Everything a keyboard needs to match hotkeys (standardised hotkeys, key map with custom mappings applied
+# & the hotkey index) is compiled from the config once, by sync & init, and saved next to the config
+# as a snapshot (a pickle). The watcher loads the snapshot instead of parsing & compiling the config,
+# as long as the snapshot was made from the config as it is now (same SHA-256), by the same version of 2Keys.
+import hashlib
+import os
+import pickle
+from ..util.constants import CONFIG_FILE, SNAPSHOT_FILE, SNAPSHOT_VERSION, VERSION
+from ..util.config import load_config, copy_config, freeze
+from ..util.keyboard_map import keys as KEY_MAP
+from ..util.logger import Logger
+from .hotkeys import standardise_hotkeys, HotkeyIndex
+from .key_map import KeyMap
+
+logger = Logger("config")
+
+# Hotkeys, key map & hotkey index for one keyboard
+class CompiledKeyboard:
+    def __init__(self, hotkeys, key_map, index):
+        self.hotkeys = hotkeys
+        self.map = key_map
+        self.index = index
+
+    # The default key map isn't pickled, so keyboards loaded from a snapshot still share it
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        if state["map"] is KEY_MAP:
+            state["map"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.map is None:
+            self.map = KEY_MAP
+
+# Custom mapping
+# Takes in key/value of key: code and adds to map array
+def apply_mappings(key_map, maps):
+    for key, code in maps.items():
+        logger.debug("Mapped " + key + " as (" + key + ") to code " + str(code))
+        key_map[code] = "(" + key + ")"
+
+# Compile a keyboard from the config
+# keyboard: Keyboard config
+def compile_keyboard(keyboard):
+    # Custom mappings go in an overlay, so other keyboards in the same process aren't affected
+    key_map = KeyMap() if "map" in keyboard else KEY_MAP
+    if "map" in keyboard:
+        apply_mappings(key_map, keyboard["map"])
+    hotkeys = standardise_hotkeys(keyboard["hotkeys"])
+    return CompiledKeyboard(hotkeys, key_map, HotkeyIndex(hotkeys, key_map))
+
+# Snapshot file for a config file
+def snapshot_path(config_path=CONFIG_FILE):
+    return os.path.join(os.path.dirname(config_path), SNAPSHOT_FILE)
+
+def hash_file(path):
+    with open(path, "rb") as config_file:
+        return hashlib.sha256(config_file.read()).hexdigest()
+
+# Compile the config & save it as a snapshot next to it
+def write_snapshot(config_path=CONFIG_FILE):
+    logger.debug("Compiling config...")
+    config_hash = hash_file(config_path)
+    config = copy_config(load_config(config_path)) # Plain dicts & lists, which can be pickled
+    snapshot = {
+        "version": (SNAPSHOT_VERSION, VERSION),
+        "hash": config_hash,
+        "config": config,
+        "keyboards": { name: compile_keyboard(keyboard) for name, keyboard in config["keyboards"].items() },
+    }
+    # Written to a temporary file first, so a watcher never reads half a snapshot
+    path = snapshot_path(config_path)
+    with open(path + ".tmp", "wb") as snapshot_file:
+        pickle.dump(snapshot, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + ".tmp", path)
+    logger.debug("Compiled config saved to " + path)
+
+# Load the snapshot for the config
+# Returns (config, dict of keyboard name -> CompiledKeyboard), or None if there is no
+# snapshot that matches the config, in which case the config should be loaded & compiled as normal
+def load_snapshot(config_path=CONFIG_FILE):
+    try:
+        with open(snapshot_path(config_path), "rb") as snapshot_file:
+            snapshot = pickle.load(snapshot_file)
+        if snapshot["version"] != (SNAPSHOT_VERSION, VERSION):
+            logger.debug("Compiled config is from a different version of 2Keys, so not using it")
+            return None
+        if snapshot["hash"] != hash_file(config_path):
+            logger.debug("Config has changed since it was compiled, so not using compiled config")
+            return None
+    except FileNotFoundError:
+        return None
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError, KeyError, TypeError) as err:
+        logger.warn("Couldn't load compiled config (" + str(err) + "). Run 2Keys sync to recompile it.")
+        return None
+    return freeze(snapshot["config"]), snapshot["keyboards"]
@@ -0,0 +1,187 @@
+"""
+Copyright 2018 Kishan Sambhi
+
+This file is part of 2Keys.
+
+2Keys is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+2Keys is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with 2Keys.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# Trigger dispatcher
+# Sends hotkey triggers to the server from a background thread, so reading from the keyboard
+# never has to wait on the network.
+# Triggers are queued in a bounded queue and sent one at a time, in the order they were triggered.
+# A batch of triggers (see dispatch_batch()) is queued & sent as one
+import queue
+import threading
+import time
+from ..util.constants import DEFAULT_DISPATCH_QUEUE_SIZE, POLICY_BLOCK, POLICY_DROP_NEWEST, POLICY_DROP_OLDEST, POLICIES
+from ..util.logger import Logger
+
+logger = Logger("dispatch")
+
+# Put on the queue to stop the worker
+_STOP = object()
+# First item of a batch of triggers on the queue
+_BATCH = object()
+
+class TriggerDispatcher:
+    # send: Function that sends a trigger, called as send(hotkey, value) on the worker thread.
+    #   Returns False (or raises) if it couldn't be sent, so it's counted as failed
+    # send_batch: Function that sends a batch of triggers, called as send_batch(triggers) on the worker thread. Returns False or raises as for send
+    # name: Name of keyboard, used for the worker thread name
+    # max_queue: Max number of triggers that can be waiting to be sent
+    # policy: What to do when the queue is full (see POLICIES)
+    # block_timeout: Seconds to wait for space when policy is block. None waits forever
+    def __init__(self, send, name, max_queue=DEFAULT_DISPATCH_QUEUE_SIZE, policy=POLICY_DROP_OLDEST, block_timeout=None, send_batch=None):
+        if policy not in POLICIES:
+            raise ValueError("Invalid dispatch policy " + str(policy) + ". Valid policies are: " + ", ".join(POLICIES))
+        self.send = send
+        self.send_batch = send_batch
+        self.name = name
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.queue = queue.Queue(maxsize=max_queue)
+        # Stats
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.worker = None
+
+    # Number of triggers waiting to be sent
+    @property
+    def depth(self):
+        return self.queue.qsize()
+
+    def stats(self):
+        return {
+            "depth": self.depth,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+    def start(self):
+        if self.worker is None:
+            self.worker = threading.Thread(target=self.run, name="2Keys-dispatch-" + self.name, daemon=True)
+            self.worker.start()
+        return self
+
+    # Queue a trigger to be sent
+    # timing: TriggerTiming to record when the trigger was queued & sent, passed to send() if given
+    # held: Seconds the hotkey was held down for, passed to send() after timing if given
+    # ts: Time of the key event, passed to send() after held if given
+    # Returns True if it was queued, False if it was dropped
+    def dispatch(self, hotkey, value, timing=None, held=None, ts=None):
+        if timing is None and held is None and ts is None:
+            trigger = (hotkey, value)
+        else:
+            if timing is not None:
+                timing.queued = time.time()
+            if ts is not None:
+                trigger = (hotkey, value, timing, held, ts)
+            elif held is not None:
+                trigger = (hotkey, value, timing, held)
+            else:
+                trigger = (hotkey, value, timing)
+        return self.put(trigger)
+
+    # Queue a batch of triggers to be sent together, in order, with send_batch()
+    # triggers: List of (hotkey, value, ts, timing, held) tuples, where timing is a TriggerTiming or None
+    # Returns True if it was queued, False if it was dropped
+    def dispatch_batch(self, triggers):
+        queued = time.time()
+        for trigger in triggers:
+            if trigger[3] is not None:
+                trigger[3].queued = queued
+        return self.put((_BATCH, triggers))
+
+    # Put a trigger (or batch) on the queue, applying the policy if it's full
+    def put(self, trigger):
+        if self.policy == POLICY_BLOCK:
+            try:
+                self.queue.put(trigger, timeout=self.block_timeout)
+                return True
+            except queue.Full:
+                return self.drop(trigger)
+        try:
+            self.queue.put_nowait(trigger)
+            return True
+        except queue.Full:
+            if self.policy == POLICY_DROP_NEWEST:
+                return self.drop(trigger)
+        # Drop oldest, making space for this one
+        try:
+            oldest = self.queue.get_nowait()
+            self.queue.task_done()
+            self.drop(oldest)
+        except queue.Empty:
+            pass # Worker got there first
+        self.queue.put_nowait(trigger) # Only the keyboard thread adds, so there's now space
+        return True
+
+    def drop(self, trigger):
+        if trigger[0] is _BATCH:
+            self.dropped += len(trigger[1])
+            hotkeys = ", ".join(batched[0] for batched in trigger[1])
+        else:
+            self.dropped += 1
+            hotkeys = trigger[0]
+        logger.warn("Trigger queue full (" + str(self.queue.maxsize) + " waiting), dropped hotkey " + hotkeys)
+        return False
+
+    # Worker thread
+    def run(self):
+        while True:
+            trigger = self.queue.get()
+            try:
+                if trigger is _STOP:
+                    return
+                if trigger[0] is _BATCH:
+                    self.run_batch(trigger[1])
+                    continue
+                if len(trigger) > 2 and trigger[2] is not None:
+                    trigger[2].sending = time.time()
+                try:
+                    if self.send(*trigger) is False:
+                        self.failed += 1
+                    else:
+                        self.sent += 1
+                except Exception as err:
+                    # Don't let one bad trigger stop the worker
+                    self.failed += 1
+                    logger.err("Error sending hotkey " + trigger[0] + ": " + str(err))
+            finally:
+                self.queue.task_done()
+
+    def run_batch(self, triggers):
+        sending = time.time()
+        for trigger in triggers:
+            if trigger[3] is not None:
+                trigger[3].sending = sending
+        try:
+            if self.send_batch(triggers) is False:
+                self.failed += len(triggers)
+            else:
+                self.sent += len(triggers)
+        except Exception as err:
+            self.failed += len(triggers)
+            logger.err("Error sending hotkeys " + ", ".join(trigger[0] for trigger in triggers) + ": " + str(err))
+
+    # Stop the worker, sending anything left in the queue first
+    # timeout: Seconds to wait for the queue to be sent
+    def stop(self, timeout=None):
+        if self.worker is None:
+            return
+        self.queue.put(_STOP)
+        self.worker.join(timeout)
+        self.worker = None
@@ -0,0 +1,120 @@
+"""
+Copyright 2018 Kishan Sambhi
+
+This file is part of 2Keys.
+
+2Keys is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+2Keys is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with 2Keys.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# Hotkey config handling & the precompiled hotkey index used by the watcher
+from ..util.logger import Logger
+from ..util.keyboard_map import keys as KEY_MAP, key_codes as KEY_CODES, build_key_codes
+from .key_map import KeyMap
+
+logger = Logger("detect")
+
+# Standardise hotkey config
+# hotkey = hotkeys mappings
+# Standard config:
+#   type: down
+#   func: Function
+# Returns new hotkeys, as the config is read-only (see util.config.load_config())
+def standardise_hotkeys(hotkeys):
+    new_hotkeys = {}
+    for key, value in hotkeys.items():
+        if isinstance(value, str):
+            # Only has function
+            new_hotkeys[key] = {
+                "type": "down",
+                "func": value
+            }
+        # Else it has to be a regular one OR a muti one as ups require type: up, muties just need an object
+        # The below fixes #13. where if no type was specified but a func: was the program crashes
+        elif "type" not in value:
+            # Function is present, but no type
+            new_hotkeys[key] = dict(value, type=("down" if isinstance(value["func"], str) else "multi")) # If func is str, use down, if not, use "multi"
+        else:
+            new_hotkeys[key] = value
+    return new_hotkeys
+
+# Reverse lookup of key names -> codes
+# key_map: list of key mappings, with the index = key code (see util/keyboard_map.py)
+# Keys with an array of mappings appear under each of their names
+# The lookup for the default key map is only built once, in util/keyboard_map.py, & KeyMaps build their own
+def names_to_codes(key_map):
+    if key_map is KEY_MAP:
+        return KEY_CODES
+    if isinstance(key_map, KeyMap):
+        return key_map.codes()
+    return build_key_codes(key_map)
+
+# Split a hotkey string into the key names it is made of
+# Returns every way the string can be split, as i.e. "F12" could mean F12, or F1 & 2
+# hotkey: Hotkey string from the config
+# names: Dict of key names (see names_to_codes())
+def split_hotkey(hotkey, names):
+    longest = max(len(name) for name in names) if names else 0
+    splits = []
+    def split_from(index, current):
+        if index == len(hotkey):
+            splits.append(list(current))
+            return
+        for length in range(min(longest, len(hotkey) - index), 0, -1):
+            name = hotkey[index:index + length]
+            if name in names:
+                current.append(name)
+                split_from(index + length, current)
+                current.pop()
+    split_from(0, [])
+    return splits
+
+# Bitmasks of every set of key codes that can be pressed to produce the given key names
+# Each name must be a different key, so i.e. "^^" needs both ctrl keys
+def names_to_masks(key_names, names):
+    masks = [0]
+    for name in key_names:
+        masks = [mask | (1 << code) for mask in masks for code in names[name] if not mask & (1 << code)]
+    return masks
+
+# Hotkey index
+# Compiles the hotkeys once into a dict of bitmask of key codes -> hotkey, so that checking
+# the pressed keys is a single lookup no matter how many hotkeys there are.
+# Keys with several names (i.e. left shift is both "<+" and "+") are resolved here,
+# so the pressed keys only ever need to be stored as a single bitmask (see key_state.KeyState)
+# hotkeys: standardised hotkeys (see standardise_hotkeys())
+# key_map: list of key mappings, with the index = key code
+class HotkeyIndex:
+    def __init__(self, hotkeys, key_map):
+        self.index = {}
+        names = names_to_codes(key_map)
+        for key in hotkeys:
+            splits = split_hotkey(key, names)
+            if len(splits) == 0:
+                logger.warn("Hotkey " + key + " isn't made of known keys, so will never be triggered")
+                continue
+            for key_names in splits:
+                for mask in names_to_masks(key_names, names):
+                    if mask in self.index:
+                        # First one in the config wins, as it would have done when scanning the hotkeys in order
+                        if self.index[mask] != key:
+                            logger.warn("Hotkey " + key + " can be the same keys as " + self.index[mask] + ", which will be used instead")
+                        continue
+                    self.index[mask] = key
+
+    def __len__(self):
+        return len(self.index)
+
+    # Return the key of the hotkey matched, or False if none
+    # pressed = bitmask of key codes pressed
+    def match(self, pressed):
+        return self.index.get(pressed, False)
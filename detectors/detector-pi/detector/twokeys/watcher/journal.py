@@ -0,0 +1,297 @@
+"""
+Copyright 2018 Kishan Sambhi
+
+This file is part of 2Keys.
+
+2Keys is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+2Keys is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with 2Keys.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# Journal of triggers that couldn't be sent to the server (i.e. while it reboots), & a replayer that sends them when it's back
+# The journal is a file mapped into memory (mmap), so saving a trigger is a copy into memory rather than a write() call,
+# & is kept on disk so triggers aren't lost if the watcher stops too.
+# Saved triggers are in the page cache straight away, so are kept if the watcher crashes. They're synced to disk (msync)
+# by the replayer's thread rather than on each save, so saving doesn't wait on the disk (see sync())
+# Triggers are appended at the tail & removed from the head once sent. When there's no space at the end,
+# the triggers waiting are moved back to the start, & if there's still no space, the oldest are dropped.
+# Each trigger has a sequence number, unique to the keyboard with the id of the run of the watcher that made it,
+# so the server can drop triggers it's already run (i.e. if it ran one but timed out replying)
+import mmap
+import os
+import struct
+import threading
+import time
+from ..util.constants import JOURNAL_ROOT, JOURNAL_SIZE, JOURNAL_TTL, JOURNAL_BATCH_SIZE, JOURNAL_BACKOFF_MIN, JOURNAL_BACKOFF_MAX
+from ..util.logger import Logger
+
+logger = Logger("journal")
+
+JOURNAL_MAGIC = b"2KJ1"
+# Magic, offset of the oldest trigger (head), offset to write the next trigger at (tail)
+HEADER_FORMAT = "<4sII"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+# Length of the record, id of the run, sequence number, time triggered, value, then the hotkey (UTF-8)
+RECORD_FORMAT = "<I8sQdb"
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+
+# Default journal file for a keyboard
+def journal_path(name):
+    return os.path.join(JOURNAL_ROOT, name + ".journal")
+
+# A trigger read from the journal
+class JournalEntry:
+    __slots__ = ("run", "seq", "time", "hotkey", "value")
+
+    def __init__(self, run, seq, time, hotkey, value):
+        self.run = run # Id of the run of the watcher, as hex
+        self.seq = seq
+        self.time = time
+        self.hotkey = hotkey
+        self.value = value
+
+class TriggerJournal:
+    # path: File to keep the journal in. Triggers left in it from before are kept, to be sent
+    # size: Bytes in the journal, if it's being created
+    def __init__(self, path, size=JOURNAL_SIZE):
+        self.path = path
+        # Id of this run, so sequence numbers can start from 1 each run without being mistaken for the last run's
+        self.run = os.urandom(8)
+        self.run_id = self.run.hex()
+        self.seq = 0
+        # Number of triggers removed from the head ever, so a batch being sent can be found after the journal has been compacted
+        self.removed = 0
+        self.dropped = 0
+        # If triggers have been saved since the last sync()
+        self.dirty = False
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < HEADER_SIZE + RECORD_SIZE:
+                os.ftruncate(fd, size)
+            self.mmap = mmap.mmap(fd, 0)
+        finally:
+            os.close(fd)
+        self.size = len(self.mmap)
+        magic, self.head, self.tail = struct.unpack_from(HEADER_FORMAT, self.mmap)
+        if magic != JOURNAL_MAGIC or not HEADER_SIZE <= self.head <= self.tail <= self.size:
+            if magic != b"\0" * len(JOURNAL_MAGIC):
+                logger.warn("Journal " + path + " isn't valid, so starting it again")
+            self.head = self.tail = HEADER_SIZE
+            self.write_header()
+        else:
+            self.check()
+
+    # Cut off records that are cut short (i.e. the watcher stopped while moving them), from the first bad one on
+    def check(self):
+        offset = self.head
+        while offset < self.tail:
+            length = struct.unpack_from("<I", self.mmap, offset)[0]
+            if length < RECORD_SIZE or offset + length > self.tail:
+                logger.warn("Journal " + self.path + " has a bad trigger, so dropping it & the triggers after it")
+                self.tail = offset
+                self.write_header()
+                break
+            offset += length
+
+    def write_header(self):
+        struct.pack_into(HEADER_FORMAT, self.mmap, 0, JOURNAL_MAGIC, self.head, self.tail)
+
+    # Sequence number for the next trigger
+    def next_seq(self):
+        with self.lock:
+            self.seq += 1
+            return self.seq
+
+    # True if there are triggers waiting to be sent
+    def pending(self):
+        return self.head != self.tail
+
+    def __len__(self):
+        with self.lock:
+            count = 0
+            offset = self.head
+            while offset < self.tail:
+                offset += struct.unpack_from("<I", self.mmap, offset)[0]
+                count += 1
+            return count
+
+    # Save a trigger to be sent later
+    # at: Time it was triggered (time.time()), now if not given
+    def append(self, seq, hotkey, value, at=None):
+        encoded = hotkey.encode("utf-8")
+        length = RECORD_SIZE + len(encoded)
+        if length > self.size - HEADER_SIZE:
+            raise ValueError("Hotkey " + hotkey + " is too long for the journal")
+        with self.lock:
+            if self.tail + length > self.size:
+                self.compact()
+                while self.tail + length > self.size:
+                    self.drop_oldest()
+                    self.compact()
+            struct.pack_into(RECORD_FORMAT, self.mmap, self.tail, length, self.run, seq, time.time() if at is None else at, value)
+            self.mmap[self.tail + RECORD_SIZE:self.tail + length] = encoded
+            # The header is only updated once the record is written, so a half written record is never read
+            self.tail += length
+            self.write_header()
+            self.dirty = True
+
+    # Sync triggers saved since the last sync to disk, so they're kept if the system loses power too
+    def sync(self):
+        with self.lock:
+            if self.dirty:
+                self.mmap.flush()
+                self.dirty = False
+
+    # Move the triggers waiting back to the start of the journal
+    def compact(self):
+        if self.head == HEADER_SIZE:
+            return
+        self.mmap.move(HEADER_SIZE, self.head, self.tail - self.head)
+        self.tail -= self.head - HEADER_SIZE
+        self.head = HEADER_SIZE
+        self.write_header()
+
+    def drop_oldest(self):
+        self.head += struct.unpack_from("<I", self.mmap, self.head)[0]
+        self.removed += 1
+        self.dropped += 1
+        logger.warn("Journal full, so dropped the oldest hotkey waiting to be sent")
+        if self.head == self.tail:
+            self.head = self.tail = HEADER_SIZE
+        self.write_header()
+
+    # Read the oldest triggers, without removing them
+    # Returns (position of the first, list of JournalEntry). Give the position to ack() once they're sent
+    def entries(self, limit=JOURNAL_BATCH_SIZE):
+        entries = []
+        with self.lock:
+            offset = self.head
+            while offset < self.tail and len(entries) < limit:
+                length, run, seq, at, value = struct.unpack_from(RECORD_FORMAT, self.mmap, offset)
+                hotkey = bytes(self.mmap[offset + RECORD_SIZE:offset + length]).decode("utf-8", "replace")
+                entries.append(JournalEntry(run.hex(), seq, at, hotkey, value))
+                offset += length
+            return self.removed, entries
+
+    # Remove sent triggers
+    # position: Position of the first trigger after those sent, i.e. first + the number sent, for first from entries()
+    # Triggers already dropped to make space aren't removed again
+    def ack(self, position):
+        with self.lock:
+            while self.removed < position and self.head < self.tail:
+                self.head += struct.unpack_from("<I", self.mmap, self.head)[0]
+                self.removed += 1
+            if self.head == self.tail:
+                self.head = self.tail = HEADER_SIZE
+            self.write_header()
+
+    def close(self):
+        with self.lock:
+            self.mmap.flush()
+            self.mmap.close()
+            self.dirty = False
+
+# Sends triggers from a journal, in batches, from a background thread
+# Waits between tries with a backoff while the server is down, so a down server isn't tried on every key press
+class JournalReplayer:
+    # journal: TriggerJournal
+    # send: Function that sends a batch of triggers, in order, called as send(entries) with a list of JournalEntry.
+    #   Should raise OSError (i.e. requests.exceptions.RequestException) if the server can't be reached
+    # name: Name of keyboard, used for the thread name
+    # ttl: Seconds after which a trigger is too old to send, & is dropped instead
+    # batch_size: Max triggers to read from the journal & send at once
+    # backoff_min, backoff_max: Seconds to wait before trying again when the server can't be reached, doubled each try
+    def __init__(self, journal, send, name, ttl=JOURNAL_TTL, batch_size=JOURNAL_BATCH_SIZE, backoff_min=JOURNAL_BACKOFF_MIN, backoff_max=JOURNAL_BACKOFF_MAX):
+        self.journal = journal
+        self.send = send
+        self.name = name
+        self.ttl = ttl
+        self.batch_size = batch_size
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.wakeup = threading.Event() # Set when a trigger is saved
+        self.stopping = threading.Event()
+        self.thread = None
+        # Stats
+        self.sent = 0
+        self.expired = 0
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="2Keys-journal-" + self.name, daemon=True)
+            self.thread.start()
+        return self
+
+    # Tell the replayer a trigger has been saved
+    def wake(self):
+        self.wakeup.set()
+
+    def run(self):
+        backoff = self.backoff_min
+        while not self.stopping.is_set():
+            self.wakeup.clear()
+            # Triggers saved since last time, synced together here rather than on each save
+            self.journal.sync()
+            if not self.journal.pending():
+                self.wakeup.wait()
+                continue
+            if self.drain():
+                backoff = self.backoff_min
+            else:
+                # Server still down
+                self.stopping.wait(backoff)
+                backoff = min(backoff * 2, self.backoff_max)
+
+    # Send everything in the journal
+    # Returns False if the server couldn't be reached
+    def drain(self):
+        sent = 0
+        expired = 0
+        try:
+            while not self.stopping.is_set():
+                first, entries = self.journal.entries(self.batch_size)
+                if len(entries) == 0:
+                    return True
+                # Triggers are saved in order, so those too old to send are the first ones
+                now = time.time()
+                done = 0
+                while done < len(entries) and now - entries[done].time > self.ttl:
+                    done += 1
+                expired += done
+                try:
+                    if done < len(entries):
+                        self.send(entries[done:])
+                        sent += len(entries) - done
+                        done = len(entries)
+                except OSError as err:
+                    logger.debug("Server still can't be reached: " + str(err))
+                    return False
+                finally:
+                    self.journal.ack(first + done)
+            return True
+        finally:
+            self.sent += sent
+            self.expired += expired
+            if sent > 0:
+                logger.info("Sent " + str(sent) + " hotkeys for " + self.name + " saved while the server couldn't be reached")
+            if expired > 0:
+                logger.warn("Dropped " + str(expired) + " hotkeys for " + self.name + " that were pressed more than " + str(self.ttl) + "s ago")
+
+    # Stop sending. Triggers not sent yet stay in the journal
+    def stop(self, timeout=None):
+        if self.thread is None:
+            return
+        self.stopping.set()
+        self.wakeup.set()
+        self.thread.join(timeout)
+        self.thread = None
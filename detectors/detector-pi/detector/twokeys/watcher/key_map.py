@@ -0,0 +1,76 @@
+"""
+Copyright 2018 Kishan Sambhi
+
+This file is part of 2Keys.
+
+2Keys is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+2Keys is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with 2Keys.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# Key maps for keyboards with custom mappings
+# A keyboard's custom mappings (map: in the config) are kept in a small dict on top of the default key map,
+# which is shared (& never changed) by every keyboard in the process, so keyboards can't change each other's maps
+from ..util.keyboard_map import keys as KEY_MAP, key_codes as KEY_CODES, build_key_codes
+
+class KeyMap:
+    # base: Key map the overlay is on top of, with the index = key code. Defaults to the default key map
+    # overlay: Dict of key code -> mapping, used instead of the mapping in base
+    def __init__(self, base=None, overlay=None):
+        self.base = KEY_MAP if base is None else base
+        self.overlay = {} if overlay is None else dict(overlay)
+        self.key_codes = None
+
+    def __getitem__(self, code):
+        mapping = self.overlay.get(code)
+        return mapping if mapping is not None else self.base[code]
+
+    # Changes only go in the overlay
+    def __setitem__(self, code, mapping):
+        if code < 0 or code >= len(self.base):
+            raise IndexError("Key code " + str(code) + " out of range")
+        self.overlay[code] = mapping
+        self.key_codes = None
+
+    def __len__(self):
+        return len(self.base)
+
+    def __iter__(self):
+        for code in range(len(self.base)):
+            yield self[code]
+
+    # Reverse lookup of key names -> codes (see util.keyboard_map.key_codes), with the overlay applied
+    def codes(self):
+        if self.key_codes is None:
+            base_codes = KEY_CODES if self.base is KEY_MAP else build_key_codes(self.base)
+            codes = { name: list(name_codes) for name, name_codes in base_codes.items() }
+            # Remove the names the overlay replaces...
+            for code in self.overlay:
+                for name in names_of(self.base[code]):
+                    codes[name].remove(code)
+                    if len(codes[name]) == 0:
+                        del codes[name]
+            # ...& add the overlay's
+            for code, mapping in self.overlay.items():
+                for name in names_of(mapping):
+                    codes.setdefault(name, []).append(code)
+            self.key_codes = { name: tuple(sorted(name_codes)) for name, name_codes in codes.items() }
+        return self.key_codes
+
+    # Only the overlay is pickled (i.e. in compiled configs), so the default map is still shared when loaded
+    def __reduce__(self):
+        return (KeyMap, (None if self.base is KEY_MAP else self.base, self.overlay))
+
+# Names a mapping has (see util/keyboard_map.py)
+def names_of(mapping):
+    if not mapping:
+        return [] # Reserved/unmapped key
+    return [mapping] if isinstance(mapping, str) else mapping
@@ -0,0 +1,59 @@
+"""
+Copyright 2018 Kishan Sambhi
+
+This file is part of 2Keys.
+
+2Keys is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+2Keys is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with 2Keys.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# State of which keys are pressed on a keyboard
+# Stored as a single int used as a bitmask, where bit n is set if key code n is down,
+# so each event is a constant time bit operation no matter how many keys are held
+class KeyState:
+    # key_map: list of key mappings, with the index = key code.
+    # Keys with no mapping are never recorded as pressed, so they don't stop hotkeys from matching
+    def __init__(self, key_map):
+        self.map = key_map
+        self.pressed = 0
+        # Bitmask of key codes with a mapping, so a press doesn't have to look in the map
+        self.mapped = 0
+        for code, mapping in enumerate(key_map):
+            if mapping:
+                self.mapped |= 1 << code
+
+    # Handle change of state (down/up) of key code
+    # Returns the new bitmask
+    def press(self, code):
+        if self.mapped >> code & 1:
+            self.pressed |= 1 << code
+        return self.pressed
+
+    def release(self, code):
+        self.pressed &= ~(1 << code)
+        return self.pressed
+
+    def is_pressed(self, code):
+        return bool(self.pressed >> code & 1)
+
+    # Key codes currently pressed, lowest first
+    def codes(self):
+        pressed = self.pressed
+        code = 0
+        while pressed:
+            if pressed & 1:
+                yield code
+            pressed >>= 1
+            code += 1
+
+    def clear(self):
+        self.pressed = 0
@@ -0,0 +1,184 @@
+"""
+Copyright 2018 Kishan Sambhi
+
+This file is part of 2Keys.
+
+2Keys is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+2Keys is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with 2Keys.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# Latency metrics for triggers, exposed in the Prometheus text format
+# See https://prometheus.io/docs/instrumenting/exposition_formats/
+#
+# Each trigger records when its key event happened (the kernel's timestamp), when it was matched to a hotkey,
+# when it was queued, when it started being sent & when the server responded.
+# These are put in histograms of the time each stage took, per keyboard:
+# - match: Key event -> matched to a hotkey
+# - queue: Queued -> started sending
+# - send: Started sending -> server responded
+# - total: Key event -> server responded
+import os
+import socketserver
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from ..util.constants import LATENCY_BUCKETS
+from ..util.logger import Logger
+
+logger = Logger("metrics")
+
+STAGES = ["match", "queue", "send", "total"]
+
+# Times for a trigger, from time.time()
+# Kernel timestamps for key events are from the same (realtime) clock
+class TriggerTiming:
+    __slots__ = ("event", "matched", "queued", "sending", "done")
+
+    # sec, usec: Timestamp of the key event
+    def __init__(self, sec, usec, matched):
+        self.event = sec + usec / 1e6
+        self.matched = matched
+        self.queued = None
+        self.sending = None
+        self.done = None
+
+# Histogram with fixed buckets
+class LatencyHistogram:
+    # buckets: Upper bounds of each bucket, in seconds, lowest first. A +Inf bucket is added
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1) # Last is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    # Cumulative counts, as Prometheus wants, for each bucket & +Inf
+    def cumulative(self):
+        total = 0
+        counts = []
+        for count in self.counts:
+            total += count
+            counts.append(total)
+        return counts
+
+# Escape a label value
+def label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace("\"", "\\\"")
+
+# Metrics for all the keyboards in a process
+class MetricsRegistry:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        # (keyboard, stage) -> LatencyHistogram
+        # Added to & observed by dispatcher threads while render() may be running, so only changed & read with lock held
+        self.histograms = {}
+        self.lock = threading.Lock()
+        # keyboard -> TriggerDispatcher
+        self.dispatchers = {}
+
+    def histogram(self, keyboard, stage):
+        key = (keyboard, stage)
+        with self.lock:
+            return self.histogram_locked(key)
+
+    # Called with the lock held
+    def histogram_locked(self, key):
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = LatencyHistogram(self.buckets)
+        return histogram
+
+    # Record a trigger that has been sent
+    def observe_trigger(self, keyboard, timing):
+        with self.lock:
+            self.histogram_locked((keyboard, "match")).observe(timing.matched - timing.event)
+            self.histogram_locked((keyboard, "queue")).observe(timing.sending - timing.queued)
+            self.histogram_locked((keyboard, "send")).observe(timing.done - timing.sending)
+            self.histogram_locked((keyboard, "total")).observe(timing.done - timing.event)
+
+    # Include a keyboard's dispatcher stats (queue depth, sent, dropped, failed)
+    def add_dispatcher(self, keyboard, dispatcher):
+        with self.lock:
+            self.dispatchers[keyboard] = dispatcher
+
+    # Render in the Prometheus text format
+    def render(self):
+        lines = [
+            "# HELP twokeys_trigger_latency_seconds Time taken by each stage of sending a hotkey trigger",
+            "# TYPE twokeys_trigger_latency_seconds histogram",
+        ]
+        # Each histogram's counts, sum & count are copied together, so they agree with each other
+        with self.lock:
+            histograms = [(key, histogram.cumulative(), histogram.sum, histogram.count) for key, histogram in sorted(self.histograms.items())]
+        for (keyboard, stage), cumulative, seconds, count in histograms:
+            labels = 'keyboard="' + label(keyboard) + '",stage="' + stage + '"'
+            for bound, bucket_count in zip(self.buckets, cumulative):
+                lines.append("twokeys_trigger_latency_seconds_bucket{" + labels + ',le="' + repr(float(bound)) + '"} ' + str(bucket_count))
+            lines.append("twokeys_trigger_latency_seconds_bucket{" + labels + ',le="+Inf"} ' + str(cumulative[-1]))
+            lines.append("twokeys_trigger_latency_seconds_sum{" + labels + "} " + repr(seconds))
+            lines.append("twokeys_trigger_latency_seconds_count{" + labels + "} " + str(count))
+        with self.lock:
+            dispatchers = sorted(self.dispatchers.items())
+        stats = { keyboard: dispatcher.stats() for keyboard, dispatcher in dispatchers }
+        for stat, kind, help in [
+            ("depth", "gauge", "Triggers waiting to be sent"),
+            ("sent", "counter", "Triggers sent"),
+            ("dropped", "counter", "Triggers dropped as the queue was full"),
+            ("failed", "counter", "Triggers that failed to send"),
+        ]:
+            name = "twokeys_triggers_" + stat + ("_total" if kind == "counter" else "")
+            lines.append("# HELP " + name + " " + help)
+            lines.append("# TYPE " + name + " " + kind)
+            for keyboard, keyboard_stats in stats.items():
+                lines.append(name + '{keyboard="' + label(keyboard) + '"} ' + str(keyboard_stats[stat]))
+        return "\n".join(lines) + "\n"
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = self.server.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        return
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("unix", 0) # So the handler has a client address to use
+
+# Serve metrics over HTTP from a background thread
+# address: host:port (i.e. 127.0.0.1:9100), or unix:/path/to/socket
+# Returns the server, so it can be shutdown()
+def serve_metrics(registry, address):
+    if address.startswith("unix:"):
+        path = address[len("unix:"):]
+        if os.path.exists(path):
+            os.remove(path) # Left over from last run
+        server = UnixHTTPServer(path, MetricsHandler)
+    else:
+        host, _, port = address.rpartition(":")
+        server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), MetricsHandler)
+        server.daemon_threads = True
+    server.registry = registry
+    threading.Thread(target=server.serve_forever, name="2Keys-metrics", daemon=True).start()
+    logger.info("Serving metrics on " + address)
+    return server
@@ -0,0 +1,98 @@
+"""
+Copyright 2018 Kishan Sambhi
+
+This file is part of 2Keys.
+
+2Keys is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+2Keys is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with 2Keys.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# Readers of events from a keyboard
+# Both return events as tuples of (sec, usec, type, code, value), the layout of the kernel's input_event struct
+# See https://www.kernel.org/doc/Documentation/input/input.txt
+#
+# RawEventReader reads as many events as are waiting with one read into a buffer that is reused,
+# & decodes them all at once, without making an object for each event
+# EvdevEventReader uses evdev's InputDevice.read(), which makes an InputEvent for each event
+import select
+import struct
+from ..util.constants import KEYBOARD_EVENT_FORMAT, KEYBOARD_EVENT_SIZE, READ_BATCH_SIZE, BACKEND_RAW, BACKEND_EVDEV, BACKENDS
+
+class RawEventReader:
+    # fd: File descriptor of the keyboard's /dev/input file, opened non-blocking (as evdev's InputDevice does)
+    # batch: Max number of events to read at once
+    def __init__(self, fd, batch=READ_BATCH_SIZE):
+        self.fd = fd
+        self.buffer = bytearray(KEYBOARD_EVENT_SIZE * batch)
+        self.view = memoryview(self.buffer)
+        # Unbuffered, so reads go straight into self.buffer
+        self.file = open(fd, "rb", buffering=0, closefd=False)
+
+    # Read all events waiting (up to batch)
+    # Returns an iterator of event tuples, which must be used before the next read
+    # Raises BlockingIOError if there are no events waiting, or OSError if the keyboard has gone
+    def read(self):
+        size = self.file.readinto(self.buffer)
+        if size is None:
+            raise BlockingIOError("No events waiting")
+        if size == 0:
+            raise OSError("Keyboard closed")
+        # The kernel only ever gives whole events
+        return struct.iter_unpack(KEYBOARD_EVENT_FORMAT, self.view[:size - size % KEYBOARD_EVENT_SIZE])
+
+    # Wait for & read events forever
+    # Yields batches of events (see read())
+    # timeout: Function returning the seconds to wait for events before yielding no events, or None to wait until there are some.
+    #   Called before each wait
+    def read_loop(self, timeout=None):
+        while True:
+            if not select.select([self.fd], [], [], timeout() if timeout is not None else None)[0]:
+                yield ()
+                continue
+            try:
+                yield self.read()
+            except BlockingIOError:
+                continue
+
+class EvdevEventReader:
+    # device: evdev InputDevice
+    def __init__(self, device):
+        self.device = device
+        self.fd = device.fd
+
+    # Read all events waiting
+    # Raises BlockingIOError (when iterated) if there are no events waiting
+    def read(self):
+        return ((event.sec, event.usec, event.type, event.code, event.value) for event in self.device.read())
+
+    def read_loop(self, timeout=None):
+        while True:
+            if not select.select([self.fd], [], [], timeout() if timeout is not None else None)[0]:
+                yield []
+                continue
+            try:
+                # Read now, as the device may be read again before the batch is used
+                yield list(self.read())
+            except BlockingIOError:
+                continue
+
+# Make a reader for a keyboard
+# device: evdev InputDevice of the keyboard
+# backend: one of BACKENDS, or None for no reader (i.e. when replaying events)
+def make_reader(device, backend=BACKEND_RAW):
+    if backend is None:
+        return None
+    elif backend == BACKEND_RAW:
+        return RawEventReader(device.fd)
+    elif backend == BACKEND_EVDEV:
+        return EvdevEventReader(device)
+    raise ValueError("Invalid reader backend " + str(backend) + ". Valid backends are: " + ", ".join(BACKENDS))
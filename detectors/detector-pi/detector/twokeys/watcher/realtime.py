@@ -0,0 +1,110 @@
+"""
+Copyright 2018 Kishan Sambhi
+
+This file is part of 2Keys.
+
+2Keys is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+2Keys is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with 2Keys.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# Options to cut how much the watcher's latency jitters when the system is busy:
+# real time scheduling (or a nice value), pinning to CPUs, locking memory so it's never swapped out
+# or paged in on a key press, & touching everything handling a key press uses before the keyboard is grabbed.
+# Scheduling & CPUs are set for the calling thread, & inherited by threads it starts after (i.e. the dispatcher)
+import ctypes
+import ctypes.util
+import gc
+import os
+import threading
+from ..util.constants import REALTIME_PRIORITY, REALTIME_STACK_SIZE
+from ..util.logger import Logger
+
+logger = Logger("realtime")
+
+SCHED_POLICIES = {
+    "fifo": os.SCHED_FIFO,
+    "rr": os.SCHED_RR,
+}
+
+# From sys/mman.h
+MCL_CURRENT = 1
+MCL_FUTURE = 2
+
+# Parse a list of CPUs
+# cpus: None for no CPUs, "auto" for every CPU this process can run on, or a comma separated list i.e. "1,2,3"
+def parse_cpus(cpus):
+    if cpus is None:
+        return None
+    if cpus == "auto":
+        return sorted(os.sched_getaffinity(0))
+    return [int(cpu) for cpu in cpus.split(",")]
+
+# Use a real time scheduling policy, so the watcher runs as soon as a key is pressed instead of waiting its turn
+# policy: "fifo" or "rr" (see SCHED_POLICIES)
+# priority: 1 (lowest) to 99
+def set_scheduling(policy, priority=REALTIME_PRIORITY):
+    os.sched_setscheduler(0, SCHED_POLICIES[policy], os.sched_param(priority))
+
+# Nice value, from -20 (most favoured) to 19. For when real time scheduling is too much
+def set_nice(nice):
+    os.setpriority(os.PRIO_PROCESS, 0, nice)
+
+def set_affinity(cpus):
+    os.sched_setaffinity(0, cpus)
+
+# Lock all memory, now & allocated later, into RAM (mlockall)
+def lock_memory():
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    if libc.mlockall(MCL_CURRENT | MCL_FUTURE) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+# Start threads with smaller stacks, as locking memory locks all of each thread's stack (8 MB each by default)
+# Only applies to threads started after it's called, so call it before starting any if memory is going to be locked
+def set_stack_size(size=REALTIME_STACK_SIZE):
+    threading.stack_size(size)
+
+# Touch what handling a key press uses, so the first presses don't page fault (see Keyboard.prefault()),
+# then move everything there is now out of the garbage collector's way, so collections don't walk the config
+def prefault(keyboards):
+    for keyboard in keyboards:
+        keyboard.prefault()
+    gc.collect()
+    gc.freeze()
+
+# Apply the real time options. Call before grabbing the keyboards
+# Options that can't be applied (i.e. not running as root) are logged & skipped, as the watcher still works without them
+# keyboards: Keyboards to prefault
+# sched: Scheduling policy (see set_scheduling()), or None to leave it
+# priority: Real time priority, for sched
+# nice: Nice value, or None to leave it
+# cpus: List of CPUs to run on, or None for any
+# mlock: Lock memory (see lock_memory())
+def apply_realtime(keyboards=(), sched=None, priority=REALTIME_PRIORITY, nice=None, cpus=None, mlock=False):
+    options = [
+        (cpus is not None, "run on CPUs " + str(cpus), lambda: set_affinity(cpus)),
+        (sched is not None, "use " + str(sched) + " scheduling at priority " + str(priority), lambda: set_scheduling(sched, priority)),
+        (nice is not None, "set nice to " + str(nice), lambda: set_nice(nice)),
+        (True, "prefault", lambda: prefault(keyboards)),
+        (mlock, "lock memory", lock_memory),
+    ]
+    applied = True
+    for wanted, description, apply in options:
+        if not wanted:
+            continue
+        try:
+            apply()
+            logger.debug("Applied: " + description)
+        except (OSError, ValueError) as err:
+            logger.warn("Couldn't " + description + ": " + str(err))
+            applied = False
+    return applied
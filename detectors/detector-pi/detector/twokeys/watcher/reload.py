@@ -0,0 +1,155 @@
+"""
+Copyright 2018 Kishan Sambhi
+
+This file is part of 2Keys.
+
+2Keys is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+2Keys is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with 2Keys.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# Live reloading of the config
+# When config.yml changes (seen with inotify), or on SIGHUP (i.e. systemctl reload), the hotkeys & key maps
+# are recompiled in the background & given to each keyboard, which swaps them in between batches of events.
+# The keyboards stay open & locked, so no key presses are lost.
+import ctypes
+import ctypes.util
+import os
+import select
+import signal
+import struct
+import threading
+from ..util.constants import CONFIG_FILE
+from ..util.config import load_config
+from ..util.logger import Logger
+from .compiled import compile_keyboard
+
+logger = Logger("reload")
+
+# From linux/inotify.h
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+# wd, mask, cookie, len, then len bytes of name
+INOTIFY_EVENT_FORMAT = "iIII"
+INOTIFY_EVENT_SIZE = struct.calcsize(INOTIFY_EVENT_FORMAT)
+
+# Watches a file for changes with inotify, calling callback() from a background thread when it changes
+# The directory is watched, not the file, so that files replaced by renaming (atomic writes) are still seen
+class FileWatcher:
+    # path: File to watch
+    # callback: Called with no arguments when the file has been written to or replaced
+    def __init__(self, path, callback):
+        self.directory = os.path.dirname(os.path.abspath(path))
+        self.name = os.path.basename(path).encode()
+        self.callback = callback
+        self.fd = None
+        self.thread = None
+        self.stop_read, self.stop_write = None, None
+
+    # Start watching
+    # Returns False if inotify isn't available (so only SIGHUP can be used)
+    def start(self):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(IN_CLOEXEC | IN_NONBLOCK)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+            if libc.inotify_add_watch(fd, self.directory.encode(), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+                errno = ctypes.get_errno()
+                os.close(fd)
+                raise OSError(errno, os.strerror(errno))
+        except (OSError, AttributeError) as err:
+            logger.warn("Can't watch " + self.directory + " for changes (" + str(err) + ")")
+            return False
+        self.fd = fd
+        self.stop_read, self.stop_write = os.pipe()
+        self.thread = threading.Thread(target=self.run, name="2Keys-reload", daemon=True)
+        self.thread.start()
+        return True
+
+    # Names of files in the directory that changed, from inotify events
+    def read_names(self):
+        try:
+            data = os.read(self.fd, 4096)
+        except BlockingIOError:
+            return []
+        names = []
+        offset = 0
+        while offset + INOTIFY_EVENT_SIZE <= len(data):
+            _, _, _, length = struct.unpack_from(INOTIFY_EVENT_FORMAT, data, offset)
+            offset += INOTIFY_EVENT_SIZE
+            names.append(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+        return names
+
+    def run(self):
+        while True:
+            readable, _, _ = select.select([self.fd, self.stop_read], [], [])
+            if self.stop_read in readable:
+                return
+            # Several events for the file (i.e. from an editor) are handled as one change
+            if self.name in self.read_names():
+                self.callback()
+
+    def stop(self):
+        if self.thread is None:
+            return
+        os.write(self.stop_write, b"\0")
+        self.thread.join()
+        self.thread = None
+        for fd in (self.fd, self.stop_read, self.stop_write):
+            os.close(fd)
+
+# Reloads the config for some keyboards
+class Reloader:
+    # keyboards: Keyboards to reload
+    # config_path: Config file to reload from
+    def __init__(self, keyboards, config_path=CONFIG_FILE):
+        self.keyboards = keyboards
+        self.config_path = config_path
+        self.watcher = FileWatcher(config_path, self.reload)
+        # So two reloads at once (i.e. SIGHUP & inotify) don't interleave
+        self.lock = threading.Lock()
+
+    # Recompile the config & give it to the keyboards
+    # If the config can't be loaded, the keyboards carry on with the config they have
+    def reload(self):
+        with self.lock:
+            logger.info("Reloading config...")
+            try:
+                config = load_config(self.config_path)
+                compiled = { keyboard.name: compile_keyboard(config["keyboards"][keyboard.name]) for keyboard in self.keyboards }
+            except Exception as err:
+                logger.err("Couldn't reload config, so keeping the current config: " + str(err))
+                return False
+            for keyboard in self.keyboards:
+                if config["keyboards"][keyboard.name].get("path", keyboard.keyboard_path) != keyboard.keyboard_path:
+                    logger.warn("Path of keyboard " + keyboard.name + " changed. Restart 2Keys to watch the new path.")
+                keyboard.reload(compiled[keyboard.name])
+            logger.info("Config reloaded.")
+            return True
+
+    # Reload from a new thread, so whatever asked for the reload (i.e. a signal handler) doesn't wait on it
+    def reload_in_background(self):
+        threading.Thread(target=self.reload, name="2Keys-reload-config", daemon=True).start()
+
+    # Start reloading when the config changes
+    # sighup: Also reload on SIGHUP. Only works from the main thread; use reload_in_background() as the handler otherwise
+    def start(self, sighup=True):
+        self.watcher.start()
+        if sighup:
+            signal.signal(signal.SIGHUP, lambda signum, frame: self.reload_in_background())
+        return self
+
+    def stop(self):
+        self.watcher.stop()
@@ -0,0 +1,203 @@
+"""
+Copyright 2018 Kishan Sambhi
+
+This file is part of 2Keys.
+
+2Keys is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+2Keys is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with 2Keys.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# Recording & replaying of keyboard events
+# So the watcher can be tested & benchmarked without a keyboard or server
+#
+# Captures are a header followed by events in a fixed layout (little endian, 64 bit times),
+# so they can be replayed on a different machine to the one they were recorded on
+import struct
+import time
+import tracemalloc
+from evdev import InputDevice
+from ..util.constants import CAPTURE_HEADER, CAPTURE_EVENT_FORMAT
+from ..util.logger import Logger
+from .watch_keyboard import Keyboard
+from .raw_reader import make_reader, BACKEND_RAW
+
+logger = Logger("replay")
+
+CAPTURE_EVENT_SIZE = struct.calcsize(CAPTURE_EVENT_FORMAT)
+
+# Write events to a capture file
+# events: Iterable of (sec, usec, type, code, value) tuples
+# Returns number of events written
+def write_capture(path, events):
+    count = 0
+    with open(path, "wb") as capture:
+        capture.write(CAPTURE_HEADER)
+        for event in events:
+            capture.write(struct.pack(CAPTURE_EVENT_FORMAT, *event))
+            count += 1
+    return count
+
+# Read all events from a capture file
+def read_capture(path):
+    with open(path, "rb") as capture:
+        data = capture.read()
+    if not data.startswith(CAPTURE_HEADER):
+        raise ValueError(path + " is not a 2Keys capture")
+    data = memoryview(data)[len(CAPTURE_HEADER):]
+    return list(struct.iter_unpack(CAPTURE_EVENT_FORMAT, data[:len(data) - len(data) % CAPTURE_EVENT_SIZE]))
+
+# Record events from a keyboard's reader to a capture file, until count events have been recorded or Ctrl+C
+# reader: Event reader (see raw_reader.make_reader())
+def record(reader, path, count=None):
+    recorded = 0
+    with open(path, "wb") as capture:
+        capture.write(CAPTURE_HEADER)
+        try:
+            for events in reader.read_loop():
+                for event in events:
+                    capture.write(struct.pack(CAPTURE_EVENT_FORMAT, *event))
+                    recorded += 1
+                    if count is not None and recorded >= count:
+                        return recorded
+        except KeyboardInterrupt:
+            pass
+    return recorded
+
+# Record events from a keyboard to a capture file
+# keyboard: Keyboard config
+# lock: Lock (grab) the keyboard while recording, so key presses don't go to the Pi
+def record_keyboard(keyboard, path, count=None, lock=False):
+    device = InputDevice(keyboard["path"])
+    if lock:
+        device.grab()
+    try:
+        return record(make_reader(device, BACKEND_RAW), path, count)
+    finally:
+        if lock:
+            device.ungrab()
+        device.close()
+
+# Synthetic capture of typing
+# Each key is a down, SYN, up, SYN, with a hotkey (left shift + A) every hotkey_every keys
+# keys: Number of keys to press
+def synthetic_events(keys, hotkey_every=10):
+    codes = [16, 17, 18, 19, 20, 21, 22, 23, 24, 25] # Q-P
+    events = []
+    usec = 0
+    for i in range(keys):
+        usec += 50000 # 20 keys/second
+        sec, at = divmod(usec, 1000000)
+        if hotkey_every and i % hotkey_every == hotkey_every - 1:
+            events += [(sec, at, 1, 42, 1), (sec, at, 0, 0, 0), (sec, at, 1, 30, 1), (sec, at, 0, 0, 0), (sec, at, 1, 30, 0), (sec, at, 0, 0, 0), (sec, at, 1, 42, 0), (sec, at, 0, 0, 0)]
+        else:
+            code = codes[i % len(codes)]
+            events += [(sec, at, 1, code, 1), (sec, at, 0, 0, 0), (sec, at, 1, code, 0), (sec, at, 0, 0, 0)]
+    return events
+
+# Stands in for the keyboard's InputDevice when replaying, as nothing is read from it
+class ReplayDevice:
+    fd = -1
+
+    def grab(self):
+        return
+
+    def ungrab(self):
+        return
+
+# Stands in for the TriggerClient, recording triggers instead of sending them
+class ReplayClient:
+    def __init__(self):
+        self.sent = []
+        self.batches = 0 # Number of batches sent
+
+    def prepare(self, keyboard, hotkeys):
+        return
+
+    def send(self, keyboard, hotkey, value, run=None, seq=None, held=None):
+        self.sent.append((keyboard, hotkey, value))
+
+    def send_batch(self, keyboard, triggers, run=None):
+        self.sent.extend((keyboard, hotkey, value) for hotkey, value, ts, seq, held in triggers)
+        self.batches += 1
+
+    def close(self):
+        return
+
+# Value at percentile (0-100) of sorted values
+def percentile(values, percent):
+    if len(values) == 0:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+# Replay events through a keyboard's matching & dispatch
+# keyboard: Keyboard, made with device=ReplayDevice() & backend=None. Its dispatcher should be started
+# events: List of (sec, usec, type, code, value) tuples
+# realtime: Wait between events as long as there was between them when recorded, instead of going as fast as possible
+# allocations: Measure memory allocated while replaying (with tracemalloc, which slows the replay down)
+# Returns dict of stats
+def replay(keyboard, events, realtime=False, allocations=False):
+    keyboard.key_state.clear()
+    if allocations:
+        tracemalloc.start()
+        allocated_before = tracemalloc.get_traced_memory()[0]
+
+    latencies = []
+    clock = time.perf_counter_ns
+    start = clock()
+    first = events[0][0] * 1000000 + events[0][1] if len(events) > 0 else 0
+    for event in events:
+        if realtime:
+            # Wait until the event's time, relative to the first event
+            wait = (event[0] * 1000000 + event[1] - first) * 1000 - (clock() - start)
+            if wait > 0:
+                time.sleep(wait / 1e9)
+        before = clock()
+        keyboard.handle_event(event[2], event[3], event[4], event[0], event[1])
+        latencies.append(clock() - before)
+    keyboard.flush_batch(force=True)
+    elapsed = (clock() - start) / 1e9
+
+    stats = {
+        "events": len(events),
+        "seconds": elapsed,
+        "events_per_second": len(events) / elapsed if elapsed > 0 else 0,
+    }
+    latencies.sort()
+    for percent in (50, 90, 99):
+        stats["p" + str(percent) + "_us"] = percentile(latencies, percent) / 1000
+    stats["max_us"] = latencies[-1] / 1000 if len(latencies) > 0 else 0
+    if allocations:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        stats["allocated_bytes"] = current - allocated_before
+        stats["peak_bytes"] = peak - allocated_before
+    return stats
+
+# Replay a capture file through a keyboard from the config
+# Triggers are recorded instead of sent to the server
+# config: 2Keys config
+# name: Name of keyboard
+# events: List of events, i.e. from read_capture()
+# options: Options for the Keyboard (see Keyboard)
+# Returns dict of stats (see replay()), with the number of triggers sent & of batches they were sent in
+def replay_keyboard(config, name, events, realtime=False, allocations=False, **options):
+    client = ReplayClient()
+    options.setdefault("queue_size", len(events) + 1) # So no triggers are dropped
+    keyboard = Keyboard(config["keyboards"][name], name, config=config, client=client, backend=None, device=ReplayDevice(), **options)
+    keyboard.dispatcher.start()
+    try:
+        stats = replay(keyboard, events, realtime=realtime, allocations=allocations)
+    finally:
+        keyboard.stop()
+    stats["triggers"] = len(client.sent)
+    stats["batches"] = client.batches
+    return stats
@@ -0,0 +1,383 @@
+"""
+Copyright 2018 Kishan Sambhi
+
+This file is part of 2Keys.
+
+2Keys is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+2Keys is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with 2Keys.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# Supervises a worker process for each keyboard (2Keys supervise)
+# The supervisor imports everything & compiles the config once, then forks a worker for each keyboard,
+# so starting (or restarting) a worker doesn't have to import or parse anything.
+# Each worker can be pinned to a CPU, is restarted with a backoff if it crashes,
+# and sends its stats to the supervisor as JSON lines down a pipe.
+# Workers reload the config themselves. The supervisor reloads it before restarting a worker if the file has changed
+# (& on SIGHUP), so a restarted worker starts with the same config the other workers have reloaded.
+import json
+import os
+import selectors
+import signal
+import threading
+import time
+import traceback
+from ..util.constants import CONFIG_FILE, SUPERVISOR_BACKOFF_MIN, SUPERVISOR_BACKOFF_MAX, SUPERVISOR_HEALTHY_AFTER, SUPERVISOR_STATS_INTERVAL, SUPERVISOR_STOP_TIMEOUT
+from ..util.config import load_config
+from ..util.logger import Logger
+from .watch_keyboard import Keyboard
+from .compiled import compile_keyboard, load_snapshot
+from .reload import Reloader
+from .realtime import parse_cpus, apply_realtime
+
+logger = Logger("supervise")
+
+# Exit code from a os.waitpid() status, or minus the signal that killed the process
+# As os.waitstatus_to_exitcode(), which is only in Python 3.9+
+def exit_code(status):
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    if os.WIFEXITED(status):
+        return os.WEXITSTATUS(status)
+    return status
+
+# A keyboard's worker process, as seen by the supervisor
+class Worker:
+    def __init__(self, name, cpu=None, backoff=SUPERVISOR_BACKOFF_MIN):
+        self.name = name
+        self.cpu = cpu # CPU to pin the worker to, or None to run on any
+        self.pid = None # None when not running
+        self.stats_fd = None # Read end of the pipe the worker sends stats down
+        self.buffer = b"" # Part of a line of stats not read yet
+        self.stats = {} # Last stats sent by the worker
+        self.started = 0
+        self.restarts = 0
+        self.backoff = backoff # Seconds to wait before the next restart
+        self.restart_at = None # When to restart the worker, if it's stopped
+
+class Supervisor:
+    # names: Names of the keyboards to start a worker for
+    # run_worker: Function called in each worker with (name, report), which watches the keyboard.
+    #   report(stats) sends a dict of stats to the supervisor
+    # cpus: List of CPUs to pin workers to, in turn, or None to not pin them (see realtime.parse_cpus())
+    # backoff_min, backoff_max: Seconds to wait before restarting a crashed worker, doubled each time it crashes again
+    # healthy_after: Seconds a worker has to run for before its backoff is reset
+    # reload: Function called before each worker is started, with force=True on SIGHUP, so workers start with the latest config
+    #   (see WorkerConfig.reload()). None if there's nothing to reload
+    def __init__(self, names, run_worker, cpus=None, backoff_min=SUPERVISOR_BACKOFF_MIN, backoff_max=SUPERVISOR_BACKOFF_MAX, healthy_after=SUPERVISOR_HEALTHY_AFTER, reload=None):
+        self.run_worker = run_worker
+        self.reload = reload
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.healthy_after = healthy_after
+        self.workers = [
+            Worker(name, cpu=None if not cpus else cpus[index % len(cpus)], backoff=backoff_min)
+            for index, name in enumerate(names)
+        ]
+        self.selector = selectors.DefaultSelector()
+        self.wakeup = None # Pipe signals are written to, so they wake up the selector
+        self.running = False
+
+    # Fork a worker
+    def start_worker(self, worker):
+        if self.reload is not None:
+            self.reload()
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            self.run_child(worker, write_fd) # Never returns
+        os.close(write_fd)
+        os.set_blocking(read_fd, False)
+        worker.pid = pid
+        worker.stats_fd = read_fd
+        worker.buffer = b""
+        worker.started = time.monotonic()
+        worker.restart_at = None
+        self.selector.register(read_fd, selectors.EVENT_READ, worker)
+        logger.info("Started worker for " + worker.name + " (pid " + str(pid) + ")")
+
+    # Run in the forked worker. Exits the process when the worker returns
+    def run_child(self, worker, stats_fd):
+        code = 1
+        try:
+            # Drop what the supervisor had open, & its signal handling
+            signal.set_wakeup_fd(-1)
+            for fd in [other.stats_fd for other in self.workers if other.stats_fd is not None] + list(self.wakeup or ()):
+                os.close(fd)
+            self.selector.close()
+            for signum in (signal.SIGCHLD, signal.SIGUSR1):
+                signal.signal(signum, signal.SIG_DFL)
+            signal.signal(signal.SIGHUP, signal.SIG_IGN) # Until the worker handles it (i.e. reload)
+            signal.signal(signal.SIGINT, signal.SIG_IGN) # The supervisor stops workers with SIGTERM
+            signal.signal(signal.SIGTERM, stop_worker)
+            if worker.cpu is not None:
+                os.sched_setaffinity(0, {worker.cpu})
+
+            def report(stats):
+                os.write(stats_fd, (json.dumps(stats) + "\n").encode())
+            self.run_worker(worker.name, report)
+            code = 0
+        except SystemExit as err:
+            code = err.code if isinstance(err.code, int) else 0
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            os._exit(code)
+
+    # Read stats sent by a worker. Returns False once the worker has closed its end of the pipe
+    def read_stats(self, worker):
+        while True:
+            try:
+                data = os.read(worker.stats_fd, 65536)
+            except BlockingIOError:
+                break
+            if not data:
+                return False
+            worker.buffer += data
+        *lines, worker.buffer = worker.buffer.split(b"\n")
+        for line in lines:
+            try:
+                worker.stats.update(json.loads(line))
+            except ValueError:
+                logger.warn("Bad stats from worker for " + worker.name)
+        return True
+
+    def close_stats(self, worker):
+        if worker.stats_fd is not None:
+            self.read_stats(worker)
+            self.selector.unregister(worker.stats_fd)
+            os.close(worker.stats_fd)
+            worker.stats_fd = None
+
+    # Reap stopped workers & schedule their restarts
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = next((worker for worker in self.workers if worker.pid == pid), None)
+            if worker is None:
+                continue
+            self.close_stats(worker)
+            worker.pid = None
+            if not self.running:
+                continue
+            now = time.monotonic()
+            if now - worker.started >= self.healthy_after:
+                worker.backoff = self.backoff_min # Ran long enough, so it isn't crashing over & over
+            worker.restart_at = now + worker.backoff
+            logger.err("Worker for " + worker.name + " stopped (exit code " + str(exit_code(status)) + "). Restarting in " + str(worker.backoff) + "s...")
+            worker.backoff = min(worker.backoff * 2, self.backoff_max)
+
+    # Seconds until the next worker is due to be restarted, or None if none are waiting
+    def next_restart(self):
+        waiting = [worker.restart_at for worker in self.workers if worker.restart_at is not None]
+        if len(waiting) == 0:
+            return None
+        return max(0, min(waiting) - time.monotonic())
+
+    def restart_due(self):
+        now = time.monotonic()
+        for worker in self.workers:
+            if worker.restart_at is not None and worker.restart_at <= now:
+                worker.restarts += 1
+                self.start_worker(worker)
+
+    def signal_workers(self, signum):
+        for worker in self.workers:
+            if worker.pid is not None:
+                try:
+                    os.kill(worker.pid, signum)
+                except ProcessLookupError:
+                    pass
+
+    # Stats of each worker: keyboard name -> dict of pid, restarts, uptime & the stats last sent by the worker
+    def stats(self):
+        now = time.monotonic()
+        return {
+            worker.name: dict(worker.stats, pid=worker.pid, restarts=worker.restarts, uptime=now - worker.started if worker.pid is not None else 0)
+            for worker in self.workers
+        }
+
+    def log_stats(self):
+        for name, stats in self.stats().items():
+            logger.info(name + ": " + ", ".join(key + "=" + str(round(value, 3) if isinstance(value, float) else value) for key, value in stats.items()))
+
+    # Handle a signal sent to the supervisor. Returns False once the supervisor should stop
+    def handle_signal(self, signum):
+        if signum == signal.SIGCHLD:
+            self.reap()
+        elif signum in (signal.SIGTERM, signal.SIGINT):
+            return False
+        elif signum == signal.SIGHUP:
+            if self.reload is not None:
+                self.reload(force=True) # For workers restarted from now on
+            self.signal_workers(signal.SIGHUP) # Workers reload their config
+        elif signum == signal.SIGUSR1:
+            self.log_stats()
+        return True
+
+    # Start the workers & supervise them until SIGTERM or SIGINT
+    def run(self):
+        self.wakeup = os.pipe()
+        for fd in self.wakeup:
+            os.set_blocking(fd, False)
+        handled = (signal.SIGCHLD, signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGUSR1)
+        # Handlers do nothing: the signal number is written to the wakeup pipe, & handled in the loop
+        previous = { signum: signal.signal(signum, lambda signum, frame: None) for signum in handled }
+        previous_wakeup = signal.set_wakeup_fd(self.wakeup[1])
+        self.selector.register(self.wakeup[0], selectors.EVENT_READ, None)
+        self.running = True
+        try:
+            for worker in self.workers:
+                self.start_worker(worker)
+            while self.running:
+                for key, _ in self.selector.select(self.next_restart()):
+                    if key.data is None:
+                        for signum in os.read(self.wakeup[0], 512):
+                            self.running = self.handle_signal(signum) and self.running
+                    elif key.data.stats_fd != key.fd:
+                        continue # Closed when the worker was reaped, earlier in this batch
+                    elif not self.read_stats(key.data):
+                        self.close_stats(key.data) # Worker exited, reaped on SIGCHLD
+                if self.running:
+                    self.reap() # In case a SIGCHLD was merged with another
+                    self.restart_due()
+        finally:
+            self.running = False
+            self.stop_workers()
+            signal.set_wakeup_fd(previous_wakeup)
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+            self.selector.unregister(self.wakeup[0])
+            for fd in self.wakeup:
+                os.close(fd)
+            self.wakeup = None
+        self.log_stats()
+
+    # Stop all workers, killing any still running after timeout seconds
+    def stop_workers(self, timeout=SUPERVISOR_STOP_TIMEOUT):
+        logger.info("Stopping workers...")
+        self.signal_workers(signal.SIGTERM)
+        deadline = time.monotonic() + timeout
+        while any(worker.pid is not None for worker in self.workers):
+            if time.monotonic() >= deadline:
+                logger.warn("Workers didn't stop in time, so killing them")
+                self.signal_workers(signal.SIGKILL)
+                deadline = float("inf")
+            self.reap()
+            time.sleep(0.01)
+
+# SIGTERM handler for workers
+def stop_worker(signum, frame):
+    raise SystemExit(0)
+
+# Config & compiled keyboards the supervisor forks workers with
+# Kept up to date with the config file, so a worker restarted after the config has changed (i.e. by 2Keys sync)
+# doesn't go back to the config the supervisor started with
+class WorkerConfig:
+    # config: 2Keys config
+    # names: Names of the keyboards with workers
+    # compiled: Dict of keyboard name -> CompiledKeyboard. Keyboards not in it are compiled now, so workers don't have to
+    # config_path: Config file the config is from
+    def __init__(self, config, names, compiled=None, config_path=CONFIG_FILE):
+        self.names = names
+        self.config_path = config_path
+        self.file_key = self.stat()
+        self.use(config, compiled)
+
+    # Key that changes when the config file does, as for load_config()
+    def stat(self):
+        try:
+            stat = os.stat(self.config_path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def use(self, config, compiled):
+        compiled = dict(compiled or {})
+        for name in self.names:
+            if name not in compiled:
+                compiled[name] = compile_keyboard(config["keyboards"][name])
+        self.config = config
+        self.compiled = compiled
+
+    # Reload the config if the file has changed, from the compiled config if it's up to date
+    # force: Reload even if the file hasn't changed
+    # If it can't be loaded, workers carry on being started with the current config
+    # Returns True if reloaded
+    def reload(self, force=False):
+        file_key = self.stat()
+        if file_key == self.file_key and not force:
+            return False
+        self.file_key = file_key # So a config that can't be loaded isn't tried again until it changes
+        try:
+            snapshot = load_snapshot(self.config_path)
+            config, compiled = snapshot if snapshot is not None else (load_config(self.config_path), {})
+            self.use(config, compiled)
+        except Exception as err:
+            logger.err("Couldn't reload config, so starting workers with the current config: " + str(err))
+            return False
+        logger.info("Config reloaded, for workers started from now on.")
+        return True
+
+# Make the function a worker runs to watch its keyboard
+# worker_config: WorkerConfig, with the config to watch with
+# lock: Lock (grab) the keyboard
+# reload: Reload the config when it changes, or on SIGHUP (see reload.Reloader)
+# realtime: Dict of real time options, applied in each worker (see realtime.apply_realtime())
+# stats_interval: Seconds between each time the worker sends its stats to the supervisor
+# options: Options for each Keyboard, i.e. queue_size (see Keyboard)
+def watch_worker(worker_config, lock=True, reload=True, realtime=None, stats_interval=SUPERVISOR_STATS_INTERVAL, **options):
+    def run(name, report):
+        config = worker_config.config
+        keyboard = Keyboard(config["keyboards"][name], name, config=config, compiled=worker_config.compiled[name], **options)
+        reloader = Reloader([keyboard]).start() if reload else None
+        apply_realtime([keyboard], **(realtime or {}))
+
+        def send_stats():
+            while True:
+                time.sleep(stats_interval)
+                report(keyboard.stats())
+        threading.Thread(target=send_stats, name="2Keys-stats-" + name, daemon=True).start()
+
+        try:
+            if lock:
+                keyboard.lock() # Grabs keyboard
+            keyboard.watch_keyboard()
+        finally:
+            if reloader is not None:
+                reloader.stop()
+            if lock:
+                try:
+                    keyboard.unlock()
+                except OSError:
+                    pass # Never locked, or unplugged
+            keyboard.stop()
+            report(keyboard.stats())
+    return run
+
+# Supervise a worker for each keyboard
+# names: Names of keyboards to watch. Watches all keyboards in the config if empty
+# cpus: CPUs to pin workers to, in turn (see realtime.parse_cpus())
+# compiled: Dict of keyboard name -> CompiledKeyboard, as for WorkerConfig
+# reload: Reload the config when it changes, in the workers & for workers being restarted
+# Other arguments are as for watch_worker()
+def supervise(config, names=(), cpus=None, compiled=None, lock=True, reload=True, realtime=None, **options):
+    if len(names) == 0:
+        names = list(config["keyboards"].keys())
+    worker_config = WorkerConfig(config, names, compiled=compiled)
+    run_worker = watch_worker(worker_config, lock=lock, reload=reload, realtime=realtime, **options)
+    Supervisor(names, run_worker, cpus=parse_cpus(cpus), reload=worker_config.reload if reload else None).run()
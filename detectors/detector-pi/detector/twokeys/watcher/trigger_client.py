@@ -0,0 +1,112 @@
+"""
+Copyright 2018 Kishan Sambhi
+
+This file is part of 2Keys.
+
+2Keys is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+2Keys is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with 2Keys.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# Client for sending hotkey triggers to the server
+# Built once, so that each trigger doesn't have to build the URL, serialise the JSON
+# or open a new connection to the server
+import json
+import requests
+from requests.adapters import HTTPAdapter
+from ..util.config import get_server_url
+from ..util.constants import TRIGGER_PATH, TRIGGERS_PATH, TRIGGER_TIMEOUT, TRANSPORT_HTTP, TRANSPORT_CHANNEL
+
+# So the server can interpret it
+TYPE_JSON = {"Content-Type": "application/json"}
+
+# Values of evdev key events a trigger can be sent for
+TRIGGER_VALUES = (0, 1)
+
+# Request bodies for triggers, serialised once for each hotkey
+# Shared by the clients for each transport, as the body is the same JSON for each
+class TriggerBodies:
+    def __init__(self):
+        # Serialised JSON request bodies, by (keyboard, hotkey, value)
+        self.bodies = {}
+
+    # Serialise the request bodies for a keyboard's hotkeys up front
+    # keyboard: Name of keyboard
+    # hotkeys: Iterable of hotkey refs from the config
+    def prepare(self, keyboard, hotkeys):
+        for hotkey in hotkeys:
+            for value in TRIGGER_VALUES:
+                self.bodies[(keyboard, hotkey, value)] = self.serialise(keyboard, hotkey, value)
+
+    def serialise(self, keyboard, hotkey, value):
+        return json.dumps({ "keyboard": keyboard, "hotkey": hotkey, "value": value }).encode("utf-8")
+
+    # Body for a trigger, with run & seq added if seq is given (see TriggerClient.send())
+    # ts: Time of the key event, in seconds since the epoch, added if given
+    # held: Seconds the hotkey was held down for, added if given
+    def body(self, keyboard, hotkey, value, run=None, seq=None, ts=None, held=None):
+        body = self.bodies.get((keyboard, hotkey, value))
+        if body is None:
+            # Not prepared, i.e. a key repeat value
+            body = self.serialise(keyboard, hotkey, value)
+        if ts is not None:
+            body = body[:-1] + b', "ts": %.6f}' % ts
+        if held is not None:
+            body = body[:-1] + b', "held": %.6f}' % held
+        if seq is not None:
+            body = body[:-1] + b', "run": "%s", "seq": %d}' % (run.encode("utf-8"), seq)
+        return body
+
+    # Body for a batch of triggers (see TriggerClient.send_batch())
+    def batch_body(self, keyboard, triggers, run=None):
+        return b'{"triggers": [' + b", ".join([self.body(keyboard, hotkey, value, run, seq, ts, held) for hotkey, value, ts, seq, held in triggers]) + b"]}"
+
+class TriggerClient(TriggerBodies):
+    # config: 2Keys config (from load_config())
+    # pool_size: Max number of connections kept open to the server
+    # timeout: Seconds to wait for the server
+    def __init__(self, config, pool_size=1, timeout=TRIGGER_TIMEOUT):
+        super().__init__()
+        self.url = get_server_url(config) + TRIGGER_PATH
+        self.batch_url = get_server_url(config) + TRIGGERS_PATH
+        self.timeout = timeout
+        # Session keeps connections to the server alive between triggers
+        self.session = requests.Session()
+        self.session.headers.update(TYPE_JSON)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    # Send a trigger to the server
+    # run, seq: Id of the run of the watcher & sequence number of the trigger (see journal.TriggerJournal),
+    #   so the server can drop triggers sent twice. Not sent if seq is None
+    # held: Seconds the hotkey was held down for, for the up of a collapsed multi hotkey (see Keyboard). Not sent if None
+    # Raises requests.exceptions.RequestException on errors, as requests.post does
+    def send(self, keyboard, hotkey, value, run=None, seq=None, held=None):
+        return self.session.post(self.url, data=self.body(keyboard, hotkey, value, run, seq, held=held), timeout=self.timeout)
+
+    # Send a batch of triggers to the server in one request, which runs them in the order given
+    # triggers: List of (hotkey, value, ts, seq, held) tuples, where ts is the time of the key event & seq & held are as for send()
+    # Raises requests.exceptions.RequestException on errors, as send() does
+    def send_batch(self, keyboard, triggers, run=None):
+        return self.session.post(self.batch_url, data=self.batch_body(keyboard, triggers, run), timeout=self.timeout)
+
+    def close(self):
+        self.session.close()
+
+# Make a client for sending triggers with
+# transport: How to send them (see constants.TRANSPORTS)
+# pool_size: Max number of connections kept open to the server, for http
+def make_client(config, transport=TRANSPORT_HTTP, pool_size=1):
+    if transport == TRANSPORT_CHANNEL:
+        from .channel import ChannelClient
+        return ChannelClient(config)
+    return TriggerClient(config, pool_size=pool_size)
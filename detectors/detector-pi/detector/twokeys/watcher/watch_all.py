@@ -0,0 +1,98 @@
+"""
+Copyright 2018 Kishan Sambhi
+
+This file is part of 2Keys.
+
+2Keys is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+2Keys is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with 2Keys.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# Watches every keyboard at once, from one process
+# Uses one event loop, which is told when each keyboard has events to read (epoll),
+# instead of a process per keyboard each blocking on reading its keyboard
+import asyncio
+import signal
+from ..util.logger import Logger
+from .watch_keyboard import Keyboard
+from .trigger_client import make_client
+from ..util.constants import TRANSPORT_HTTP
+from .reload import Reloader
+from .realtime import apply_realtime
+
+logger = Logger("detect")
+
+# Read all events waiting on a keyboard (up to the reader's batch size)
+# Called by the event loop when the keyboard's file can be read
+def read_events(keyboard, loop):
+    try:
+        keyboard.handle_events(keyboard.reader.read())
+        if keyboard.batch:
+            # Still in the batch window, so send the batch when it ends if no more events come before then
+            loop.call_later(keyboard.batch_timeout(), keyboard.flush_batch)
+    except BlockingIOError:
+        return # Nothing left to read
+    except OSError as err:
+        # Keyboard unplugged
+        logger.err("Error reading from keyboard " + keyboard.name + ": " + str(err))
+        logger.err("No longer watching " + keyboard.name)
+        loop.remove_reader(keyboard.keyboard_device.fd)
+
+# Watch keyboards
+# config: 2Keys config
+# names: Names of keyboards to watch. Watches all keyboards in the config if empty
+# lock: Lock (grab) the keyboards
+# compiled: Dict of keyboard name -> CompiledKeyboard, from the compiled config (see compiled.load_snapshot())
+# reload: Reload the config when it changes, or on SIGHUP (see reload.Reloader)
+# realtime: Dict of real time options (see realtime.apply_realtime())
+# options: Options for each Keyboard, i.e. queue_size (see Keyboard)
+def watch_all(config, names=(), lock=True, compiled=None, reload=True, realtime=None, **options):
+    if len(names) == 0:
+        names = list(config["keyboards"].keys())
+    if compiled is None:
+        compiled = {}
+    # One client shared by all keyboards, with a connection to the server for each
+    client = make_client(config, options.get("transport", TRANSPORT_HTTP), pool_size=len(names))
+    keyboards = [
+        Keyboard(config["keyboards"][name], name, config=config, client=client, compiled=compiled.get(name), **options)
+        for name in names
+    ]
+
+    loop = asyncio.new_event_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, loop.stop)
+    reloader = None
+    if reload:
+        reloader = Reloader(keyboards).start(sighup=False)
+        loop.add_signal_handler(signal.SIGHUP, reloader.reload_in_background)
+    apply_realtime(keyboards, **(realtime or {}))
+    try:
+        for keyboard in keyboards:
+            if lock:
+                keyboard.lock() # Grabs keyboard
+            keyboard.dispatcher.start()
+            loop.add_reader(keyboard.keyboard_device.fd, read_events, keyboard, loop)
+            logger.info("Watching for key presses on " + keyboard.name + "...")
+        loop.run_forever()
+    finally:
+        logger.info("Stopping...")
+        if reloader is not None:
+            reloader.stop()
+        for keyboard in keyboards:
+            loop.remove_reader(keyboard.keyboard_device.fd)
+            if lock:
+                try:
+                    keyboard.unlock()
+                except OSError:
+                    pass # Never locked, or unplugged
+            keyboard.stop()
+        client.close()
+        loop.close()
@@ -21,213 +21,451 @@ along with 2Keys.  If not, see <https://www.gnu.org/licenses/>.
 # Notes: Code 99 should not be interrupted
 # NOTE: Now to solve hotkey duplication
 
-import struct
 import time
-import sys
-import aiofiles
+from collections import deque
+from collections.abc import Mapping
+from itertools import groupby
 import requests
-import json
 from evdev import InputDevice
-from os import path
-from ..util.constants import KEYBOARDS_PATH_BASE, KEYBOARD_EVENT_FORMAT, KEYBOARD_EVENT_SIZE, MAX_KEY_MAPS
-from ..util.keyboard_map import keys as KEY_MAP
+from ..util.constants import DEFAULT_DISPATCH_QUEUE_SIZE, TRANSPORT_HTTP, BATCH_WINDOW
 from ..util.config import load_config
-from ..util.logger import Logger
+from ..util.logger import Logger, DEBUG, INFO
+from .hotkeys import standardise_hotkeys, HotkeyIndex
+from .key_state import KeyState
+from .dispatcher import TriggerDispatcher, POLICY_DROP_OLDEST
+from .trigger_client import make_client
+from .raw_reader import make_reader, BACKEND_RAW
+from .metrics import TriggerTiming
+from .compiled import compile_keyboard, apply_mappings
+from .key_map import KeyMap
+from .journal import TriggerJournal, JournalReplayer, journal_path
 
 logger = Logger("detect")
 
 class Keyboard:
     # keyboard: Keyboard config
     # name: Name of keyboard
-    def __init__(self, keyboard, name):
-        self.config = load_config()
+    # queue_size: Max number of triggers waiting to be sent to the server
+    # queue_policy: What to do when the queue of triggers is full (see dispatcher.POLICIES)
+    # block_timeout: Seconds to wait for space in the queue when queue_policy is block, after which the trigger is dropped. None waits forever
+    # config: 2Keys config, loaded if not given
+    # client: TriggerClient to send triggers with, so it can be shared between keyboards. One is created if not given
+    # backend: How to read events from the keyboard (see raw_reader.BACKENDS), or None if events are given to handle_events() directly
+    # device: evdev InputDevice to read from, opened from the keyboard's path if not given
+    # quiet: Don't log anything for each event or hotkey (the "hot path"). Running with python -O removes hot path logging entirely
+    # log_sample: Only log 1 in every log_sample hotkeys
+    # metrics: MetricsRegistry to record the latency of triggers in, or None to not record them
+    # compiled: CompiledKeyboard from the compiled config (see compiled.load_snapshot()), compiled from keyboard if not given
+    # journal: Save triggers that can't be sent to a journal, to send when the server is back (see journal.TriggerJournal).
+    #   True to keep it in the default file for the keyboard (see journal.journal_path()), or the path of the file to keep it in
+    # transport: How to send triggers to the server (see constants.TRANSPORTS), if client isn't given
+    # batch: Send the triggers from one SYN_REPORT frame (i.e. from a macro pad, or several keys in one USB report) to the server together,
+    #   as one request. A trigger on its own is sent as it is without batching
+    # batch_window: Microseconds after the first trigger of a batch to keep adding triggers to it, across frames (see flush_batch())
+    # collapse_multi: For multi hotkeys, only send the down or up if the config has a function for it (as the server runs nothing for the other),
+    #   & send how long the hotkey was held for with the up (see send_multi())
+    def __init__(self, keyboard, name, queue_size=DEFAULT_DISPATCH_QUEUE_SIZE, queue_policy=POLICY_DROP_OLDEST, block_timeout=None, config=None, client=None, backend=BACKEND_RAW, device=None, quiet=False, log_sample=1, metrics=None, compiled=None, journal=None, transport=TRANSPORT_HTTP, batch=True, batch_window=BATCH_WINDOW, collapse_multi=False):
+        self.config = config if config is not None else load_config()
         logger.debug("Got keyboard: " + str(keyboard))
         self.keyboard = keyboard
         self.name = name
+        # Logging for each event & hotkey is decided once here, so that when it's off
+        # handling an event does no formatting or I/O for logs
+        self.log_events = not quiet and logger.enabled(DEBUG)
+        self.log_hotkeys = not quiet and logger.enabled(INFO)
+        self.hotkey_logger = logger.sample(log_sample)
         # File for input that corresponds to the keyboard.
         self.keyboard_path = keyboard["path"]
         # Device from evdev storage
-        self.keyboard_device = InputDevice(self.keyboard_path)
-        # Array of pressed keys
-        # is array of booleans, with the index = key code
-        # i.e. if pressed_or_not[2] == true, then 2 has been pressed down.  Once set to false, the key has been 'unpressed'
-        self.pressed_or_not = [False] * MAX_KEY_MAPS
-        # Current keys being pressed
-        self.keys = [""]
-        # Local stores of key mappings
-        self.map = KEY_MAP
-        # Apply mappings
-        if "map" in self.keyboard:
-            self.apply_mappings(self.keyboard["map"])
-        # Store hotkeys list
-        self.hotkeys = self.standardise_hotkeys(keyboard["hotkeys"])
-        # Store array of hotkeys split into chars as this makes checking easier
+        self.keyboard_device = device if device is not None else InputDevice(self.keyboard_path)
+        # Reads events from the device in batches
+        self.reader = make_reader(self.keyboard_device, backend)
+        # Key map with custom mappings applied, standardised hotkeys & the index of hotkeys,
+        # so checking for a hotkey is a single lookup
+        if compiled is None:
+            compiled = compile_keyboard(keyboard)
+        self.map = compiled.map
+        self.hotkeys = compiled.hotkeys
+        self.hotkey_index = compiled.index
+        # Current keys being pressed, as a bitmask of key codes
+        self.key_state = KeyState(self.map)
+        # Newly compiled config waiting to be swapped in (see reload())
+        self.reloads = deque(maxlen=1)
         # current hotkey, used for when watching for an up event
         self.current_hotkey_up = None
         self.last_hotkey = None
+        # Client for the server, with the requests for each hotkey prepared in advance
+        self.owns_client = client is None
+        self.client = make_client(self.config, transport) if client is None else client
+        self.client.prepare(self.name, self.hotkeys)
+        # Sends triggers to the server in the background, so watching never waits on the network
+        self.dispatcher = TriggerDispatcher(self.post_hotkey, self.name, max_queue=queue_size, policy=queue_policy, block_timeout=block_timeout, send_batch=self.post_hotkeys)
+        # Triggers waiting to be sent as a batch, as (hotkey, value, ts, timing, held) tuples, & the time.monotonic() after which they're sent
+        self.batch = [] if batch else None
+        self.batch_window = batch_window / 1e6
+        self.batch_deadline = 0
+        # Multi hotkeys being held down, by hotkey, with the kernel timestamp of their down
+        self.collapse_multi = collapse_multi
+        self.multi_downs = {}
+        self.metrics = metrics
+        if metrics is not None:
+            metrics.add_dispatcher(self.name, self.dispatcher)
+        # Sends triggers saved to the journal (including those left from the last run) once the server can be reached
+        self.journal = None
+        self.replayer = None
+        if journal:
+            self.journal = TriggerJournal(journal_path(self.name) if journal is True else journal)
+            self.replayer = JournalReplayer(self.journal, self.resend_hotkeys, self.name).start()
     
     # Custom mapping
-    # Takes in key/value of key: code and adds to map array
+    # See compiled.apply_mappings()
+    # Keys held down stay held down, as for apply_reload()
     def apply_mappings(self, maps):
-        for key, code in maps.items():
-            logger.debug("Mapped " + key + " as (" + key + ") to code " + str(code))
-            self.map[code] = "(" + key + ")"
+        # A new map, so the shared map (or the compiled one) isn't changed
+        if isinstance(self.map, KeyMap):
+            key_map = KeyMap(self.map.base, self.map.overlay)
+        else:
+            key_map = KeyMap(self.map)
+        apply_mappings(key_map, maps)
+        # Which keys can be pressed & the index of hotkeys depend on the map, so are rebuilt from it
+        pressed = self.key_state.pressed
+        self.map = key_map
+        self.hotkey_index = HotkeyIndex(self.hotkeys, key_map)
+        self.key_state = KeyState(key_map)
+        self.key_state.pressed = pressed & self.key_state.mapped
     
     # Keyboard watcher
     # TODO: Use const from evdev instead of manually checking for cleaner code and no magic numbers
     def watch_keyboard(self):
         logger.info("Watching for key presses on " + self.name + "...")
-        for event in self.keyboard_device.read_loop():
-            type = event.type
-            code = event.code
-            value = event.value
-            # We only want event type 1, as that is a key press
-            # If key is already pressed, ignore event provided value not 0 (key unpressed)
-            if (type == 1 or type == 0x1):
-                logger.info("Key pressed. Code %u, value %u. Mapping: %s" %
-                        (code, value, self.map[code]))
+        self.dispatcher.start()
+        for events in self.reader.read_loop(self.batch_timeout):
+            self.handle_events(events)
+
+    # Handle a batch of events from the reader
+    # events: Iterable of (sec, usec, type, code, value) tuples
+    def handle_events(self, events):
+        if self.reloads:
+            self.apply_reload()
+        for sec, usec, type, code, value in events:
+            self.handle_event(type, code, value, sec, usec)
+        # No more events to read, so send the triggers from them, unless still in the batch window
+        if self.batch:
+            self.flush_batch()
+
+    # Handle a single event from the keyboard
+    # sec, usec: Kernel timestamp of the event, used for latency metrics
+    def handle_event(self, type, code, value, sec=0, usec=0):
+        # We only want event type 1, as that is a key press
+        # If key is already pressed, ignore event provided value not 0 (key unpressed)
+        if (type == 1 or type == 0x1):
+            if __debug__ and self.log_events:
+                logger.debug("Key pressed. Code %u, value %u. Mapping: %s", code, value, self.map[code])
     
-                # Set key in array
-                # Only done if value 1 so as to not conflict with ups
-                if value == 1:
-                    self.change_key_state(code, value)
-                    logger.debug(self.keys)
+            # Set key in array
+            # Only done if value 1 so as to not conflict with ups
+            if value == 1:
+                self.change_key_state(code, value)
+                if __debug__ and self.log_events:
+                    logger.debug("Keys pressed: %s", list(self.key_state.codes()))
 
-                # Run alogrithm to check keys against hotkey
-                # Only run though if value is 0 or 1 to prevent duplicate hotkeys
-                if value < 2:
-                    # Proceed with regular hotkey logic
-                    checked_hotkey = self.check_for_hotkey(self.keys)
-                    if checked_hotkey != False:
-                        hotkey = self.hotkeys[checked_hotkey]
-                        logger.info("Registered hotkey:")
-                        logger.info(checked_hotkey)
-                        logger.info(hotkey)
-                        # Is is an up, down, or multi function?
-                        if hotkey["type"] == "down" and value == 1:
-                            self.send_hotkey(checked_hotkey, value)
-                        elif hotkey["type"] == "up" and value == 0:
-                            self.send_hotkey(checked_hotkey, value)
-                        elif hotkey["type"] == "multi":
-                            # The server handles picking the right hotkey
-                            self.send_hotkey(checked_hotkey, value)
+            # Run alogrithm to check keys against hotkey
+            # Only run though if value is 0 or 1 to prevent duplicate hotkeys
+            if value < 2:
+                # Proceed with regular hotkey logic
+                checked_hotkey = self.check_for_hotkey(self.key_state.pressed)
+                if checked_hotkey != False:
+                    hotkey = self.hotkeys[checked_hotkey]
+                    if __debug__ and self.log_events:
+                        logger.debug("Registered hotkey %s: %s", checked_hotkey, hotkey)
+                    timing = TriggerTiming(sec, usec, time.time()) if self.metrics is not None else None
+                    # Is is an up, down, or multi function?
+                    if hotkey["type"] == "down" and value == 1:
+                        self.send_hotkey(checked_hotkey, value, timing, sec, usec)
+                    elif hotkey["type"] == "up" and value == 0:
+                        self.send_hotkey(checked_hotkey, value, timing, sec, usec)
+                    elif hotkey["type"] == "multi":
+                        # The server handles picking the right hotkey
+                        if self.collapse_multi:
+                            self.send_multi(checked_hotkey, hotkey, value, timing, sec, usec)
                         else:
-                            logger.warn("Hotkey not send as it's type " + hotkey["type"])
-                
-                # Set key in array
-                # Only done if value 0 so as to not conflict with downs
-                if value == 0:
-                    self.change_key_state(code, value)
-                    logger.debug(self.keys)
+                            self.send_hotkey(checked_hotkey, value, timing, sec, usec)
+                    elif __debug__ and self.log_events:
+                        logger.debug("Hotkey not send as it's type %s", hotkey["type"])
+            
+            # Set key in array
+            # Only done if value 0 so as to not conflict with downs
+            if value == 0:
+                self.change_key_state(code, value)
+                if __debug__ and self.log_events:
+                    logger.debug("Keys pressed: %s", list(self.key_state.codes()))
 
-                #elif type != 0 or code != 0 or value != 0:
-                #    print("Event type %u, code %u, value %u at %d.%d" % \
-                #        (type, code, value, tv_sec, tv_usec))
-            else:
-                # Events with code, type and value == 0 are "separator" events
-                 print("===========================================")
+            #elif type != 0 or code != 0 or value != 0:
+            #    print("Event type %u, code %u, value %u at %d.%d" % \
+            #        (type, code, value, tv_sec, tv_usec))
+        else:
+            # Events with code, type and value == 0 are "separator" events
+            if __debug__ and self.log_events:
+                logger.debug("===========================================")
+            # End of a frame, so its triggers can be sent
+            if self.batch and type == 0 and code == 0:
+                self.flush_batch()
     
     # Handle change of state (down/up) of key code
-    # down = True
-    # Up (as in not pressed) = False
+    # down = 1
+    # Up (as in not pressed) = 0
     def change_key_state(self, code, value):
         if value == 1:
-            # Key not yet pressed
-            self.pressed_or_not[code] = True
-            # Add to self.keys string
-            if isinstance(self.map[code], str):
-                self.keys = [combo + self.map[code] for combo in self.keys] # Add to each candidate combo                  
-            else:
-                # Array in use
-                # Add as different candidates
-                new_keys = []
-                for combo in self.keys:
-                    for mapping in self.map[code]:
-                        new_keys.append(combo + mapping)
-                self.keys = new_keys   
+            self.key_state.press(code)
         elif value == 0:
-            # Key unpressed, remove
-            self.pressed_or_not[code] = False
-            # Remove from combos
-            if isinstance(self.map[code], str):
-                self.keys = [combo.replace(self.map[code], "") for combo in self.keys] # Remove from each combo
-            else:
-                # Array
-                for mapping in self.map[code]:
-                    logger.debug("Checking mapping " + str(mapping))
-                    new_keys = []
-                    index = 0
-                    while index < len(self.keys):
-                        combo = self.keys[index]
-                        if combo.find(mapping) >= 0 or combo == mapping: # Only should run if in, to avoid duplicates
-                            new_combo = combo.replace(mapping, "")
-                            if len(new_combo) > 0:
-                                new_keys.append(new_combo) # Remove from each
-                        index += 1
-                    self.keys = new_keys
-                # If keys array is empty, make sure to add somewhere for next set
-                if len(self.keys) < 1:
-                    self.keys = [""]
+            self.key_state.release(code)
     
     # Standardise hotkey config
-    # hotkey = hotkeys mappings
-    # Standard config:
-    #   type: down
-    #   func: Function
+    # See hotkeys.standardise_hotkeys()
     def standardise_hotkeys(self, hotkeys):
-        new_hotkeys = hotkeys
-        for key, value in new_hotkeys.items():
-            if isinstance(value, str):
-                # Only has function
-                new_hotkeys[key] = {
-                    "type": "down",
-                    "func": value
-                }
-            # Else it has to be a regular one OR a muti one as ups require type: up, muties just need an object
-            # The below fixes #13. where if no type was specified but a func: was the program crashes
-            elif "type" not in new_hotkeys[key]:
-                # Function is present, but no type
-                new_hotkeys[key]["type"] = ("down" if isinstance(value["func"], str) else "multi") # If func is str, use down, if not, use "multi"
-        return new_hotkeys
+        return standardise_hotkeys(hotkeys)
     
     # Hotkey detector algorithm
     # Return the key of the hotkey if hotkey
-    # candidate = array of hotkey strings to check
-    def check_for_hotkey(self, candidates):
-        # Check each candidate
-        for combo in candidates:
-            logger.debug("Checking hotkey in combo " + combo)
-            for key, mapping in self.hotkeys.items():
-                # Check each candidate
-                # Step 1: Check length.  If lengths are different, hotkeys can't match
-                if len(key) != len(combo):
-                    continue
-                # Step 2: Check if chars are equal
-                split_hotkey = list(key) # Split into array for easy checking
-                split_current_keys = list(combo)
-                if set(split_hotkey).issubset(set(split_current_keys)) or set(split_current_keys).issubset(set(split_hotkey)):
-                    return key # Candidate and hotkey matches, return hotkey location
-            
-        # If none are true, then this isn't the right one (function yet to return)
-        return False
+    # pressed = bitmask of key codes pressed (see KeyState)
+    def check_for_hotkey(self, pressed):
+        return self.hotkey_index.match(pressed)
     
     # Hotkey sender
-    # Send hotkey runner command -> server
+    # Queues hotkey to be sent to the server, without waiting for it to be sent
+    # If batching, it's added to the batch instead, which is queued at the end of the frame (see flush_batch())
     # hotkey = hotkey ref in config
     # value = Value of event type (up, down) from evdev
-    def send_hotkey(self, hotkey, value):
-        logger.info("Sending hotkey %s to server..." % hotkey)
+    # timing = TriggerTiming for latency metrics, if they're being recorded
+    # sec, usec = Kernel timestamp of the event
+    # held = Seconds the hotkey was held down for, if known (see send_multi())
+    def send_hotkey(self, hotkey, value, timing=None, sec=0, usec=0, held=None):
+        if __debug__ and self.log_hotkeys:
+            self.hotkey_logger.info("Sending hotkey %s to server...", hotkey)
+        if self.batch is not None:
+            if not self.batch:
+                self.batch_deadline = time.monotonic() + self.batch_window
+            self.batch.append((hotkey, value, sec + usec / 1e6, timing, held))
+            return
+        self.dispatcher.dispatch(hotkey, value, timing, held, sec + usec / 1e6)
+        if __debug__ and self.log_events:
+            logger.debug("Triggers waiting to be sent: %u", self.dispatcher.depth)
+
+    # Send a multi hotkey, when collapsing them
+    # The down is sent straight away, & the up is sent with how long the hotkey was held for, from the kernel timestamps of the events.
+    # Either is only sent if the hotkey has a function for it, so i.e. a multi hotkey with only a down function is one trigger, not two
+    # key = hotkey ref in config
+    # hotkey = standardised hotkey config
+    def send_multi(self, key, hotkey, value, timing, sec, usec):
+        functions = hotkey["func"]
+        if not isinstance(functions, Mapping): # Read-only in a config from load_config()
+            # Not a {down, up} function, so let the server decide
+            self.send_hotkey(key, value, timing, sec, usec)
+        elif value == 1:
+            self.multi_downs[key] = sec + usec / 1e6
+            if "down" in functions:
+                self.send_hotkey(key, value, timing, sec, usec)
+            elif __debug__ and self.log_events:
+                logger.debug("Not sending down of hotkey %s, as it only has an up function", key)
+        else:
+            down = self.multi_downs.pop(key, None)
+            if "up" in functions:
+                self.send_hotkey(key, value, timing, sec, usec, held=sec + usec / 1e6 - down if down is not None else None)
+            elif __debug__ and self.log_events:
+                logger.debug("Not sending up of hotkey %s, as it only has a down function", key)
+
+    # Queue the batch of triggers to be sent, if the batch window has passed since the first trigger in it
+    # If it hasn't, watch_keyboard() waits for more events for at most the rest of the window (see batch_timeout()), then calls this again
+    # force: Send it even if the window hasn't passed
+    def flush_batch(self, force=False):
+        if not self.batch or (not force and time.monotonic() < self.batch_deadline):
+            return
+        batch = self.batch
+        self.batch = []
+        if len(batch) == 1:
+            self.dispatcher.dispatch(batch[0][0], batch[0][1], batch[0][3], batch[0][4], batch[0][2])
+        else:
+            self.dispatcher.dispatch_batch(batch)
+        if __debug__ and self.log_events:
+            logger.debug("Queued batch of %u triggers. Triggers waiting to be sent: %u", len(batch), self.dispatcher.depth)
+
+    # Seconds the reader should wait for events before the batch has to be sent, or None to wait for as long as it takes
+    def batch_timeout(self):
+        if not self.batch:
+            return None
+        return max(0, self.batch_deadline - time.monotonic())
+
+    # Send hotkey runner command -> server
+    # Runs on the dispatcher's thread
+    # ts: Kernel timestamp of the event, so it's saved to the journal with the time it was pressed
+    # Returns False if it wasn't sent (i.e. the server couldn't be reached or replied with an error), so the dispatcher counts it as failed,
+    # even if it was saved to the journal to send later
+    def post_hotkey(self, hotkey, value, timing=None, held=None, ts=None):
+        seq = None
+        if self.journal is not None:
+            seq = self.journal.next_seq()
+            if self.journal.pending():
+                # The server is down, or hotkeys from while it was are still being sent, so go after them to keep the order
+                self.save_hotkey(hotkey, value, seq, ts)
+                return False
         try:
-            data_hotkey = { "keyboard": self.name, "hotkey": hotkey, "value": value }
-            TYPE_JSON = {"Content-Type": "application/json"} # So the server can interpret it
-            requests.post("http://" + self.config["addresses"]["server"]["ipv4"] + ":" + str(self.config["addresses"]["server"]["port"]) + "/api/post/trigger", data=json.dumps(data_hotkey), headers=TYPE_JSON, timeout=2)
-        except requests.exceptions.ConnectionError:
-            logger.err("Couldn't estanblish a connection to the server.")
-            logger.err("Please check your internet connection.")
-        except requests.exceptions.Timeout:
-            logger.err("The request timed out")
-            logger.warn("This means either the server isn't running, or is busy running another hotkey.")
-            logger.warn("Please note the hotkey may still execute after the server has finished running the hotkeys it is currently running")
+            self.check_reply(self.client.send(self.name, hotkey, value, run=self.journal.run_id if seq is not None else None, seq=seq, held=held), hotkey, value)
+            if timing is not None:
+                timing.done = time.time()
+                self.metrics.observe_trigger(self.name, timing)
+        except (requests.exceptions.ConnectionError, ConnectionError):
+            self.connection_failed(seq is not None)
+            if seq is not None:
+                self.save_hotkey(hotkey, value, seq, ts)
+            return False
+        except (requests.exceptions.Timeout, TimeoutError):
+            self.timed_out(seq is not None)
+            if seq is not None:
+                self.save_hotkey(hotkey, value, seq, ts)
+            return False
+        except requests.exceptions.HTTPError as err:
+            self.server_error(seq is not None, err)
+            if seq is not None:
+                self.save_hotkey(hotkey, value, seq, ts)
+            return False
+        return True
+
+    # Send a batch of triggers to the server, in one request, so the server runs them in order
+    # Runs on the dispatcher's thread
+    # triggers: List of (hotkey, value, ts, timing, held) tuples, from flush_batch()
+    # Returns False if they weren't sent, as for post_hotkey()
+    def post_hotkeys(self, triggers):
+        run = None
+        seqs = [None] * len(triggers)
+        if self.journal is not None:
+            run = self.journal.run_id
+            seqs = [self.journal.next_seq() for trigger in triggers]
+            if self.journal.pending():
+                # As for post_hotkey(), go after the hotkeys waiting to be sent
+                self.save_hotkeys(triggers, seqs)
+                return False
+        try:
+            self.check_reply(self.client.send_batch(self.name, [(hotkey, value, ts, seq, held) for (hotkey, value, ts, timing, held), seq in zip(triggers, seqs)], run=run))
+            if self.metrics is not None:
+                done = time.time()
+                for trigger in triggers:
+                    trigger[3].done = done
+                    self.metrics.observe_trigger(self.name, trigger[3])
+        except (requests.exceptions.ConnectionError, ConnectionError):
+            self.connection_failed(run is not None)
+            if run is not None:
+                self.save_hotkeys(triggers, seqs)
+            return False
+        except (requests.exceptions.Timeout, TimeoutError):
+            self.timed_out(run is not None)
+            if run is not None:
+                self.save_hotkeys(triggers, seqs)
+            return False
+        except requests.exceptions.HTTPError as err:
+            self.server_error(run is not None, err)
+            if run is not None:
+                self.save_hotkeys(triggers, seqs)
+            return False
+        return True
+
+    # Raise requests.exceptions.HTTPError if the server replied with an error (i.e. a 404 from a server too old to have
+    # the route), so the triggers are handled as not sent, as when the server can't be reached
+    # reply: Reply from the client, or None if it doesn't wait for one (see channel.ChannelClient)
+    # hotkey, value: Trigger sent, if only one was. The server replies 404 to the value of a multi hotkey with no function for it,
+    #   as there's nothing to run, so that isn't an error
+    def check_reply(self, reply, hotkey=None, value=None):
+        if reply is None or reply.status_code < 400:
+            return
+        if reply.status_code == 404 and hotkey is not None and not self.has_function(hotkey, value):
+            return
+        reply.raise_for_status()
+
+    # If a hotkey has a function for a value, i.e. the up of a multi hotkey with only a down function doesn't
+    def has_function(self, hotkey, value):
+        functions = self.hotkeys[hotkey]["func"] if hotkey in self.hotkeys else None
+        if not isinstance(functions, Mapping):
+            return True
+        return ("down" if value == 1 else "up") in functions
+
+    # Log that triggers couldn't be sent as the server couldn't be reached
+    # saving: If they're being saved to the journal
+    def connection_failed(self, saving):
+        if saving:
+            logger.warn("Couldn't estanblish a connection to the server, so saving hotkeys to send when it's back.")
+            return
+        logger.err("Couldn't estanblish a connection to the server.")
+        logger.err("Please check your internet connection.")
+
+    # Log that triggers couldn't be sent as the server took too long
+    # saving: If they're being saved to the journal
+    def timed_out(self, saving):
+        if saving:
+            logger.warn("The request timed out, so saving hotkeys to send when the server is back.")
+            return
+        logger.err("The request timed out")
+        logger.warn("This means either the server isn't running, or is busy running another hotkey.")
+        logger.warn("Please note the hotkey may still execute after the server has finished running the hotkeys it is currently running")
+
+    # Log that triggers weren't run as the server replied with an error
+    # saving: If they're being saved to the journal
+    def server_error(self, saving, err):
+        if saving:
+            logger.warn("The server replied with an error (" + str(err) + "), so saving hotkeys to send again later.")
+            return
+        logger.err("The server replied with an error: " + str(err))
+
+    # Save a hotkey to the journal, for the replayer to send
+    # How long the hotkey was held for (see send_multi()) isn't saved, so isn't sent with it
+    # ts: Kernel timestamp of the event, so it expires from when it was pressed. Saved with the time now if None or 0 (not known)
+    def save_hotkey(self, hotkey, value, seq, ts=None):
+        self.journal.append(seq, hotkey, value, at=ts or None)
+        self.replayer.wake()
+
+    # Save a batch of triggers to the journal, in order, with the kernel timestamp of each as for save_hotkey()
+    def save_hotkeys(self, triggers, seqs):
+        for trigger, seq in zip(triggers, seqs):
+            self.journal.append(seq, trigger[0], trigger[1], at=trigger[2] or None)
+        self.replayer.wake()
+
+    # Send a batch of hotkeys from the journal, in one request (see post_hotkeys())
+    # Runs on the replayer's thread
+    # entries: List of JournalEntry, in order
+    # Raises requests.exceptions.RequestException if the server can't be reached or replies with an error, so they're kept in the journal
+    def resend_hotkeys(self, entries):
+        # The run is sent for the whole batch, so hotkeys left from the last run go in a request of their own
+        for run, run_entries in groupby(entries, key=lambda entry: entry.run):
+            self.check_reply(self.client.send_batch(self.name, [(entry.hotkey, entry.value, entry.time, entry.seq, None) for entry in run_entries], run=run))
+
+    # Use a newly compiled config (see reload.Reloader)
+    # Can be called from any thread. It's swapped in before the next batch of events is handled,
+    # so an event is never handled with half of the old config & half of the new
+    # compiled: CompiledKeyboard
+    def reload(self, compiled):
+        self.client.prepare(self.name, compiled.hotkeys)
+        self.reloads.append(compiled)
+
+    # Swap in the config from reload()
+    # Keys held down stay held down, so a hotkey being pressed isn't missed
+    def apply_reload(self):
+        compiled = self.reloads.popleft()
+        pressed = self.key_state.pressed
+        self.map = compiled.map
+        self.hotkeys = compiled.hotkeys
+        self.hotkey_index = compiled.index
+        self.key_state = KeyState(self.map)
+        self.key_state.pressed = pressed
+        if __debug__ and self.log_events:
+            logger.debug("Now using reloaded config for %s", self.name)
+
+    # Touch the key map, hotkeys & index, so the first key presses don't page fault (see realtime.prefault())
+    # Runs every hotkey through the matcher without sending it
+    def prefault(self):
+        for code in range(len(self.map)):
+            self.map[code]
+        key_state = KeyState(self.map)
+        for mask in self.hotkey_index.index:
+            key_state.pressed = mask
+            self.hotkeys[self.check_for_hotkey(key_state.pressed)]
 
     # Locks (grabs) keyboard
     def lock(self):
@@ -238,35 +476,23 @@ class Keyboard:
         logger.info("Unlocking keyboard...")
         self.keyboard_device.ungrab()
 
+    # Stats of sending triggers (see TriggerDispatcher.stats()), & of the journal if keeping one
+    def stats(self):
+        stats = self.dispatcher.stats()
+        if self.journal is not None:
+            stats["journaled"] = len(self.journal)
+            stats["replayed"] = self.replayer.sent
+            stats["expired"] = self.replayer.expired
+            stats["journal_dropped"] = self.journal.dropped
+        return stats
 
-# str keyboard: Keyboard file in /dev/input/by-id
-class AsyncKeyboard:
-    # Root defaults to /dev/input/by-id
-    def __init__(self, keyboard, root):
-        # File for input that corresponds to the keyboard.
-        self.keyboard = path.join(root, keyboard)
-        # Open keyboard events file in binary mode
-        self.in_file = open(self.keyboard, "rb")
-        # Run checker
-        self.run = True
-    # IMPORTANT: Don't use non async functions in this.  That includes the logger
-    async def keyboard_watcher(self, callback):
-        # Only seems to run on key press. Strange.
-        # Solution, as this makes it hard to stop was to add a callback to part 2
-        async with aiofiles.open(self.keyboard, "rb") as in_file:
-            event = await in_file.read(KEYBOARD_EVENT_SIZE)  # Open input file
-            while event and self.run:
-                print("[ASYNC DEBUG] Key pressed on " + self.keyboard)
-                break;
-            await in_file.close()
-            # Stop all
-            if self.run:
-                await callback(self.keyboard)
-            return self.run
-    # Stop watching as it's no longer needed
-    async def stop_watch(self):
-        print("[DEBUG] CLASS: STOPPING " + self.keyboard)
-        self.run = False
-        return
-        #await self.in_file.close()
-    
+    # Stops watching, sending any triggers still waiting to be sent
+    # Hotkeys in the journal are kept, to send next time
+    def stop(self):
+        self.flush_batch(force=True)
+        self.dispatcher.stop()
+        if self.journal is not None:
+            self.replayer.stop()
+            self.journal.close()
+        if self.owns_client:
+            self.client.close()
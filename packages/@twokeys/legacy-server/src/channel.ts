@@ -0,0 +1,129 @@
+/**
+ * @license
+ * Copyright 2020 Kishan Sambhi
+ *
+ * This file is part of 2Keys.
+ *
+ * 2Keys is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * 2Keys is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with 2Keys.  If not, see <https://www.gnu.org/licenses/>.
+ */
+/**
+ * Trigger channel: a long lived TCP connection from a detector, as an alternative to a HTTP request for each trigger.
+ * Each message is a frame of:
+ * - length of the body (4 bytes, big endian)
+ * - id (4 bytes, big endian), which the reply to it has too
+ * - type (1 byte), see FrameTypes
+ * - body, the JSON the matching HTTP route takes
+ *
+ * Frames are handled in the order they come in, & each is replied to with an ack frame
+ * with a JSON body of `{ status, text }`, as the HTTP route would reply with.
+ * Detectors don't wait for the ack before sending the next frame.
+ * @packageDocumentation
+ */
+import { createServer, Server, Socket } from "net";
+import Logger from "./util/logger";
+import { Reply } from "./util/interfaces";
+import { run_trigger, run_triggers } from "./util/triggers";
+import { update_keyboard_paths } from "./util/config";
+
+const logger: Logger = new Logger({
+	name: "channel",
+});
+
+export const FRAME_HEADER_SIZE = 9;
+
+export enum FrameTypes {
+	Trigger = 1, // Body as for /api/post/trigger
+	UpdateKeyboardPaths = 2, // Body as for /api/post/update-keyboard-paths
+	Triggers = 3, // Body as for /api/post/triggers
+	Ack = 0x80,
+}
+
+/**
+ * Builds a frame
+ * @param id Id of the frame
+ * @param type Type of frame
+ * @param body Body of the frame, as JSON
+ */
+export function make_frame(id: number, type: FrameTypes, body: object): Buffer {
+	const json = Buffer.from(JSON.stringify(body));
+	const header = Buffer.alloc(FRAME_HEADER_SIZE);
+	header.writeUInt32BE(json.length, 0);
+	header.writeUInt32BE(id, 4);
+	header.writeUInt8(type, 8);
+	return Buffer.concat([header, json]);
+}
+
+/**
+ * Handles a frame from a detector
+ * @returns Reply to ack it with
+ */
+async function handle_frame(type: number, body: Buffer): Promise<Reply> {
+	try {
+		const message = JSON.parse(body.toString());
+		switch (type) {
+			case FrameTypes.Trigger:
+				return await run_trigger(message);
+			case FrameTypes.Triggers:
+				return await run_triggers(message.triggers);
+			case FrameTypes.UpdateKeyboardPaths:
+				return await update_keyboard_paths(message.paths);
+			default:
+				return { status: 400, text: `Unknown frame type ${type}` };
+		}
+	} catch (err) {
+		logger.err(`Error handling frame: ${err.message}`);
+		return { status: 500, text: err.toString() };
+	}
+}
+
+/**
+ * Handles a detector's connection
+ */
+function handle_connection(socket: Socket): void {
+	logger.debug(`Detector connected from ${socket.remoteAddress}`);
+	socket.setNoDelay(true);
+	let buffer = Buffer.alloc(0);
+	// Frames are handled one after the other, so hotkeys run in the order they were pressed
+	let handled: Promise<void> = Promise.resolve();
+	socket.on("data", (data) => {
+		buffer = Buffer.concat([buffer, data]);
+		while (buffer.length >= FRAME_HEADER_SIZE) {
+			const length = buffer.readUInt32BE(0);
+			if (buffer.length < FRAME_HEADER_SIZE + length) {
+				break; // Rest of frame not here yet
+			}
+			const id = buffer.readUInt32BE(4);
+			const type = buffer.readUInt8(8);
+			const body = buffer.slice(FRAME_HEADER_SIZE, FRAME_HEADER_SIZE + length);
+			buffer = buffer.slice(FRAME_HEADER_SIZE + length);
+			handled = handled
+				.then(() => handle_frame(type, body))
+				.then((reply) => {
+					if (!socket.destroyed) {
+						socket.write(make_frame(id, FrameTypes.Ack, reply));
+					}
+				});
+		}
+	});
+	socket.on("error", (err) => {
+		logger.warn(`Detector connection error: ${err.message}`);
+	});
+}
+
+/**
+ * Creates the trigger channel server. Call listen() on it to start it
+ */
+export function channel_server(): Server {
+	return createServer(handle_connection);
+}
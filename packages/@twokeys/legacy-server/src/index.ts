@@ -27,7 +27,8 @@ import bodyParser from "body-parser";
 import { writeFile } from "fs";
 import api from "./routes/api";
 import Logger from "./util/logger";
-import { DEFAULT_PORT } from "./util/constants";
+import { DEFAULT_PORT, CHANNEL_PORT_OFFSET } from "./util/constants";
+import { channel_server } from "./channel";
 import { Arguments } from "yargs";
 
 const app = express();
@@ -43,6 +44,10 @@ const server = (port: number = DEFAULT_PORT, argv: Arguments) => {
 		logger.info("Server now listenning on port " + port);
 		logger.debug("PID: " + process.pid);
 	});
+	// Long lived connections from detectors, for sending triggers without a request for each
+	channel_server().listen(port + CHANNEL_PORT_OFFSET, () => {
+		logger.info("Trigger channel now listenning on port " + (port + CHANNEL_PORT_OFFSET));
+	});
 
 	if (Object.prototype.hasOwnProperty.call(argv, "pid-file") && typeof argv["pid-file"] === "string" && argv["pid-file"]) {
 		logger.debug(`Writing pid file to ${argv["pid-file"]}...`);
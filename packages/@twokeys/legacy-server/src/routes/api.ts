@@ -22,34 +22,58 @@
  * @packageDocumentation
  */
 import { Router } from "express";
-import { readFile, writeFile } from "fs";
+import { writeFile, promises as fsp } from "fs";
+import { createHash } from "crypto";
 import { join } from "path";
+import { promisify } from "util";
+import { gzip as gzip_callback } from "zlib";
 import YAML from "yaml";
-import { config_loader } from "../util/config";
+import { config_loader, update_keyboard_paths } from "../util/config";
 import Logger from "../util/logger";
-import { Config, Hotkey, EvDevValues } from "../util/interfaces";
-import { run_hotkey, fetch_hotkey } from "../util/ahk";
+import { Config, Hotkey } from "../util/interfaces";
+import { run_trigger, run_triggers } from "../util/triggers";
 import { CONFIG_FILE } from "../util/constants";
 
 const logger: Logger = new Logger({
 	name: "api",
 });
 const router = Router();
+const gzip = promisify(gzip_callback);
 
 /**
- * Returns the config for the 2Keys project
+ * Returns the config for the 2Keys project, as JSON.
+ * Has an ETag & Last-Modified, so a detector that already has it gets a 304 & no body,
+ * & is gzipped if the detector accepts it
  */
-router.get("/get/config", (req, res, next) => {
+router.get("/get/config", async (req, res, next) => {
 	logger.debug("Sending a config copy as JSON...");
-	readFile(join(process.cwd(), "config.yml"), (err, data) => {
-		if (err) {
-			return next(err);
-		}
+	try {
+		const config_path = join(process.cwd(), "config.yml");
+		const [data, stats] = await Promise.all([fsp.readFile(config_path), fsp.stat(config_path)]);
 		const data_to_send = JSON.stringify(YAML.parse(data.toString()));
+		const gzipped = req.acceptsEncodings("gzip", "identity") === "gzip";
+		// Each encoding is a different representation, so has a different ETag
+		const etag = createHash("sha256").update(data_to_send).digest("hex").slice(0, 32) + (gzipped ? "-gzip" : "");
 		res.setHeader("Content-Type", "application/json");
+		res.setHeader("ETag", `"${etag}"`);
+		res.setHeader("Last-Modified", stats.mtime.toUTCString());
+		res.setHeader("Vary", "Accept-Encoding");
+		if (req.fresh) {
+			logger.debug("Detector already has the config");
+			res.statusCode = 304;
+			res.end();
+			return;
+		}
 		res.statusCode = 200;
-		res.send(data_to_send);
-	});
+		if (gzipped) {
+			res.setHeader("Content-Encoding", "gzip");
+			res.end(await gzip(data_to_send));
+		} else {
+			res.end(data_to_send);
+		}
+	} catch (err) {
+		next(err);
+	}
 });
 
 /**
@@ -57,53 +81,30 @@ router.get("/get/config", (req, res, next) => {
  * Info to send:
  * - keyboard: The keyboard name that has been pressed
  * - hotkey: set of keys that have been pressed
+ * - Optionally, the value of the key event & the other fields of Trigger (see util/interfaces.ts)
  */
 router.post("/post/trigger", async (req, res, next) => {
-	/**
-   * 1: Get hotkey function from config
-   * 2: Execute C++ bindings with #Include <root of keyboard>; function()
-   */
-	// Get vars
-	const keyboard = req.body.keyboard;
-	const hotkey_code = req.body.hotkey;
-	const value: EvDevValues = req.body.hasOwnProperty("value") ?  req.body.value : EvDevValues.Down;
-	logger.debug(`Got keyboard ${keyboard} and hotkey ${hotkey_code}, with value ${value}`);
-	// Parse config
 	try {
-		const fetched_hotkey = await fetch_hotkey(keyboard, hotkey_code); // Gets hotkey
-		let func_to_run: string;
-
-		// Use the value arg to select
-		if (typeof fetched_hotkey.func === "object") {
-			// Is an object
-			logger.debug("Got a multi event hotkey.");
-			// Select which function to run
-			if (value === EvDevValues.Down) {
-				func_to_run = fetched_hotkey.func.down;
-			} else if (value === EvDevValues.Up) {
-				func_to_run = fetched_hotkey.func.up;
-			} else {
-				// Stop exec as and error was encountered
-				return next(new TypeError(`The request keyboard event value of ${value} is invalid.  Valid event values are: 0 (Up) & 1 (Down)`));
-			}
-
-			// Validate a function actually exists
-			if (typeof func_to_run === "undefined") {
-				// Ignore
-				logger.warn(`Ignoring hotkey ${hotkey_code} of value ${value}, as no function to run exists`);
-				res.statusCode = 404;
-				res.send("Hotkey function not found");
-				return;
-			}
-		} else {
-			func_to_run = fetched_hotkey.func;
-		}
-
-		// Execute
-		run_hotkey(fetched_hotkey.file, func_to_run);
+		const reply = await run_trigger(req.body);
+		res.statusCode = reply.status;
+		res.send(reply.text);
+	} catch (err) {
+		next(err); // Hand off to error handler
+	}
+});
 
-		res.statusCode = 200;
-		res.send("OK");
+/**
+ * Trigger a batch of hotkeys, i.e. those pressed in one report from a keyboard.
+ * They're run in order, & the reply is a JSON array of the reply to each
+ * Info to send:
+ * - triggers: Array of triggers, in the order they were pressed, each as for /post/trigger
+ */
+router.post("/post/triggers", async (req, res, next) => {
+	try {
+		const reply = await run_triggers(req.body.triggers);
+		res.statusCode = reply.status;
+		res.setHeader("Content-Type", "application/json");
+		res.send(reply.text);
 	} catch (err) {
 		next(err); // Hand off to error handler
 	}
@@ -133,4 +134,19 @@ router.post("/post/update-keyboard-path", (req, res, next) => {
 		});
 });
 
+/**
+ * Handles updating the paths of several keyboards at once, with one write of the config
+ * Info to send:
+ * - paths: Object of keyboard name -> path
+ */
+router.post("/post/update-keyboard-paths", (req, res, next) => {
+	const { paths } = req.body as { paths: { [keyboard: string]: string } };
+	update_keyboard_paths(paths)
+		.then((reply) => {
+			res.statusCode = reply.status;
+			res.send(reply.text);
+		})
+		.catch(next);
+});
+
 export default router;
@@ -71,18 +71,18 @@ export async function fetch_hotkey(keyboard: string, hotkey_code: string): Promi
 }
 
 /**
- * Run a hotkey by sending execution string to C++ addon
+ * Makes the AHK code that runs a hotkey's function
  * @param file {String} File to get hotkeys from
  * @param func {String} Function to run from that file
+ * @param held {Number} Seconds the hotkey was held down for, if the detector sent it, given to the function as TWOKEYS_HELD
  */
-export async function run_hotkey(file: string, func: string): Promise<void> {
-	const old_cwd: string = process.cwd();
-
-	// 0: Set execution test
-	const exec_test = `
+export function make_exec_text(file: string, func: string, held?: number): string {
+	// Only ever a number, so nothing else can get into the code
+	const held_prelude = typeof held === "number" && isFinite(held) ? `\n  Global TWOKEYS_HELD := ${held.toFixed(6)}` : "";
+	return `
   ; AHK EXEC 2KEYS
   ; PRELUDE
-  Global TWOKEYS_CWD := "${process.cwd()}"
+  Global TWOKEYS_CWD := "${process.cwd()}"${held_prelude}
 
   ; GRAB CLIENT CODE
   #Include ${file}
@@ -90,6 +90,19 @@ export async function run_hotkey(file: string, func: string): Promise<void> {
   ; EXECUTE
   ${func}()
   `;
+}
+
+/**
+ * Run a hotkey by sending execution string to C++ addon
+ * @param file {String} File to get hotkeys from
+ * @param func {String} Function to run from that file
+ * @param held {Number} Seconds the hotkey was held down for, if known (see make_exec_text())
+ */
+export async function run_hotkey(file: string, func: string, held?: number): Promise<void> {
+	const old_cwd: string = process.cwd();
+
+	// 0: Set execution test
+	const exec_test = make_exec_text(file, func, held);
 	// 1: Santise file input to prevent code injection
 	// Check it exists
 	try {
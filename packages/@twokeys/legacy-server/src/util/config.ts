@@ -21,15 +21,16 @@
  * Config loader for 2Keys
  * @packageDocumentation
  */
-import { readFile as readFileRaw } from "fs";
+import { readFile as readFileRaw, writeFile as writeFileRaw } from "fs";
 import { join } from "path";
 import YAML from "yaml";
 import { promisify } from "util";
 import { CONFIG_FILE, DEFAULT_USERSPACE_CONFIG } from "./constants";
-import { Config, UserspaceConfig } from "./interfaces";
+import { Config, Reply, UserspaceConfig } from "./interfaces";
 import Logger from "./logger";
 
 const readFile = promisify(readFileRaw); // For easier handling with async
+const writeFile = promisify(writeFileRaw);
 const logger: Logger = new Logger({ name: "config" });
 
 export async function config_loader(): Promise<Config> {
@@ -52,3 +53,24 @@ export async function userspace_config_loader(): Promise<UserspaceConfig> {
 	}
 }
 
+/**
+ * Updates the paths of several keyboards at once, with one write of the config
+ * @param paths Object of keyboard name -> path
+ * @returns What to reply to the detector with
+ */
+export async function update_keyboard_paths(paths: { [keyboard: string]: string }): Promise<Reply> {
+	logger.info(`Got update for paths of ${Object.keys(paths).join(", ")}`);
+	const config = await config_loader();
+	for (const keyboard of Object.keys(paths)) {
+		if (!config.keyboards.hasOwnProperty(keyboard)) {
+			return { status: 400, text: `Keyboard ${keyboard} not found in config` };
+		}
+	}
+	for (const [keyboard, path] of Object.entries(paths)) {
+		config.keyboards[keyboard].path = path;
+	}
+	// Write
+	logger.debug("Writing config...");
+	await writeFile(CONFIG_FILE, YAML.stringify(config));
+	return { status: 200, text: "OK" };
+}
@@ -27,7 +27,11 @@ import { AppPath, AppPaths, Keyboard, UserspaceConfig } from "./interfaces";
  */
 export const DEBUG = "debug";
 export const DEFAULT_PORT = 9090;
+/** The trigger channel (see channel.ts) listens on the port of the server plus this */
+export const CHANNEL_PORT_OFFSET = 1;
 export const CONFIG_FILE = "config.yml";
+/** Number of detector runs to remember the sequence numbers of triggers for (see util/triggers.ts) */
+export const TRIGGER_RUNS_KEPT = 64;
 //export const AHK_LIB_PATH: string = "D:\\Users\\Kishan\\Documents\\Projects\\2Keys\\cli\\lib\\ahkdll-v1-release-master\\x64w\\AutoHotkey.dll";
 export const AHK_LIB_PATH = "D:\\Users\\Kishan\\Documents\\Projects\\2Keys\\cli\\lib\\ahkdll-v2-release-master\\x64w\\AutoHotkey.dll";
 export const AHK_DOWNLOAD_PATH = "https://codeload.github.com/HotKeyIt/ahkdll-v2-release/zip/master";
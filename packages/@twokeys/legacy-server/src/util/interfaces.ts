@@ -139,4 +139,28 @@ export interface FetchHotkey {
 export enum EvDevValues {
   Up = 0,
   Down, // 1
-}
\ No newline at end of file
+}
+
+/**
+ * Trigger from a detector
+ */
+export interface Trigger {
+  keyboard: string;
+  hotkey: string;
+  value?: EvDevValues;
+  /** Time of the key event on the detector, in seconds since the epoch */
+  ts?: number;
+  /** Seconds the hotkey was held down for, sent with the up of a multi hotkey when the detector collapses them */
+  held?: number;
+  /** Id of the run of the detector & sequence number of the trigger, so a trigger sent twice is only run once */
+  run?: string;
+  seq?: number;
+}
+
+/**
+ * Reply to a detector, as a status code (as for HTTP) & text
+ */
+export interface Reply {
+  status: number;
+  text: string;
+}
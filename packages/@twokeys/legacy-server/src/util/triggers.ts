@@ -0,0 +1,131 @@
+/**
+ * @license
+ * Copyright 2020 Kishan Sambhi
+ *
+ * This file is part of 2Keys.
+ *
+ * 2Keys is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * 2Keys is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with 2Keys.  If not, see <https://www.gnu.org/licenses/>.
+ */
+/**
+ * Tracks the sequence numbers of triggers from detectors,
+ * so triggers sent twice (i.e. resent from a detector's journal after a timeout) are only run once
+ * @packageDocumentation
+ */
+import { TRIGGER_RUNS_KEPT } from "./constants";
+import { EvDevValues, Reply, Trigger } from "./interfaces";
+import { run_hotkey, fetch_hotkey } from "./ahk";
+import Logger from "./logger";
+
+const logger: Logger = new Logger({
+	name: "triggers",
+});
+
+/**
+ * Highest sequence number seen, by keyboard & id of the run of the detector that sent it.
+ * Each run of a detector numbers its triggers from 1, in the order they were triggered
+ */
+const last_sequences = new Map<string, number>();
+
+/**
+ * Checks if a trigger has already been seen, & records it if it hasn't
+ * @param keyboard Keyboard the trigger is from
+ * @param run Id of the run of the detector
+ * @param seq Sequence number of the trigger
+ * @returns true if the trigger is a duplicate & shouldn't be run
+ */
+export function is_duplicate_trigger(keyboard: string, run: string, seq: number): boolean {
+	const key = `${keyboard}/${run}`;
+	const last = last_sequences.get(key);
+	if (typeof last !== "undefined" && seq <= last) {
+		return true;
+	}
+	// Move to the end, so the runs not heard from for longest are forgotten first
+	last_sequences.delete(key);
+	last_sequences.set(key, seq);
+	if (last_sequences.size > TRIGGER_RUNS_KEPT) {
+		last_sequences.delete(last_sequences.keys().next().value);
+	}
+	return false;
+}
+
+/**
+ * Runs the function for a trigger from a detector
+ * 1: Get hotkey function from config
+ * 2: Execute C++ bindings with #Include <root of keyboard>; function()
+ * @param trigger Trigger sent by the detector
+ * @returns What to reply to the detector with
+ * @throws TypeError if the value of the trigger is invalid
+ */
+export async function run_trigger(trigger: Trigger): Promise<Reply> {
+	const { keyboard, hotkey: hotkey_code } = trigger;
+	const value: EvDevValues = trigger.hasOwnProperty("value") ? trigger.value : EvDevValues.Down;
+	logger.debug(`Got keyboard ${keyboard} and hotkey ${hotkey_code}, with value ${value}`);
+	if (typeof trigger.seq === "number" && typeof trigger.run === "string" && is_duplicate_trigger(keyboard, trigger.run, trigger.seq)) {
+		logger.debug(`Ignoring trigger ${trigger.seq} from run ${trigger.run}, as it has already been run`);
+		return { status: 200, text: "Duplicate" };
+	}
+	// Parse config
+	const fetched_hotkey = await fetch_hotkey(keyboard, hotkey_code); // Gets hotkey
+	let func_to_run: string;
+
+	// Use the value arg to select
+	if (typeof fetched_hotkey.func === "object") {
+		// Is an object
+		logger.debug("Got a multi event hotkey.");
+		// Select which function to run
+		if (value === EvDevValues.Down) {
+			func_to_run = fetched_hotkey.func.down;
+		} else if (value === EvDevValues.Up) {
+			func_to_run = fetched_hotkey.func.up;
+		} else {
+			// Stop exec as and error was encountered
+			throw new TypeError(`The request keyboard event value of ${value} is invalid.  Valid event values are: 0 (Up) & 1 (Down)`);
+		}
+
+		// Validate a function actually exists
+		if (typeof func_to_run === "undefined") {
+			// Ignore
+			logger.warn(`Ignoring hotkey ${hotkey_code} of value ${value}, as no function to run exists`);
+			return { status: 404, text: "Hotkey function not found" };
+		}
+	} else {
+		func_to_run = fetched_hotkey.func;
+	}
+
+	// Execute
+	run_hotkey(fetched_hotkey.file, func_to_run, trigger.held);
+	return { status: 200, text: "OK" };
+}
+
+/**
+ * Runs a batch of triggers, in order, one after the other.
+ * A trigger that fails doesn't stop the ones after it from running.
+ * @param triggers Triggers, in the order they were pressed
+ * @returns Reply with the JSON array of the reply to each trigger
+ */
+export async function run_triggers(triggers: Trigger[]): Promise<Reply> {
+	if (!Array.isArray(triggers)) {
+		throw new TypeError("Expected an array of triggers");
+	}
+	const replies: Reply[] = [];
+	for (const trigger of triggers) {
+		try {
+			replies.push(await run_trigger(trigger));
+		} catch (err) {
+			logger.err(`Error running hotkey ${trigger.hotkey} from a batch: ${err.message}`);
+			replies.push({ status: 500, text: err.toString() });
+		}
+	}
+	return { status: 200, text: JSON.stringify(replies) };
+}
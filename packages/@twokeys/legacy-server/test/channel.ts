@@ -0,0 +1,76 @@
+// Trigger channel tests
+import { expect } from "chai";
+import { connect, AddressInfo, Server } from "net";
+import { channel_server, make_frame, FrameTypes, FRAME_HEADER_SIZE } from "../src/channel";
+import { MOCK_KEYBAORD_NAME } from "./global/constants";
+import { EvDevValues } from "../src/util/interfaces";
+
+describe("Trigger channel", () => {
+	let server: Server;
+
+	before((done) => {
+		server = channel_server().listen(0, "127.0.0.1", done);
+	});
+
+	after((done) => {
+		server.close(done);
+	});
+
+	it("should ack each frame, in order, without waiting for the last ack", (done) => {
+		const socket = connect((server.address() as AddressInfo).port, "127.0.0.1");
+		const acks: Array<{ id: number, type: number, reply: { status: number, text: string } }> = [];
+		let buffer = Buffer.alloc(0);
+		socket.on("data", (data) => {
+			buffer = Buffer.concat([buffer, data]);
+			while (buffer.length >= FRAME_HEADER_SIZE && buffer.length >= FRAME_HEADER_SIZE + buffer.readUInt32BE(0)) {
+				const length = buffer.readUInt32BE(0);
+				acks.push({
+					id: buffer.readUInt32BE(4),
+					type: buffer.readUInt8(8),
+					reply: JSON.parse(buffer.slice(FRAME_HEADER_SIZE, FRAME_HEADER_SIZE + length).toString()),
+				});
+				buffer = buffer.slice(FRAME_HEADER_SIZE + length);
+			}
+			if (acks.length === 3) {
+				socket.end();
+				expect(acks.map((ack) => ack.id)).to.deep.equal([1, 2, 3]);
+				expect(acks.map((ack) => ack.type)).to.deep.equal([FrameTypes.Ack, FrameTypes.Ack, FrameTypes.Ack]);
+				expect(acks[0].reply).to.deep.equal({ status: 404, text: "Hotkey function not found" });
+				expect(acks[1].reply.status).to.equal(500);
+				expect(acks[1].reply.text).to.include("TypeError: The request keyboard event value of 3 is invalid.");
+				expect(acks[2].reply.status).to.equal(400);
+				done();
+			}
+		});
+		// All sent at once, in one write
+		socket.write(Buffer.concat([
+			make_frame(1, FrameTypes.Trigger, { keyboard: MOCK_KEYBAORD_NAME, hotkey: "+D$END$", value: EvDevValues.Down }),
+			make_frame(2, FrameTypes.Trigger, { keyboard: MOCK_KEYBAORD_NAME, hotkey: "+C$END$", value: 3 }),
+			make_frame(3, FrameTypes.UpdateKeyboardPaths, { paths: { notAKeyboard: "/dev/null" } }),
+		]));
+	});
+
+	it("should run a batch of triggers in one frame", (done) => {
+		const socket = connect((server.address() as AddressInfo).port, "127.0.0.1");
+		let buffer = Buffer.alloc(0);
+		socket.on("data", (data) => {
+			buffer = Buffer.concat([buffer, data]);
+			if (buffer.length < FRAME_HEADER_SIZE || buffer.length < FRAME_HEADER_SIZE + buffer.readUInt32BE(0)) {
+				return;
+			}
+			socket.end();
+			expect(buffer.readUInt32BE(4)).to.equal(7);
+			expect(buffer.readUInt8(8)).to.equal(FrameTypes.Ack);
+			const reply = JSON.parse(buffer.slice(FRAME_HEADER_SIZE, FRAME_HEADER_SIZE + buffer.readUInt32BE(0)).toString());
+			expect(reply.status).to.equal(200);
+			expect(JSON.parse(reply.text).map((trigger_reply: { status: number }) => trigger_reply.status)).to.deep.equal([404, 404]);
+			done();
+		});
+		socket.write(make_frame(7, FrameTypes.Triggers, {
+			triggers: [
+				{ keyboard: MOCK_KEYBAORD_NAME, hotkey: "+D$END$", value: EvDevValues.Down, ts: 1600000000.5 },
+				{ keyboard: MOCK_KEYBAORD_NAME, hotkey: "+D$END$", value: EvDevValues.Down, ts: 1600000000.5 },
+			],
+		}));
+	});
+});
@@ -25,6 +25,45 @@ describe("/api test", () => {
 					done();
 				});
 		});
+
+		it("should send the config gzipped if asked to", (done) => {
+			const config = fs.readFileSync(CONFIG_FILE);
+			agent
+				.get("/api/get/config")
+				.set("Accept-Encoding", "gzip")
+				.expect(200)
+				.expect("Content-Encoding", "gzip")
+				.end((err, res) => {
+					if (err) { return done(err); }
+					expect(res.body).to.deep.equal(YAML.parse(config.toString()));
+					done();
+				});
+		});
+
+		it("should only send the config if it has changed since the detector got it", (done) => {
+			agent
+				.get("/api/get/config")
+				.set("Accept-Encoding", "identity")
+				.expect(200)
+				.end((err, res) => {
+					if (err) { return done(err); }
+					expect(res.header.etag).to.be.a("string");
+					agent
+						.get("/api/get/config")
+						.set("Accept-Encoding", "identity")
+						.set("If-None-Match", res.header.etag)
+						.expect(304)
+						.end((err2) => {
+							if (err2) { return done(err2); }
+							agent
+								.get("/api/get/config")
+								.set("Accept-Encoding", "identity")
+								.set("If-Modified-Since", res.header["last-modified"])
+								.expect(304)
+								.end(done);
+						});
+				});
+		});
 	});
 
 	describe("/api/post/update-keyboard-path", () => {
@@ -53,6 +92,41 @@ describe("/api test", () => {
 		});
 	});
 
+	describe("/api/post/update-keyboard-paths", () => {
+		it("should successfully change keyboard paths", (done) => {
+			const testPath = "/dev/input/by-id/" + Math.random();
+			agent
+				.post("/api/post/update-keyboard-paths")
+				.expect(200)
+				.send({
+					paths: { [MOCK_KEYBAORD_NAME]: testPath },
+				})
+				.end((err, res) => {
+					if (err) { done(err); }
+					// Delay, to account for time to execute
+					setTimeout(() => {
+						fsp.readFile(join(MOCK_ROOT, "./config.yml"))
+							.then((contents) => {
+								const config: Config = YAML.parse(contents.toString());
+								expect(config.keyboards[MOCK_KEYBAORD_NAME].path).to.equal(testPath);
+								done();
+							})
+							.catch(done);
+					}, 100);
+				});
+		});
+
+		it("should not change anything if a keyboard isn't in the config", (done) => {
+			agent
+				.post("/api/post/update-keyboard-paths")
+				.expect(400)
+				.send({
+					paths: { [MOCK_KEYBAORD_NAME]: "/dev/null", notAKeyboard: "/dev/null" },
+				})
+				.end(done);
+		});
+	});
+
 	describe("/api/post/trigger", () => {
 		it("should successfully execute a hotkey", (done) => {
 			agent
@@ -156,6 +230,67 @@ describe("/api test", () => {
 					done();
 				});
 		});
+
+		it("should only run a trigger with the same sequence number once", (done) => {
+			const trigger = {
+				hotkey: "+D$END$",
+				keyboard: MOCK_KEYBAORD_NAME,
+				value: EvDevValues.Down,
+				run: "0123456789abcdef",
+				seq: 1,
+			};
+			agent
+				.post("/api/post/trigger")
+				.expect(404) // Not a duplicate, so looked up (& has no down function)
+				.send(trigger)
+				.end((err) => {
+					if (err) { return done(err); }
+					agent
+						.post("/api/post/trigger")
+						.expect(200)
+						.send(trigger)
+						.end((err2, res) => {
+							if (err2) { return done(err2); }
+							expect(res.text).to.equal("Duplicate");
+							done();
+						});
+				});
+		});
+	});
+
+	describe("/api/post/triggers", () => {
+		it("should run each trigger in a batch, in order, replying for each", (done) => {
+			agent
+				.post("/api/post/triggers")
+				.expect(200)
+				.send({
+					triggers: [
+						{ hotkey: "+D$END$", keyboard: MOCK_KEYBAORD_NAME, value: EvDevValues.Down, ts: 1600000000.000001 },
+						{ hotkey: "+C$END$", keyboard: MOCK_KEYBAORD_NAME, value: 3, ts: 1600000000.000002 }, // Invalid value
+						{ hotkey: "+D$END$", keyboard: MOCK_KEYBAORD_NAME, value: EvDevValues.Down, ts: 1600000000.000003, run: "fedcba9876543210", seq: 1 },
+						{ hotkey: "+D$END$", keyboard: MOCK_KEYBAORD_NAME, value: EvDevValues.Down, ts: 1600000000.000004, run: "fedcba9876543210", seq: 1 },
+					],
+				})
+				.end((err, res) => {
+					if (err) { return done(err); }
+					expect(res.body.map((reply: { status: number }) => reply.status)).to.deep.equal([404, 500, 404, 200]);
+					expect(res.body[1].text).to.include("TypeError: The request keyboard event value of 3 is invalid.");
+					expect(res.body[3].text).to.equal("Duplicate");
+					done();
+				});
+		});
+
+		it("should not accept a batch without an array of triggers", (done) => {
+			agent
+				.post("/api/post/triggers")
+				.expect(500)
+				.send({ hotkey: "+D$END$", keyboard: MOCK_KEYBAORD_NAME })
+				.end((err, res) => {
+					if (err) { return done(err); }
+					expect(res.text).to.include("TypeError: Expected an array of triggers");
+					done();
+				});
+		});
 	});
 
 	after(async () => {
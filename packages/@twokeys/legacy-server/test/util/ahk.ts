@@ -1,4 +1,4 @@
-import { fetch_hotkey, run_hotkey } from "../../src/util/ahk";
+import { fetch_hotkey, run_hotkey, make_exec_text } from "../../src/util/ahk";
 import { MOCK_KEYBAORD_NAME, CONFIG_FILE, MOCK_ROOT } from "../global/constants";
 import { Config } from "../../src/util/interfaces";
 import { config_loader } from "../../src/util/config";
@@ -46,6 +46,12 @@ describe("AHK execution tests", () => {
 		).to.equal("IT WORKED!");
 	});
 
+	it("should give the time a hotkey was held for to the function, only if it's a number", () => {
+		expect(make_exec_text("index.ahk", "OnUp", 0.25)).to.include("Global TWOKEYS_HELD := 0.250000\n");
+		expect(make_exec_text("index.ahk", "OnUp")).to.not.include("TWOKEYS_HELD");
+		expect(make_exec_text("index.ahk", "OnUp", "1\nRun calc" as any)).to.not.include("TWOKEYS_HELD");
+	});
+
 	it("should throw a ReferenceError when attmepting to call a non-existant hotkey", async () => {
 		await expect(fetch_hotkey(MOCK_KEYBAORD_NAME + "NOTAKEYBOARD", "+B$HOME$")).to.be.rejectedWith(ReferenceError);
 	});